@@ -1,5 +1,5 @@
 import api from './client'
-import type { Order, OrderDetail, PaginatedResponse } from '../types'
+import type { Order, OrderDetail, OrderListItem, PaginatedResponse } from '../types'
 
 export async function fetchOrders(params: {
   page?: number
@@ -7,7 +7,7 @@ export async function fetchOrders(params: {
   status?: string
   shop_id?: string
   search?: string
-}): Promise<PaginatedResponse<Order>> {
+}): Promise<PaginatedResponse<OrderListItem>> {
   const { data } = await api.get('/admin/orders', { params })
   return data
 }
@@ -155,6 +155,11 @@ export interface Order {
   updated_at: string
 }
 
+// Строка списка заказов (GET /admin/orders): без паспортных данных и позиций
+export interface OrderListItem extends Omit<Order, 'recipient_passport_series' | 'recipient_passport_number' | 'items'> {
+  items_count: number
+}
+
 export interface StatusHistoryEntry {
   old_status: string | null
   new_status: string
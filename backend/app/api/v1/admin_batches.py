@@ -1,14 +1,14 @@
 import logging
-import math
 from datetime import datetime, timezone
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func, select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.core.dependencies import get_current_operator, get_db
+from app.core.pagination import CountMode, paginate, pages_count
 from app.models.batch import Batch
 from app.models.operator import Operator
 from app.models.order import Order
@@ -21,7 +21,7 @@ from app.schemas.batch import (
     BatchStatusUpdate,
 )
 from app.services.customs_declaration import create_declaration
-from app.services.order import change_order_status
+from app.services.order import enqueue_status_webhooks, lean_order_options, transition_orders
 
 logger = logging.getLogger(__name__)
 
@@ -69,27 +69,23 @@ def _batch_to_response(batch: Batch) -> BatchResponse:
 async def list_batches(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None),
+    count: CountMode = Query("exact"),
     operator: Operator = Depends(get_current_operator),
     db: AsyncSession = Depends(get_db),
 ):
-    total_result = await db.execute(select(func.count(Batch.id)))
-    total = total_result.scalar()
-
-    result = await db.execute(
-        select(Batch)
-        .options(selectinload(Batch.customs_declaration))
-        .order_by(Batch.created_at.desc())
-        .offset((page - 1) * per_page)
-        .limit(per_page)
+    result = await paginate(
+        db, select(Batch).options(selectinload(Batch.customs_declaration)), Batch,
+        page=page, per_page=per_page, cursor=cursor, count=count,
     )
-    batches = result.scalars().all()
 
     return BatchListResponse(
-        items=[_batch_to_response(b) for b in batches],
-        total=total,
+        items=[_batch_to_response(b) for b in result.items],
+        total=result.total,
         page=page,
         per_page=per_page,
-        pages=max(1, math.ceil(total / per_page)),
+        pages=pages_count(result.total, per_page),
+        next_cursor=result.next_cursor,
     )
 
 
@@ -120,9 +116,20 @@ async def create_batch(
     db.add(batch)
     await db.flush()
 
-    for order in orders:
-        order.batch_id = batch.id
-        await change_order_status(db, order.id, "batch_forming", changed_by=operator.id, comment=f"Партия {batch.number}")
+    await db.execute(update(Order).where(Order.id.in_(body.order_ids)).values(batch_id=batch.id))
+    transition = await transition_orders(
+        db, body.order_ids, "batch_forming", changed_by=operator.id, comment=f"Партия {batch.number}",
+    )
+    if transition.skipped:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{len(transition.skipped)} orders changed status concurrently, batch not created",
+        )
+    batch_number = batch.number
+    # Партия и статусы заказов — одним commit; декларация — отдельно (её ошибка не откатывает партию)
+    await db.commit()
+    enqueue_status_webhooks(transition)
 
     # Авто-создание черновика декларации
     declaration = None
@@ -131,14 +138,15 @@ async def create_batch(
             db,
             order_ids=body.order_ids,
             goods_location=body.goods_location,
-            operator_note=f"Автоматически из партии {batch.number}",
+            operator_note=f"Автоматически из партии {batch_number}",
         )
         declaration.batch_id = batch.id
-        logger.info("Declaration %s auto-created for batch %s", declaration.number, batch.number)
+        logger.info("Declaration %s auto-created for batch %s", declaration.number, batch_number)
     except Exception:
         # Декларация не должна блокировать создание партии
         # (например, если нет company_settings)
-        logger.exception("Failed to auto-create declaration for batch %s", batch.number)
+        await db.rollback()
+        logger.exception("Failed to auto-create declaration for batch %s", batch_number)
 
     await db.commit()
     await db.refresh(batch)
@@ -160,7 +168,10 @@ async def get_batch(
     result = await db.execute(
         select(Batch)
         .where(Batch.id == batch_id)
-        .options(selectinload(Batch.orders), selectinload(Batch.customs_declaration))
+        .options(
+            selectinload(Batch.orders).options(*lean_order_options(items=True)),
+            selectinload(Batch.customs_declaration),
+        )
     )
     batch = result.scalar_one_or_none()
     if not batch:
@@ -197,7 +208,7 @@ async def update_batch_status(
     result = await db.execute(
         select(Batch)
         .where(Batch.id == batch_id)
-        .options(selectinload(Batch.orders), selectinload(Batch.customs_declaration))
+        .options(selectinload(Batch.orders).load_only(Order.id), selectinload(Batch.customs_declaration))
     )
     batch = result.scalar_one_or_none()
     if not batch:
@@ -218,18 +229,27 @@ async def update_batch_status(
 
     await db.flush()
 
-    # Cascade to orders
+    # Cascade to orders — set-based, в одной транзакции со статусом партии
+    transition = None
     order_target = BATCH_TO_ORDER_STATUS.get(body.status)
     if order_target:
-        for order in batch.orders:
-            await change_order_status(
-                db,
-                order.id,
-                order_target,
-                changed_by=operator.id,
-                comment=f"Партия {batch.number}: {body.status}",
+        transition = await transition_orders(
+            db,
+            [order.id for order in batch.orders],
+            order_target,
+            changed_by=operator.id,
+            comment=f"Партия {batch.number}: {body.status}",
+        )
+        if transition.skipped:
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{len(transition.skipped)} orders cannot move to '{order_target}': "
+                       + "; ".join(sorted(set(transition.skipped.values()))),
             )
 
     await db.commit()
+    if transition:
+        enqueue_status_webhooks(transition)
     await db.refresh(batch)
     return _batch_to_response(batch)
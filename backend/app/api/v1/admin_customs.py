@@ -1,12 +1,12 @@
-import math
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, Query, status
 from fastapi.responses import StreamingResponse
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.dependencies import get_current_operator, get_db
+from app.core.pagination import CountMode, paginate, pages_count
 from app.models.customs_declaration import CustomsDeclaration
 from app.models.operator import Operator
 from app.schemas.customs_declaration import (
@@ -27,6 +27,7 @@ from app.services.customs_declaration import (
     validate_declaration,
 )
 from app.services.customs_export import generate_csv, generate_pdf
+from app.services.order_items import load_order_items
 
 router = APIRouter(prefix="/admin/customs", tags=["admin-customs"])
 
@@ -36,6 +37,8 @@ async def list_declarations(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
     status_filter: str | None = Query(None, alias="status"),
+    cursor: str | None = Query(None),
+    count: CountMode = Query("exact"),
     operator: Operator = Depends(get_current_operator),
     db: AsyncSession = Depends(get_db),
 ):
@@ -43,20 +46,15 @@ async def list_declarations(
     if status_filter:
         q = q.where(CustomsDeclaration.status == status_filter)
 
-    total_result = await db.execute(select(func.count()).select_from(q.subquery()))
-    total = total_result.scalar_one()
-
-    q = q.order_by(CustomsDeclaration.created_at.desc())
-    q = q.offset((page - 1) * per_page).limit(per_page)
-    result = await db.execute(q)
-    declarations = list(result.scalars().all())
+    result = await paginate(db, q, CustomsDeclaration, page=page, per_page=per_page, cursor=cursor, count=count)
 
     return CustomsDeclarationListResponse(
-        items=[CustomsDeclarationResponse.model_validate(d) for d in declarations],
-        total=total,
+        items=[CustomsDeclarationResponse.model_validate(d) for d in result.items],
+        total=result.total,
         page=page,
         per_page=per_page,
-        pages=max(1, math.ceil(total / per_page)),
+        pages=pages_count(result.total, per_page),
+        next_cursor=result.next_cursor,
     )
 
 
@@ -84,19 +82,19 @@ async def get_declaration_endpoint(
 ):
     declaration = await get_declaration(db, declaration_id)
 
+    items_by_order = await load_order_items(db, [order.id for order in declaration.orders])
+
     orders_out = []
     for order in declaration.orders:
-        all_items_ready = all(
-            item.get("tn_ved_code") and item.get("country_of_origin")
-            for item in order.items
-        )
+        items = items_by_order[order.id]
+        all_items_ready = all(item.tn_ved_code and item.country_of_origin for item in items)
         orders_out.append(CustomsDeclarationOrderSummary(
             id=order.id,
             external_order_id=order.external_order_id,
             recipient_name=order.recipient_name,
             recipient_address=order.recipient_address,
             recipient_postal_code=order.recipient_postal_code,
-            items=order.items,
+            items=[item.to_dict() for item in items],
             total_amount_kopecks=order.total_amount_kopecks,
             total_weight_grams=order.total_weight_grams,
             customs_ready=all_items_ready,
@@ -1,14 +1,18 @@
+from datetime import datetime, timedelta, timezone
+
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.dependencies import get_current_operator, get_db
+from app.core.pagination import CountMode, paginate
 from app.models.grouping_settings import GroupingSettings
 from app.models.operator import Operator
-from app.models.order import Order
 from app.models.shipment_group import ShipmentGroup
 from app.models.tracking_event import TrackingEvent
+from app.services import grouping_scheduler, hub_pool
+from app.services.hub_router import HUB_REGISTRY
 
 router = APIRouter(prefix="/admin", tags=["admin-groups"])
 
@@ -37,9 +41,10 @@ class ShipmentGroupOut(BaseModel):
 
 class ShipmentGroupsResponse(BaseModel):
     items: list[ShipmentGroupOut]
-    total: int
+    total: int | None
     page: int
     page_size: int
+    next_cursor: str | None = None
 
 
 class GroupStatusUpdate(BaseModel):
@@ -74,6 +79,19 @@ class GroupingSettingsUpdate(BaseModel):
     description: str | None = None
 
 
+class HubPoolOut(BaseModel):
+    hub: str
+    hub_name: str
+    orders_count: int
+    total_weight_grams: int
+    public_tariff_kopecks: int
+    priced_count: int
+    oldest_created_at: str | None
+    deadline_at: str | None
+    # Оптимизатор проверит хаб при следующем запуске
+    triggered: bool
+
+
 # ── Groups endpoints ──────────────────────────────────────────────────────────
 
 @router.get("/groups", response_model=ShipmentGroupsResponse)
@@ -82,6 +100,8 @@ async def list_groups(
     page_size: int = 20,
     status: str | None = None,
     hub: str | None = None,
+    cursor: str | None = None,
+    count: CountMode = "exact",
     db: AsyncSession = Depends(get_db),
     operator: Operator = Depends(get_current_operator),
 ):
@@ -90,23 +110,46 @@ async def list_groups(
         q = q.where(ShipmentGroup.status == status)
     if hub:
         q = q.where(ShipmentGroup.hub == hub)
-    q = q.order_by(ShipmentGroup.created_at.desc())
 
-    total_result = await db.execute(select(func.count()).select_from(q.subquery()))
-    total = total_result.scalar_one()
-
-    q = q.offset((page - 1) * page_size).limit(page_size)
-    result = await db.execute(q)
-    groups = list(result.scalars().all())
+    result = await paginate(db, q, ShipmentGroup, page=page, per_page=page_size, cursor=cursor, count=count)
 
     return ShipmentGroupsResponse(
-        items=[_group_to_out(g) for g in groups],
-        total=total,
+        items=[_group_to_out(g) for g in result.items],
+        total=result.total,
         page=page,
         page_size=page_size,
+        next_cursor=result.next_cursor,
     )
 
 
+@router.get("/groups/pool", response_model=list[HubPoolOut])
+async def get_hub_pools(
+    db: AsyncSession = Depends(get_db),
+    operator: Operator = Depends(get_current_operator),
+):
+    """Пул заказов, ожидающих группировки, по хабам — из агрегатов hub_pools, без загрузки заказов."""
+    result = await db.execute(select(GroupingSettings).where(GroupingSettings.scope == "global"))
+    settings = result.scalar_one_or_none() or GroupingSettings.defaults()
+    now = datetime.now(timezone.utc)
+    out = []
+    for pool in await hub_pool.load(db):
+        oldest = pool.oldest_created_at
+        if oldest is not None and oldest.tzinfo is None:
+            oldest = oldest.replace(tzinfo=timezone.utc)
+        out.append(HubPoolOut(
+            hub=pool.hub,
+            hub_name=HUB_REGISTRY.get(pool.hub, {}).get("name", pool.hub),
+            orders_count=pool.orders_count,
+            total_weight_grams=pool.total_weight_grams,
+            public_tariff_kopecks=pool.public_tariff_kopecks,
+            priced_count=pool.priced_count,
+            oldest_created_at=oldest.isoformat() if oldest else None,
+            deadline_at=(oldest + timedelta(hours=settings.max_wait_hours)).isoformat() if oldest else None,
+            triggered=hub_pool.should_evaluate(pool, settings, now),
+        ))
+    return out
+
+
 @router.get("/groups/{group_id}", response_model=ShipmentGroupOut)
 async def get_group(
     group_id: str,
@@ -144,7 +187,6 @@ async def update_group_status(
             detail=f"Переход {group.status} → {body.status} недопустим",
         )
 
-    from datetime import datetime, timezone
     group.status = body.status
     if body.operator_note:
         group.operator_note = body.operator_note
@@ -153,10 +195,7 @@ async def update_group_status(
     elif body.status == "at_hub":
         group.arrived_at_hub_at = datetime.now(timezone.utc)
 
-    # Добавляем tracking event для всех заказов группы
-    orders_result = await db.execute(select(Order).where(Order.shipment_group_id == group_id))
-    orders = list(orders_result.scalars().all())
-
+    # Событие группы — одна строка; в таймлайн заказов подмешивается при чтении
     event_map = {
         "dispatched": ("group_dispatched", "Группа отправлена", "Калининград"),
         "at_hub": ("group_at_hub", f"Группа прибыла в хаб {group.hub_name}", group.hub_name),
@@ -164,16 +203,12 @@ async def update_group_status(
     }
     if body.status in event_map:
         etype, edesc, eloc = event_map[body.status]
-        for order in orders:
-            event = TrackingEvent(
-                order_id=order.id,
-                shipment_group_id=group.id,
-                internal_track_number=order.internal_track_number,
-                event_type=etype,
-                description=edesc,
-                location=eloc,
-            )
-            db.add(event)
+        db.add(TrackingEvent(
+            shipment_group_id=group.id,
+            event_type=etype,
+            description=edesc,
+            location=eloc,
+        ))
 
     await db.commit()
     return {"ok": True, "status": group.status}
@@ -198,26 +233,19 @@ async def force_dispatch_group(
             detail=f"Группа в статусе {group.status}, принудительная отправка невозможна",
         )
 
-    from datetime import datetime, timezone
     group.status = "dispatched"
     group.dispatched_at = datetime.now(timezone.utc)
     group.operator_note = body.note or "Принудительная отправка оператором"
 
-    orders_result = await db.execute(select(Order).where(Order.shipment_group_id == group_id))
-    orders = list(orders_result.scalars().all())
-    for order in orders:
-        event = TrackingEvent(
-            order_id=order.id,
-            shipment_group_id=group.id,
-            internal_track_number=order.internal_track_number,
-            event_type="group_dispatched",
-            description="Группа отправлена (принудительно)",
-            location="Калининград",
-        )
-        db.add(event)
+    db.add(TrackingEvent(
+        shipment_group_id=group.id,
+        event_type="group_dispatched",
+        description="Группа отправлена (принудительно)",
+        location="Калининград",
+    ))
 
     await db.commit()
-    return {"ok": True, "group_number": group.number, "orders_count": len(orders)}
+    return {"ok": True, "group_number": group.number, "orders_count": group.orders_count}
 
 
 # ── Settings endpoints ────────────────────────────────────────────────────────
@@ -257,6 +285,8 @@ async def update_grouping_settings(
         setattr(settings, field, value)
 
     await db.commit()
+    # Новые интервал и пороги — с ближайшего тика планировщика
+    await grouping_scheduler.reset_interval()
     await db.refresh(settings)
     return _settings_to_out(settings)
 
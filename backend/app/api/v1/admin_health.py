@@ -188,6 +188,7 @@ async def get_health(
                 index_from="238311",
                 index_to="101000",
                 weight_grams=500,
+                use_cache=False,
             )
             pochta_ms = int((time.monotonic() - t0) * 1000)
             if result is not None:
@@ -197,6 +198,14 @@ async def get_health(
         except Exception as e:
             pochta_ms = int((time.monotonic() - t0) * 1000)
             services.append(ServiceStatus(name="Почта России API", status="error", latency_ms=pochta_ms, detail=str(e)[:200]))
+
+        # Открытые circuit breaker'ы — запросы к этим эндпоинтам Почты сейчас отклоняются
+        open_breakers = [ep for ep, state in pochta_client.breaker_states().items() if state != "closed"]
+        services.append(ServiceStatus(
+            name="Почта: circuit breaker",
+            status="error" if open_breakers else "ok",
+            detail=f"Открыты: {', '.join(open_breakers)}" if open_breakers else None,
+        ))
     else:
         services.append(ServiceStatus(name="Почта России API", status="unknown", detail="Client not initialized"))
 
@@ -304,6 +313,7 @@ async def run_system_tests(
                 index_from="238311",
                 index_to="101000",
                 weight_grams=500,
+                use_cache=False,
             )
             if result is not None and result.total_kopecks > 0:
                 results.append(TestResult(
@@ -342,6 +352,7 @@ async def run_system_tests(
                 index_from="238311",
                 index_to="101000",
                 weight_grams=500,
+                use_cache=False,
             )
             if result is not None and result.total_kopecks > 0:
                 results.append(TestResult(
@@ -1,21 +1,30 @@
-import math
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.dependencies import get_current_operator, get_db
+from app.core.pagination import CountMode, pages_count
 from app.models.operator import Operator
 from app.schemas.order import (
+    BulkChangeStatusRequest,
+    BulkChangeStatusResponse,
     ChangeStatusRequest,
     CustomsDeclarationBrief,
     OrderDetailResponse,
+    OrderListItem,
     OrderListResponse,
     OrderResponse,
     StatusHistoryEntry,
 )
 from app.services.audit import log_action
-from app.services.order import change_order_status, get_order_with_history, list_orders
+from app.services.order import (
+    change_order_status,
+    enqueue_status_webhooks,
+    get_order_with_history,
+    list_orders,
+    transition_orders,
+)
 
 router = APIRouter(prefix="/admin/orders", tags=["admin-orders"])
 
@@ -27,14 +36,21 @@ async def list_all_orders(
     search: str | None = Query(None),
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None),
+    count: CountMode = Query("exact"),
+    tn_ved: str | None = Query(None, pattern=r"^\d{1,10}$"),
+    customs_missing: bool = Query(False),
     operator: Operator = Depends(get_current_operator),
     db: AsyncSession = Depends(get_db),
 ):
-    orders, total = await list_orders(db, shop_id=shop_id, status_filter=status, page=page, per_page=per_page, search=search)
+    result = await list_orders(
+        db, shop_id=shop_id, status_filter=status, page=page, per_page=per_page, search=search,
+        cursor=cursor, count=count, tn_ved_prefix=tn_ved, customs_missing=customs_missing,
+    )
 
     items = []
-    for o in orders:
-        resp = OrderResponse.model_validate(o)
+    for o in result.items:
+        resp = OrderListItem.model_validate(o)
         if o.shop:
             resp.shop_name = o.shop.name
         if o.customs_declaration:
@@ -44,10 +60,11 @@ async def list_all_orders(
 
     return OrderListResponse(
         items=items,
-        total=total,
+        total=result.total,
         page=page,
         per_page=per_page,
-        pages=max(1, math.ceil(total / per_page)),
+        pages=pages_count(result.total, per_page),
+        next_cursor=result.next_cursor,
     )
 
 
@@ -76,6 +93,38 @@ async def get_order_detail(
     return OrderDetailResponse(**data)
 
 
+@router.post("/bulk-status", response_model=BulkChangeStatusResponse)
+async def bulk_update_order_status(
+    body: BulkChangeStatusRequest,
+    request: Request,
+    operator: Operator = Depends(get_current_operator),
+    db: AsyncSession = Depends(get_db),
+):
+    """Массовая смена статуса: допустимые переходы применяются, остальные возвращаются в skipped."""
+    result = await transition_orders(db, body.order_ids, body.status, changed_by=operator.id, comment=body.comment)
+    await log_action(
+        db,
+        action="order.bulk_status_change",
+        resource_type="order",
+        operator_id=operator.id,
+        details={
+            "new_status": body.status,
+            "comment": body.comment,
+            "changed_count": len(result.changed),
+            "skipped_count": len(result.skipped),
+        },
+        ip_address=request.client.host if request.client else None,
+    )
+    await db.commit()  # статусы, история, трекинг и аудит — одной транзакцией
+    enqueue_status_webhooks(result)
+    return BulkChangeStatusResponse(
+        changed=result.changed,
+        skipped=result.skipped,
+        changed_count=len(result.changed),
+        skipped_count=len(result.skipped),
+    )
+
+
 @router.patch("/{order_id}/status", response_model=OrderResponse)
 async def update_order_status(
     order_id: UUID,
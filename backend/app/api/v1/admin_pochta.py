@@ -3,7 +3,7 @@ import uuid
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel, Field
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 
 from app.core.database import async_session
@@ -11,7 +11,8 @@ from app.core.dependencies import get_current_operator
 from app.models.batch import Batch
 from app.models.operator import Operator
 from app.models.order import Order
-from app.services.order import change_order_status
+from app.services.order import change_order_status, change_orders_status_bulk
+from app.services.pochta import BulkShipmentResult, ShipmentItem
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +32,10 @@ class AddressRequest(BaseModel):
     address: str = Field(..., min_length=5, max_length=500)
 
 
+class AddressBulkRequest(BaseModel):
+    addresses: list[str] = Field(..., min_length=1, max_length=5000)
+
+
 class FioRequest(BaseModel):
     fio: str = Field(..., min_length=2, max_length=200)
 
@@ -71,6 +76,15 @@ class AddressResponse(BaseModel):
     quality_code: str
     validation_code: str
     is_valid: bool
+    # Массовая нормализация: адрес не обработан из-за ошибки запроса его чанка
+    error: str | None = None
+    pochta_log: list[PochtaHttpLog] = []
+
+
+class AddressBulkResponse(BaseModel):
+    items: list[AddressResponse]
+    total: int
+    valid_count: int
     pochta_log: list[PochtaHttpLog] = []
 
 
@@ -123,10 +137,12 @@ async def tariff_public(
 ):
     pochta = request.app.state.pochta_client
     try:
+        # Тестовая страница показывает живой запрос к Почте — мимо кеша
         result, log = await pochta.calculate_tariff_public(
             index_from=body.index_from,
             index_to=body.index_to,
             weight_grams=body.weight_grams,
+            use_cache=False,
         )
     except Exception as e:
         logger.error(f"Pochta API error in tariff_public: {e}", exc_info=True)
@@ -149,10 +165,12 @@ async def tariff_contract(
 ):
     pochta = request.app.state.pochta_client
     try:
+        # Тестовая страница показывает живой запрос к Почте — мимо кеша
         result, log = await pochta.calculate_tariff_contract(
             index_from=body.index_from,
             index_to=body.index_to,
             weight_grams=body.weight_grams,
+            use_cache=False,
         )
     except Exception as e:
         logger.error(f"Pochta API error in tariff_contract: {e}", exc_info=True)
@@ -193,6 +211,27 @@ async def normalize_address(
     )
 
 
+@router.post("/normalize-addresses", response_model=AddressBulkResponse)
+async def normalize_addresses(
+    body: AddressBulkRequest,
+    request: Request,
+    operator: Operator = Depends(get_current_operator),
+):
+    """Массовая нормализация адресов (чанками, параллельно, без дублей)."""
+    pochta = request.app.state.pochta_client
+    try:
+        results, logs = await pochta.normalize_addresses(body.addresses)
+    except Exception as e:
+        logger.error(f"Pochta API error in normalize_addresses: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Pochta API unavailable")
+    return AddressBulkResponse(
+        items=[AddressResponse(**vars(r)) for r in results],
+        total=len(results),
+        valid_count=sum(1 for r in results if r.is_valid),
+        pochta_log=[PochtaHttpLog(**vars(log)) for log in logs],
+    )
+
+
 @router.post("/normalize-fio", response_model=FioResponse)
 async def normalize_fio(
     body: FioRequest,
@@ -268,6 +307,49 @@ async def tariff_compare(
     )
 
 
+class TariffMatrixStatusResponse(BaseModel):
+    available: bool
+    built_at: str | None = None
+    sender_postal_code: str | None = None
+    regions_count: int = 0
+    weights_grams: list[int] = []
+    coverage_percent: float = 0.0
+
+
+@router.get("/tariff-matrix", response_model=TariffMatrixStatusResponse)
+async def tariff_matrix_status(
+    operator: Operator = Depends(get_current_operator),
+):
+    from app.services.tariff_matrix import tariff_matrix_store
+
+    matrix = await tariff_matrix_store.get()
+    if matrix is None:
+        return TariffMatrixStatusResponse(available=False)
+    return TariffMatrixStatusResponse(
+        available=True,
+        built_at=matrix.built_at,
+        sender_postal_code=matrix.sender_postal_code,
+        regions_count=len(matrix.prefixes),
+        weights_grams=matrix.weights,
+        coverage_percent=round(matrix.coverage() * 100, 1),
+    )
+
+
+@router.post("/tariff-matrix/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def tariff_matrix_rebuild(
+    operator: Operator = Depends(get_current_operator),
+):
+    """Внеплановый пересчёт матрицы тарифов (обычно — ночью по расписанию)."""
+    from app.workers.tasks_tariff_matrix import build_tariff_matrix
+
+    try:
+        build_tariff_matrix.delay()
+    except Exception as e:
+        logger.error(f"Failed to enqueue tariff matrix rebuild: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Task queue unavailable")
+    return {"status": "queued"}
+
+
 @router.get("/balance", response_model=BalanceResponse)
 async def get_balance(
     request: Request,
@@ -425,6 +507,7 @@ async def create_batch_shipments(
 
         created: list[ShipmentResponse] = []
         errors: list[dict] = []
+        eligible: list[Order] = []
 
         for order in batch.orders:
             # Пропускаем заказы с уже присвоенным трек-номером
@@ -440,8 +523,12 @@ async def create_batch_shipments(
                 })
                 continue
 
-            try:
-                shipment_result, log = await pochta.create_shipment(
+            eligible.append(order)
+
+        if eligible:
+            # Все отправления партии — несколькими PUT /user/backlog вместо запроса на заказ
+            results, _logs = await pochta.create_shipments([
+                ShipmentItem(
                     recipient_name=order.recipient_name,
                     recipient_address=order.recipient_address,
                     recipient_postal_code=order.recipient_postal_code,
@@ -450,29 +537,57 @@ async def create_batch_shipments(
                     order_num=order.external_order_id,
                     declared_value_kopecks=order.total_amount_kopecks,
                 )
-
-                order.track_number = shipment_result.barcode
+                for order in eligible
+            ])
+
+            shipped: list[tuple[Order, BulkShipmentResult]] = []
+            for order, shipment_result in zip(eligible, results):
+                if shipment_result.error:
+                    logger.error("Shipment creation failed for order %s: %s", order.id, shipment_result.error)
+                    errors.append({
+                        "order_id": str(order.id),
+                        "external_order_id": order.external_order_id,
+                        "error": shipment_result.error,
+                    })
+                else:
+                    shipped.append((order, shipment_result))
+
+            if shipped:
+                # Трек-номера — одним bulk UPDATE по первичному ключу
+                await session.execute(
+                    update(Order),
+                    [{"id": order.id, "track_number": r.barcode} for order, r in shipped],
+                )
                 await session.commit()
 
-                # Переводим статус: customs_cleared → awaiting_carrier → shipped
+                # Статусы set-based: customs_cleared → awaiting_carrier → shipped
                 try:
-                    await _transition_to_shipped(session, order.id, operator.id, shipment_result.barcode)
+                    await change_orders_status_bulk(
+                        session,
+                        [order.id for order, _ in shipped if order.status == "customs_cleared"],
+                        "awaiting_carrier",
+                        changed_by=operator.id,
+                        comment="Подготовка к отправке (Почта России)",
+                    )
+                    await change_orders_status_bulk(
+                        session,
+                        [order.id for order, _ in shipped],
+                        "shipped",
+                        changed_by=operator.id,
+                        comments={order.id: f"Создано отправление ПР: {r.barcode}" for order, r in shipped},
+                    )
                 except Exception:
-                    pass
-
-                created.append(ShipmentResponse(
-                    order_id=str(order.id),
-                    pochta_id=shipment_result.pochta_id,
-                    barcode=shipment_result.barcode,
-                    message=f"Трек: {shipment_result.barcode}",
-                ))
-            except Exception as e:
-                logger.error("Shipment creation failed for order %s: %s", order.id, e)
-                errors.append({
-                    "order_id": str(order.id),
-                    "external_order_id": order.external_order_id,
-                    "error": str(e),
-                })
+                    logger.exception("Could not change status to shipped for batch %s", batch.id)
+
+                created = [
+                    ShipmentResponse(
+                        order_id=str(order.id),
+                        pochta_id=r.pochta_id,
+                        barcode=r.barcode,
+                        message=f"Трек: {r.barcode}",
+                    )
+                    for order, r in shipped
+                ]
 
     return BatchShipmentsResponse(
         created=created,
@@ -1,15 +1,24 @@
-import math
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.dependencies import get_db, require_admin
+from app.core.pagination import CountMode, paginate, pages_count
 from app.core.security import generate_api_key
 from app.models.operator import Operator
 from app.models.shop import Shop
-from app.schemas.shop import ShopCreate, ShopCreateResponse, ShopResponse, ShopUpdate
+from app.schemas.shop import (
+    ShopCreate,
+    ShopCreateResponse,
+    ShopResponse,
+    ShopUpdate,
+    WebhookDeadLetter,
+    WebhookReplayRequest,
+    WebhookReplayResponse,
+)
+from app.services import webhook_outbox
 from app.services.audit import log_action
 
 router = APIRouter(prefix="/admin/shops", tags=["admin-shops"])
@@ -19,21 +28,20 @@ router = APIRouter(prefix="/admin/shops", tags=["admin-shops"])
 async def list_shops(
     page: int = Query(1, ge=1),
     per_page: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None),
+    count: CountMode = Query("exact"),
     operator: Operator = Depends(require_admin),
     db: AsyncSession = Depends(get_db),
 ):
-    total_result = await db.execute(select(func.count(Shop.id)))
-    total = total_result.scalar()
-
-    result = await db.execute(select(Shop).order_by(Shop.created_at.desc()).offset((page - 1) * per_page).limit(per_page))
-    shops = result.scalars().all()
+    result = await paginate(db, select(Shop), Shop, page=page, per_page=per_page, cursor=cursor, count=count)
 
     return {
-        "items": [ShopResponse.model_validate(s) for s in shops],
-        "total": total,
+        "items": [ShopResponse.model_validate(s) for s in result.items],
+        "total": result.total,
         "page": page,
         "per_page": per_page,
-        "pages": max(1, math.ceil(total / per_page)),
+        "pages": pages_count(result.total, per_page),
+        "next_cursor": result.next_cursor,
     }
 
 
@@ -54,6 +62,7 @@ async def create_shop(
         domain=body.domain,
         api_key=generate_api_key(),
         webhook_url=body.webhook_url,
+        webhook_batching=body.webhook_batching,
         customs_fee_kopecks=body.customs_fee_kopecks,
         sender_postal_code=body.sender_postal_code,
     )
@@ -131,3 +140,36 @@ async def rotate_api_key(
     await db.commit()
     await db.refresh(shop)
     return ShopCreateResponse.model_validate(shop)
+
+
+@router.get("/{shop_id}/webhooks/failed", response_model=list[WebhookDeadLetter])
+async def list_failed_webhooks(
+    shop_id: UUID,
+    limit: int = Query(100, ge=1, le=1000),
+    operator: Operator = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """Вебхуки, не доставленные за WEBHOOK_MAX_ATTEMPTS попыток (dead letter), новые первыми."""
+    return await webhook_outbox.dead_letters(db, shop_id, limit)
+
+
+@router.post("/{shop_id}/webhooks/replay", response_model=WebhookReplayResponse)
+async def replay_failed_webhooks(
+    shop_id: UUID,
+    request: Request,
+    body: WebhookReplayRequest | None = None,
+    operator: Operator = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """Повторно отправить недоставленные вебхуки магазина (все или выбранные ids)."""
+    ids = body.ids if body else None
+    replayed = await webhook_outbox.replay_dead_letters(db, shop_id, ids)
+    await log_action(
+        db, action="shop.webhooks_replay", resource_type="shop", resource_id=shop_id,
+        operator_id=operator.id, details={"replayed": replayed},
+        ip_address=request.client.host if request.client else None,
+    )
+    await db.commit()
+    if replayed:
+        webhook_outbox.kick_relay()
+    return WebhookReplayResponse(replayed=replayed)
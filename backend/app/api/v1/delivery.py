@@ -1,3 +1,5 @@
+import asyncio
+
 from fastapi import APIRouter, Depends, Request
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -5,8 +7,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.dependencies import get_db, verify_api_key
 from app.models.company_settings import CompanySettings
 from app.models.shop import Shop
-from app.schemas.delivery import CalculateRequest, CalculateResponse
-from app.services.delivery import DeliveryService
+from app.schemas.delivery import CalculateRequest, CalculateResponse, DeliveryOptionQuote
+from app.services.delivery import DeliveryService, issue_quote_token
 
 router = APIRouter(prefix="/delivery", tags=["delivery"])
 
@@ -26,13 +28,26 @@ async def calculate_delivery(
     cs = cs_result.scalar_one_or_none()
     eur_rate = cs.eur_rate_kopecks if cs else None
 
-    result = await service.calculate(
+    calc_args = dict(
         shop=shop,
         postal_code=body.postal_code,
         weight_grams=body.weight_grams,
         total_amount_kopecks=body.total_amount_kopecks,
         eur_rate_kopecks=eur_rate,
+        estimate=body.mode == "estimate",
     )
+    options = []
+    if body.options:
+        # Основной тариф и варианты — параллельно; совпадающий с основным вариант
+        # схлопывается кешем тарифов в один запрос к Почте
+        codes = list(dict.fromkeys(body.options))
+        result, quotes = await asyncio.gather(
+            service.calculate(**calc_args),
+            service.calculate_options(**calc_args, options=codes),
+        )
+        options = [DeliveryOptionQuote(option=code, **vars(quote)) for code, quote in quotes.items()]
+    else:
+        result = await service.calculate(**calc_args)
 
     return CalculateResponse(
         delivery_cost_kopecks=result.delivery_cost_kopecks,
@@ -42,4 +57,10 @@ async def calculate_delivery(
         delivery_days_max=result.delivery_days_max,
         available=result.available,
         rejection_reason=result.rejection_reason,
+        stale=result.stale,
+        estimated=result.estimated,
+        quote_token=issue_quote_token(
+            shop, body.postal_code, body.weight_grams, body.total_amount_kopecks, result,
+        ),
+        options=options,
     )
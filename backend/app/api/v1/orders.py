@@ -1,46 +1,106 @@
+import hashlib
+from datetime import datetime
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from sqlalchemy import Row, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import load_only
 
+from app.core.config import settings
 from app.core.dependencies import get_db, verify_api_key
 from app.models.company_settings import CompanySettings
 from app.models.order import Order
+from app.models.order_status_history import OrderStatusHistory
 from app.models.shop import Shop
 from app.schemas.order import (
+    OrderBulkCreate,
+    OrderBulkItemResult,
+    OrderBulkResponse,
+    OrderChange,
+    OrderChangesResponse,
     OrderCreate,
     OrderResponse,
     OrderStatusResponse,
     OrderTrackingResponse,
     StatusHistoryEntry,
 )
-from app.services.delivery import DeliveryService
-from app.services.order import create_order
+from app.services.delivery import DeliveryCalculation, DeliveryService, redeem_quote_token
+from app.services import idempotency
+from app.services.order import (
+    DUPLICATE_IN_REQUEST_ERROR,
+    create_order,
+    create_orders_bulk,
+    find_existing_orders,
+    get_order_by_external_id,
+)
+from app.services.order_feed import changes_page
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
+def _etag(order_id: UUID, updated_at: datetime) -> str:
+    digest = hashlib.sha1(f"{order_id}:{updated_at.isoformat()}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _not_modified(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Слабое сравнение (RFC 9110): W/ не учитывается
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
 @router.post("", response_model=OrderResponse, status_code=status.HTTP_201_CREATED)
 async def create_new_order(
     body: OrderCreate,
     request: Request,
+    response: Response,
+    idempotency_key: str | None = Header(None, max_length=255),
     shop: Shop = Depends(verify_api_key),
     db: AsyncSession = Depends(get_db),
 ):
+    shop_id = shop.id  # shop истекает после rollback — id нужен и после него
+
+    # Повтор запроса (ретраи плагина) — возвращаем уже созданный заказ (200) без расчёта тарифа
+    existing = None
+    if idempotency_key:
+        existing_id = await idempotency.get_order_id(shop_id, idempotency_key)
+        if existing_id:
+            existing = await db.get(Order, existing_id)
+            if existing and existing.external_order_id != body.external_order_id:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Idempotency-Key was already used for another order",
+                )
+    if existing is None:
+        existing = await get_order_by_external_id(db, shop_id, body.external_order_id)
+    if existing is not None:
+        response.status_code = status.HTTP_200_OK
+        return OrderResponse.model_validate(existing)
+
     total_amount = sum(item.price_kopecks * item.quantity for item in body.items)
     total_weight = sum(item.weight_grams * item.quantity for item in body.items)
 
-    pochta = request.app.state.pochta_client
-    service = DeliveryService(pochta)
+    calc = None
+    if body.quote_token:
+        calc = redeem_quote_token(body.quote_token, shop, body.recipient.postal_code, total_weight, total_amount)
 
-    # Актуальный курс EUR из company_settings (обновляется из ЦБ РФ)
-    cs_result = await db.execute(select(CompanySettings).where(CompanySettings.scope == "global"))
-    cs = cs_result.scalar_one_or_none()
-    eur_rate = cs.eur_rate_kopecks if cs else None
+    if calc is None:
+        # Токена нет, он истёк или выдан на другие параметры — считаем заново
+        pochta = request.app.state.pochta_client
+        service = DeliveryService(pochta)
 
-    calc = await service.calculate(shop, body.recipient.postal_code, total_weight, total_amount, eur_rate_kopecks=eur_rate)
+        # Актуальный курс EUR из company_settings (обновляется из ЦБ РФ)
+        cs_result = await db.execute(select(CompanySettings).where(CompanySettings.scope == "global"))
+        cs = cs_result.scalar_one_or_none()
+        eur_rate = cs.eur_rate_kopecks if cs else None
+
+        calc = await service.calculate(shop, body.recipient.postal_code, total_weight, total_amount, eur_rate_kopecks=eur_rate)
 
     if not calc.available:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Delivery unavailable: {calc.rejection_reason}")
@@ -62,38 +122,219 @@ async def create_new_order(
         customs_fee_kopecks=calc.customs_fee_kopecks,
     )
 
-    order = await create_order(db, order)
+    try:
+        order = await create_order(db, order)
+    except IntegrityError:
+        # Параллельный повтор успел создать заказ (uq_shop_external_order)
+        await db.rollback()
+        existing = await get_order_by_external_id(db, shop_id, body.external_order_id)
+        if existing is None:
+            raise
+        response.status_code = status.HTTP_200_OK
+        return OrderResponse.model_validate(existing)
+
+    if idempotency_key:
+        await idempotency.remember_order_id(shop_id, idempotency_key, order.id)
     return OrderResponse.model_validate(order)
 
 
+@router.post("/bulk", response_model=OrderBulkResponse)
+async def create_orders_in_bulk(
+    body: OrderBulkCreate,
+    request: Request,
+    shop: Shop = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db),
+):
+    """Пакетное создание заказов: результат по каждой позиции, ошибка одной не мешает остальным."""
+    shop_id = shop.id  # shop истекает после rollback в create_orders_bulk
+
+    # Повтор запроса (ретраи плагина): уже созданные заказы возвращаем без расчёта тарифа,
+    # как POST /orders; повторы external_order_id в запросе тоже не оцениваем
+    known = await find_existing_orders(db, shop_id, [order.external_order_id for order in body.orders])
+    existing: dict[int, Row] = {}
+    errors: dict[int, str] = {}
+    seen: set[str] = set()
+    for i, order in enumerate(body.orders):
+        if order.external_order_id in known:
+            existing[i] = known[order.external_order_id]
+        elif order.external_order_id in seen:
+            errors[i] = DUPLICATE_IN_REQUEST_ERROR
+        else:
+            seen.add(order.external_order_id)
+    new = [i for i in range(len(body.orders)) if i not in existing and i not in errors]
+
+    totals = {
+        i: (
+            sum(item.price_kopecks * item.quantity for item in body.orders[i].items),
+            sum(item.weight_grams * item.quantity for item in body.orders[i].items),
+        )
+        for i in new
+    }
+
+    # Заказы с действительным quote_token не пересчитываем
+    calcs: dict[int, DeliveryCalculation] = {}
+    for i in new:
+        order, (amount, weight) = body.orders[i], totals[i]
+        if order.quote_token:
+            calc = redeem_quote_token(order.quote_token, shop, order.recipient.postal_code, weight, amount)
+            if calc is not None:
+                calcs[i] = calc
+
+    to_price = [i for i in new if i not in calcs]
+    if to_price:
+        cs_result = await db.execute(select(CompanySettings).where(CompanySettings.scope == "global"))
+        cs = cs_result.scalar_one_or_none()
+        eur_rate = cs.eur_rate_kopecks if cs else None
+
+        service = DeliveryService(request.app.state.pochta_client)
+        priced = await service.calculate_many(
+            shop,
+            [(body.orders[i].recipient.postal_code, totals[i][1], totals[i][0]) for i in to_price],
+            concurrency=settings.ORDERS_BULK_PRICING_CONCURRENCY,
+            eur_rate_kopecks=eur_rate,
+        )
+        calcs.update(zip(to_price, priced))
+
+    rows: dict[int, dict] = {}
+    for i in new:
+        order, (amount, weight), calc = body.orders[i], totals[i], calcs[i]
+        if not calc.available:
+            errors[i] = f"Delivery unavailable: {calc.rejection_reason}"
+            continue
+        rows[i] = {
+            "external_order_id": order.external_order_id,
+            "recipient_name": order.recipient.name,
+            "recipient_phone": order.recipient.phone,
+            "recipient_email": order.recipient.email,
+            "recipient_address": order.recipient.address,
+            "recipient_postal_code": order.recipient.postal_code,
+            "recipient_passport_series": order.recipient.passport_series,
+            "recipient_passport_number": order.recipient.passport_number,
+            "items": [item.model_dump() for item in order.items],
+            "total_amount_kopecks": amount,
+            "total_weight_grams": weight,
+            "delivery_cost_kopecks": calc.delivery_cost_kopecks,
+            "customs_fee_kopecks": calc.customs_fee_kopecks,
+        }
+
+    created = await create_orders_bulk(db, shop_id, rows)
+    # Параллельный запрос успел создать заказ с тем же external_order_id
+    existing.update(created.existing)
+    errors.update(created.errors)
+
+    results = []
+    for i, order in enumerate(body.orders):
+        if i in created.created:
+            results.append(OrderBulkItemResult(
+                index=i,
+                external_order_id=order.external_order_id,
+                success=True,
+                order_id=created.created[i],
+                delivery_cost_kopecks=calcs[i].delivery_cost_kopecks,
+                customs_fee_kopecks=calcs[i].customs_fee_kopecks,
+            ))
+        elif i in existing:
+            results.append(OrderBulkItemResult(
+                index=i,
+                external_order_id=order.external_order_id,
+                success=True,
+                existing=True,
+                order_id=existing[i].id,
+                delivery_cost_kopecks=existing[i].delivery_cost_kopecks,
+                customs_fee_kopecks=existing[i].customs_fee_kopecks,
+            ))
+        else:
+            results.append(OrderBulkItemResult(
+                index=i, external_order_id=order.external_order_id, success=False, error=errors[i],
+            ))
+
+    success_count = len(created.created) + len(existing)
+    return OrderBulkResponse(
+        results=results,
+        total=len(results),
+        success_count=success_count,
+        error_count=len(results) - success_count,
+    )
+
+
+@router.get("/changes", response_model=OrderChangesResponse)
+async def get_order_changes(
+    cursor: str | None = Query(None, description="next_cursor из предыдущего ответа; без него — с начала"),
+    limit: int = Query(100, ge=1, le=1000),
+    shop: Shop = Depends(verify_api_key),
+    db: AsyncSession = Depends(get_db),
+):
+    """Заказы магазина, у которых изменился статус или трекинг после cursor.
+    Синхронизация: повторять с next_cursor, пока has_more; затем опрашивать с последним next_cursor."""
+    page = await changes_page(db, shop.id, cursor, limit)
+    items = []
+    for order in page.orders:
+        last = page.last_events[order.id][-1] if page.last_events[order.id] else None
+        items.append(OrderChange(
+            id=order.id,
+            external_order_id=order.external_order_id,
+            status=order.status,
+            track_number=order.track_number,
+            internal_track_number=order.internal_track_number,
+            updated_at=order.updated_at,
+            last_event_type=last.event_type if last else None,
+            last_event_description=last.description if last else None,
+            last_event_at=last.created_at if last else None,
+        ))
+    return OrderChangesResponse(items=items, next_cursor=page.next_cursor, has_more=page.has_more)
+
+
 @router.get("/{order_id}/status", response_model=OrderStatusResponse)
 async def get_order_status(
     order_id: UUID,
+    response: Response,
+    if_none_match: str | None = Header(None),
     shop: Shop = Depends(verify_api_key),
     db: AsyncSession = Depends(get_db),
 ):
-    result = await db.execute(select(Order).where(Order.id == order_id, Order.shop_id == shop.id))
-    order = result.scalar_one_or_none()
+    result = await db.execute(
+        select(Order.id, Order.status, Order.track_number, Order.updated_at)
+        .where(Order.id == order_id, Order.shop_id == shop.id)
+    )
+    order = result.one_or_none()
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    etag = _etag(order.id, order.updated_at)
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return OrderStatusResponse.model_validate(order)
 
 
 @router.get("/{order_id}/tracking", response_model=OrderTrackingResponse)
 async def get_order_tracking(
     order_id: UUID,
+    response: Response,
+    if_none_match: str | None = Header(None),
     shop: Shop = Depends(verify_api_key),
     db: AsyncSession = Depends(get_db),
 ):
+    # Смена статуса меняет updated_at — по нему ETag проверяется до загрузки истории
     result = await db.execute(
-        select(Order).where(Order.id == order_id, Order.shop_id == shop.id).options(selectinload(Order.status_history))
+        select(Order)
+        .where(Order.id == order_id, Order.shop_id == shop.id)
+        .options(load_only(Order.id, Order.status, Order.track_number, Order.updated_at, raiseload=True))
     )
     order = result.scalar_one_or_none()
     if not order:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+    etag = _etag(order.id, order.updated_at)
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
 
-    history = [StatusHistoryEntry.model_validate(h) for h in order.status_history]
+    history_result = await db.execute(
+        select(OrderStatusHistory)
+        .where(OrderStatusHistory.order_id == order.id)
+        .order_by(OrderStatusHistory.created_at)
+    )
+    history = [StatusHistoryEntry.model_validate(h) for h in history_result.scalars()]
 
+    response.headers["ETag"] = etag
     return OrderTrackingResponse(
         id=order.id,
         status=order.status,
@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from pydantic import BaseModel
+import logging
+from datetime import datetime
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.dependencies import get_db, verify_api_key
+from app.core.config import settings
+from app.core.dependencies import get_db, verify_api_key_shop_id
 from app.models.order import Order
-from app.models.shop import Shop
 from app.models.tracking_event import TrackingEvent
 from app.models.shipment_group import ShipmentGroup
+from app.services import tracking_cache, tracking_stream
+from app.services.order_feed import order_timeline_condition, tracking_events_by_order
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/track", tags=["tracking"])
 
@@ -33,24 +42,73 @@ class TrackingResponse(BaseModel):
     events: list[TrackingEventOut]
 
 
-async def _build_tracking_response(order: Order, session: AsyncSession) -> TrackingResponse:
-    """Собирает TrackingResponse для заказа."""
-    # Загружаем TrackingEvent по order_id (а не только по track_number)
-    events_result = await session.execute(
-        select(TrackingEvent)
-        .where(TrackingEvent.order_id == order.id)
-        .order_by(TrackingEvent.created_at)
+class TrackingBatchRequest(BaseModel):
+    # ID заказа (UUID), номер заказа магазина, трек-номер ПР или внутренний трек-номер
+    ids: list[str] = Field(..., min_length=1, max_length=1000)
+    include_events: bool = False
+
+
+class TrackingBatchItem(BaseModel):
+    query: str
+    order_id: str
+    external_order_id: str
+    internal_track_number: str | None
+    track_number: str | None
+    status: str
+    updated_at: datetime
+    last_event: TrackingEventOut | None
+    events: list[TrackingEventOut] | None = None
+
+
+class TrackingBatchResponse(BaseModel):
+    results: list[TrackingBatchItem]
+    not_found: list[str]
+    found_count: int
+
+
+def _event_out(event) -> TrackingEventOut:
+    return TrackingEventOut(
+        event_type=event.event_type,
+        description=event.description,
+        location=event.location,
+        details=event.details,
+        created_at=event.created_at.isoformat(),
     )
-    events = list(events_result.scalars().all())
 
-    group = None
-    if order.shipment_group_id:
-        group_result = await session.execute(
-            select(ShipmentGroup).where(ShipmentGroup.id == order.shipment_group_id)
+
+async def _load_tracking(db: AsyncSession, shop_id: UUID, condition) -> tuple[TrackingResponse, UUID | None] | None:
+    """TrackingResponse и группа заказа одним запросом: заказ + группа + события заказа и группы (LEFT JOIN)."""
+    result = await db.execute(
+        select(
+            Order.id,
+            Order.external_order_id,
+            Order.internal_track_number,
+            Order.track_number,
+            Order.status,
+            Order.recipient_name,
+            Order.recipient_postal_code,
+            Order.shipment_group_id,
+            ShipmentGroup.number.label("group_number"),
+            ShipmentGroup.hub_name,
+            TrackingEvent.id.label("event_id"),
+            TrackingEvent.event_type,
+            TrackingEvent.description,
+            TrackingEvent.location,
+            TrackingEvent.details,
+            TrackingEvent.created_at.label("event_created_at"),
         )
-        group = group_result.scalar_one_or_none()
+        .outerjoin(ShipmentGroup, ShipmentGroup.id == Order.shipment_group_id)
+        .outerjoin(TrackingEvent, order_timeline_condition())
+        .where(Order.shop_id == shop_id, condition)
+        .order_by(Order.id, TrackingEvent.created_at)
+    )
+    rows = result.all()
+    if not rows:
+        return None
 
-    return TrackingResponse(
+    # Несколько заказов под одним номером — берём первый, как раньше
+    order = rows[0]
+    tracking = TrackingResponse(
         order_id=str(order.id),
         external_order_id=order.external_order_id,
         internal_track_number=order.internal_track_number,
@@ -58,70 +116,196 @@ async def _build_tracking_response(order: Order, session: AsyncSession) -> Track
         status=order.status,
         recipient_name=order.recipient_name,
         recipient_postal_code=order.recipient_postal_code,
-        shipment_group_number=group.number if group else None,
-        hub_name=group.hub_name if group else None,
+        shipment_group_number=order.group_number,
+        hub_name=order.hub_name,
         events=[
             TrackingEventOut(
-                event_type=e.event_type,
-                description=e.description,
-                location=e.location,
-                details=e.details,
-                created_at=e.created_at.isoformat(),
+                event_type=row.event_type,
+                description=row.description,
+                location=row.location,
+                details=row.details,
+                created_at=row.event_created_at.isoformat(),
             )
-            for e in events
+            for row in rows
+            if row.id == order.id and row.event_id is not None
         ],
     )
+    return tracking, order.shipment_group_id
+
+
+async def _tracking(db: AsyncSession, shop_id: UUID, kind: str, query: str, condition) -> Response | None:
+    """Ответ из кеша Redis или из БД (с записью в кеш). None — заказ не найден."""
+    cached = await tracking_cache.get_cached(shop_id, kind, query)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+
+    loaded = await _load_tracking(db, shop_id, condition)
+    if loaded is None:
+        return None
+    tracking, group_id = loaded
+    body = tracking.model_dump_json()
+    await tracking_cache.set_cached(shop_id, kind, query, UUID(tracking.order_id), body, group_id)
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/search/{query}", response_model=TrackingResponse)
 async def search_tracking(
     query: str,
-    shop: Shop = Depends(verify_api_key),
+    shop_id: UUID = Depends(verify_api_key_shop_id),
     db: AsyncSession = Depends(get_db),
 ):
     """Поиск по номеру заказа магазина, трек-номеру ПР или внутреннему трек-номеру.
     Магазин видит только свои заказы (авторизация по X-API-Key)."""
-    result = await db.execute(
-        select(Order).where(
-            Order.shop_id == shop.id,
-            or_(
-                Order.external_order_id == query,
-                Order.track_number == query,
-                Order.internal_track_number == query,
-            ),
-        )
-    )
-    order = result.scalar_one_or_none()
-
-    if order is None:
+    response = await _tracking(db, shop_id, "search", query, or_(
+        Order.external_order_id == query,
+        Order.track_number == query,
+        Order.internal_track_number == query,
+    ))
+    if response is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Заказ «{query}» не найден",
         )
+    return response
+
+
+@router.post("/batch", response_model=TrackingBatchResponse)
+async def batch_tracking(
+    body: TrackingBatchRequest,
+    shop_id: UUID = Depends(verify_api_key_shop_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Статусы и последние события до 1000 заказов за один запрос (синхронизация магазина).
+    Два запроса к БД на весь пакет: заказы по IN-спискам и события этих заказов."""
+    queries = list(dict.fromkeys(q.strip() for q in body.ids if q.strip()))
+    order_ids = []
+    for q in queries:
+        try:
+            order_ids.append(UUID(q))
+        except ValueError:
+            pass
+
+    conditions = [
+        Order.external_order_id.in_(queries),
+        Order.track_number.in_(queries),
+        Order.internal_track_number.in_(queries),
+    ]
+    if order_ids:
+        conditions.append(Order.id.in_(order_ids))
+    result = await db.execute(
+        select(
+            Order.id,
+            Order.external_order_id,
+            Order.internal_track_number,
+            Order.track_number,
+            Order.status,
+            Order.updated_at,
+        )
+        .where(Order.shop_id == shop_id, or_(*conditions))
+        .order_by(Order.id)
+    )
+    orders = result.all()
+
+    # Номер → заказ; при совпадении у нескольких заказов берём первый, как /track/search
+    by_key: dict[str, object] = {}
+    for order in orders:
+        for key in (str(order.id), order.internal_track_number, order.external_order_id, order.track_number):
+            if key:
+                by_key.setdefault(key, order)
+
+    events = await tracking_events_by_order(db, [order.id for order in orders], latest_only=not body.include_events)
+
+    results = []
+    not_found = []
+    for q in queries:
+        order = by_key.get(q)
+        if order is None:
+            # UUID не в каноническом виде (верхний регистр, без дефисов)
+            try:
+                order = by_key.get(str(UUID(q)))
+            except ValueError:
+                pass
+        if order is None:
+            not_found.append(q)
+            continue
+        order_events = events[order.id]
+        results.append(TrackingBatchItem(
+            query=q,
+            order_id=str(order.id),
+            external_order_id=order.external_order_id,
+            internal_track_number=order.internal_track_number,
+            track_number=order.track_number,
+            status=order.status,
+            updated_at=order.updated_at,
+            last_event=_event_out(order_events[-1]) if order_events else None,
+            events=[_event_out(e) for e in order_events] if body.include_events else None,
+        ))
+
+    return TrackingBatchResponse(results=results, not_found=not_found, found_count=len(results))
+
 
-    return await _build_tracking_response(order, db)
+@router.get("/stream")
+async def stream_tracking(
+    request: Request,
+    last_event_id: str | None = Header(None),
+    shop_id: UUID = Depends(verify_api_key_shop_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """Server-Sent Events: события трекинга заказов магазина по мере commit.
+
+    event: tracking — событие (data: JSON), id — для Last-Event-ID при переподключении.
+    event: resync — история после Last-Event-ID вытеснена, догнать через GET /orders/changes.
+    Комментарий-пинг раз в TRACKING_STREAM_PING_SECONDS держит соединение через прокси.
+    """
+    if last_event_id is not None and not tracking_stream.STREAM_ID_RE.match(last_event_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Last-Event-ID")
+    redis = await tracking_stream.get_reader() if settings.TRACKING_STREAM_ENABLED else None
+    if redis is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Tracking stream unavailable")
+    # Соединение с БД не держим на всё время потока
+    await db.close()
+
+    key = tracking_stream.stream_key(shop_id)
+    last_id, lost = await tracking_stream.start_id(redis, shop_id, last_event_id)
+
+    async def events():
+        nonlocal last_id
+        yield "retry: 3000\n\n"
+        if lost:
+            yield "event: resync\ndata: {}\n\n"
+        while not await request.is_disconnected():
+            try:
+                batches = await redis.xread({key: last_id}, count=100, block=settings.TRACKING_STREAM_PING_SECONDS * 1000)
+            except Exception:
+                logger.warning("Tracking stream: Redis read failed, closing stream for shop %s", shop_id, exc_info=True)
+                return
+            if not batches:
+                yield ": ping\n\n"
+                continue
+            for _, entries in batches:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    yield f"id: {entry_id}\nevent: tracking\ndata: {fields['data']}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{track_number}", response_model=TrackingResponse)
 async def get_tracking(
     track_number: str,
-    shop: Shop = Depends(verify_api_key),
+    shop_id: UUID = Depends(verify_api_key_shop_id),
     db: AsyncSession = Depends(get_db),
 ):
     """Трекинг по внутреннему трек-номеру (OV-YYYYMMDD-XXXXX).
     Магазин видит только свои заказы (авторизация по X-API-Key)."""
-    result = await db.execute(
-        select(Order).where(
-            Order.shop_id == shop.id,
-            Order.internal_track_number == track_number,
-        )
-    )
-    order = result.scalar_one_or_none()
-
-    if order is None:
+    response = await _tracking(db, shop_id, "track", track_number, Order.internal_track_number == track_number)
+    if response is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Трек-номер {track_number} не найден",
         )
-
-    return await _build_tracking_response(order, db)
+    return response
@@ -4,7 +4,13 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite+aiosqlite:///./ostrov.db"
+    # PostgreSQL: ключи — нативный uuid, Order.items — jsonb. Новая база — true (.env.example);
+    # существующая — false до scripts/migrate_native_types.py cutover (см. docstring скрипта)
+    DB_NATIVE_TYPES: bool = False
     REDIS_URL: str = "redis://redis:6379/0"
+    # Redis недоступен — повторное подключение через паузу, растущую вдвое (core/redis_client.py)
+    REDIS_RETRY_MIN_SECONDS: float = 1.0
+    REDIS_RETRY_MAX_SECONDS: float = 30.0
 
     JWT_SECRET_KEY: str = ""
     JWT_ALGORITHM: str = "HS256"
@@ -30,6 +36,75 @@ class Settings(BaseSettings):
     POCHTA_OBJECT_CODE: int = 23030
     POCHTA_MAIL_TYPE: str = "ONLINE_PARCEL"
 
+    # Кеш тарифов Почты: in-process LRU + Redis (см. services/tariff_cache.py)
+    TARIFF_CACHE_ENABLED: bool = True
+    TARIFF_CACHE_LOCAL_TTL_SECONDS: int = 300
+    TARIFF_CACHE_LOCAL_MAX_ENTRIES: int = 4096
+    TARIFF_CACHE_REDIS_TTL_SECONDS: int = 6 * 3600
+    TARIFF_CACHE_WEIGHT_STEP_GRAMS: int = 100
+    # Последний успешный тариф — fallback при недоступности Почты
+    TARIFF_CACHE_STALE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Устойчивость к сбоям Почты: circuit breaker по эндпоинтам + адаптивный таймаут
+    POCHTA_BREAKER_FAILURE_THRESHOLD: int = 5
+    POCHTA_BREAKER_RESET_SECONDS: float = 30.0
+    POCHTA_TIMEOUT_MIN_SECONDS: float = 2.0
+    POCHTA_TIMEOUT_MAX_SECONDS: float = 15.0
+    POCHTA_HEDGE_ENABLED: bool = True
+
+    # Срок действия quote_token из /delivery/calculate (POST /orders не пересчитывает тариф)
+    QUOTE_TOKEN_TTL_SECONDS: int = 900
+
+    # Сколько хранить Idempotency-Key для POST /orders (Redis)
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 24 * 3600
+
+    # POST /orders/bulk: сколько тарифов Почты запрашивать одновременно
+    ORDERS_BULK_PRICING_CONCURRENCY: int = 20
+
+    # Матрица тарифов (services/tariff_matrix.py): ночной пересчёт + оценка без запроса к Почте
+    TARIFF_MATRIX_CONCURRENCY: int = 5
+    TARIFF_MATRIX_RELOAD_SECONDS: int = 600
+
+    # Оптимизатор группировки: параллельный сбор тарифов по заказам хаба
+    GROUPING_TARIFF_CONCURRENCY: int = 10
+    GROUPING_TARIFF_TIMEOUT_SECONDS: float = 15.0
+    # "exact" — публичные тарифы из API Почты, "estimate" — из матрицы тарифов
+    GROUPING_TARIFF_MODE: str = "exact"
+    # Планировщик оптимизатора (services/grouping_scheduler.py): тик Beat; интервал прогона —
+    # GroupingSettings.worker_interval_minutes
+    GROUPING_SCHEDULER_TICK_SECONDS: int = 60
+    # Рост пула хаба → проверка хаба через N секунд (события за окно — одна проверка)
+    GROUPING_EVENT_TRIGGERS: bool = True
+    GROUPING_TRIGGER_DEBOUNCE_SECONDS: int = 30
+    # Блокировка хаба на время прогона; она же лимит времени задачи оптимизатора
+    GROUPING_LOCK_SECONDS: int = 1800
+
+    # Кеш ответов /track в Redis (services/tracking_cache.py), сбрасывается при записи TrackingEvent
+    TRACKING_CACHE_ENABLED: bool = True
+    TRACKING_CACHE_TTL_SECONDS: int = 300
+    # Сколько API-ключ магазина держится в памяти процесса для /track (без запроса shops)
+    API_KEY_CACHE_TTL_SECONDS: int = 60
+    # GET /orders/changes отдаёт изменения не новее N секунд (незакоммиченные транзакции)
+    CHANGE_FEED_SETTLE_SECONDS: int = 5
+    # SSE GET /track/stream: Redis Stream на магазин (services/tracking_stream.py)
+    TRACKING_STREAM_ENABLED: bool = True
+    TRACKING_STREAM_MAXLEN: int = 10000
+    TRACKING_STREAM_PING_SECONDS: int = 15
+    # Outbox вебхуков (services/webhook_outbox.py): relay забирает пачки строк
+    WEBHOOK_RELAY_BATCH_SIZE: int = 1000
+    WEBHOOK_RELAY_INTERVAL_SECONDS: int = 30
+    # Столько секунд строка закреплена за relay, взявшим её (потом её заберёт следующий)
+    WEBHOOK_RELAY_LEASE_SECONDS: int = 120
+    WEBHOOK_MAX_ATTEMPTS: int = 6
+    # Отправка: keep-alive соединений всего / параллельных запросов на магазин
+    WEBHOOK_MAX_CONNECTIONS: int = 100
+    WEBHOOK_SHOP_CONCURRENCY: int = 4
+    # Столько ошибок подряд — и остаток пачки магазина откладывается без запросов
+    WEBHOOK_SHOP_FAILURE_LIMIT: int = 3
+    # Shop.webhook_batching: до скольких событий в запросе и сколько секунд набирать пачку
+    WEBHOOK_BATCH_MAX_SIZE: int = 100
+    WEBHOOK_BATCH_WINDOW_SECONDS: int = 5
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
     @property
@@ -1,3 +1,4 @@
+import time
 from uuid import UUID
 
 from fastapi import Depends, Header, HTTPException, status
@@ -5,11 +6,15 @@ from jose import JWTError
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import decode_access_token
 from app.models.operator import Operator
 from app.models.shop import Shop
 
+_API_KEY_CACHE_MAX_ENTRIES = 10000
+_api_key_cache: dict[str, tuple[float, UUID]] = {}
+
 
 async def get_current_operator(
     authorization: str = Header(...),
@@ -49,3 +54,22 @@ async def verify_api_key(
     if not shop:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
     return shop
+
+
+async def verify_api_key_shop_id(
+    x_api_key: str = Header(...),
+    db: AsyncSession = Depends(get_db),
+) -> UUID:
+    """Как verify_api_key, но отдаёт shop_id и держит ключ в памяти процесса
+    API_KEY_CACHE_TTL_SECONDS — для частых опросов (/track) без запроса к shops.
+    Отключённый магазин перестаёт проходить не позже чем через TTL."""
+    now = time.monotonic()
+    entry = _api_key_cache.get(x_api_key)
+    if entry and entry[0] > now:
+        return entry[1]
+
+    shop = await verify_api_key(x_api_key, db)
+    if len(_api_key_cache) >= _API_KEY_CACHE_MAX_ENTRIES:
+        _api_key_cache.clear()
+    _api_key_cache[x_api_key] = (now + settings.API_KEY_CACHE_TTL_SECONDS, shop.id)
+    return shop.id
@@ -0,0 +1,140 @@
+"""Пагинация списков админки: keyset-курсор по (created_at, id) и дешёвые total.
+
+Курсор — непрозрачная строка (base64 от created_at и id последней строки страницы).
+С курсором страница выбирается условием (created_at, id) < (cursor) вместо OFFSET,
+поэтому глубокие страницы стоят столько же, сколько первая. page/per_page работают
+как раньше; next_cursor возвращается в обоих режимах.
+
+total (параметр count):
+    exact    — COUNT(*) на каждый запрос (по умолчанию, как раньше);
+    cached   — COUNT(*) кешируется в процессе на COUNT_CACHE_TTL_SECONDS;
+    estimate — оценка планировщика PostgreSQL (EXPLAIN), на SQLite — как cached;
+    none     — total не считается.
+"""
+import base64
+import json
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Literal
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, and_, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+CountMode = Literal["exact", "cached", "estimate", "none"]
+
+COUNT_CACHE_TTL_SECONDS = 60
+COUNT_CACHE_MAX_ENTRIES = 1024
+
+_count_cache: dict[str, tuple[float, int]] = {}
+
+
+@dataclass
+class Page:
+    items: list[Any]
+    total: int | None
+    next_cursor: str | None
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    raw = json.dumps({"t": created_at.isoformat(), "id": str(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["t"]), uuid.UUID(data["id"])
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    model,
+    *,
+    page: int = 1,
+    per_page: int = 20,
+    cursor: str | None = None,
+    count: CountMode = "exact",
+) -> Page:
+    """Страница query (сортировка created_at DESC, id DESC) + total по режиму count."""
+    total = await _count(db, query, count)
+
+    ordered = query.order_by(model.created_at.desc(), model.id.desc())
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        ordered = ordered.where(or_(
+            model.created_at < created_at,
+            and_(model.created_at == created_at, model.id < row_id),
+        ))
+    else:
+        ordered = ordered.offset((page - 1) * per_page)
+
+    # +1 строка — узнать, есть ли следующая страница, без COUNT
+    result = await db.execute(ordered.limit(per_page + 1))
+    items = list(result.scalars().all())
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+
+    return Page(items=items, total=total, next_cursor=next_cursor)
+
+
+def pages_count(total: int | None, per_page: int) -> int | None:
+    if total is None:
+        return None
+    return max(1, -(-total // per_page))
+
+
+# ── total ────────────────────────────────────────────────────────────────────
+
+async def _count(db: AsyncSession, query: Select, mode: CountMode) -> int | None:
+    if mode == "none":
+        return None
+    count_query = select(func.count()).select_from(query.order_by(None).subquery())
+    if mode == "exact":
+        return (await db.execute(count_query)).scalar_one()
+    if mode == "estimate" and db.bind.dialect.name == "postgresql":
+        estimated = await _planner_estimate(db, query)
+        if estimated is not None:
+            return estimated
+    return await _cached_count(db, count_query)
+
+
+async def _cached_count(db: AsyncSession, count_query: Select) -> int:
+    compiled = count_query.compile(db.bind)
+    key = f"{compiled}|{sorted(compiled.params.items(), key=lambda kv: kv[0])!r}"
+    entry = _count_cache.get(key)
+    now = time.monotonic()
+    if entry and entry[0] > now:
+        return entry[1]
+
+    total = (await db.execute(count_query)).scalar_one()
+    if len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+        _count_cache.clear()
+    _count_cache[key] = (now + COUNT_CACHE_TTL_SECONDS, total)
+    return total
+
+
+async def _planner_estimate(db: AsyncSession, query: Select) -> int | None:
+    """Число строк из плана EXPLAIN — без сканирования таблицы."""
+    try:
+        sql = query.order_by(None).compile(db.bind, compile_kwargs={"literal_binds": True})
+        # SAVEPOINT: ошибка EXPLAIN не должна ломать транзакцию запроса
+        async with db.begin_nested():
+            plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar_one()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        logger.debug("Planner row estimate failed, falling back to cached count", exc_info=True)
+        return None
@@ -0,0 +1,64 @@
+"""Подключение к Redis для кешей, потоков и служебных ключей (API и Celery).
+
+redis.asyncio привязан к event loop, а у Celery-задач свой loop на каждый
+asyncio.run — клиент хранится для текущего loop и пересоздаётся в новом.
+Неудачное подключение не выключает Redis до перезапуска процесса: до следующей
+попытки вызывающие получают None и работают без Redis; пауза растёт вдвое
+от REDIS_RETRY_MIN_SECONDS до REDIS_RETRY_MAX_SECONDS и сбрасывается после
+успешного подключения.
+"""
+import asyncio
+import logging
+import time
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RedisConnector:
+    """Ленивый клиент Redis на event loop с повторным подключением после паузы."""
+
+    def __init__(self, purpose: str, url: str | None = None, socket_timeout: float = 0.5):
+        self._purpose = purpose
+        self._url = url or settings.REDIS_URL
+        self._socket_timeout = socket_timeout
+        # Сам loop, а не id(): id закрытого loop может достаться новому
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._client = None
+        self._retry_at = 0.0
+        self._backoff = settings.REDIS_RETRY_MIN_SECONDS
+
+    async def get(self, force: bool = False):
+        """Клиент Redis или None, если Redis недоступен. force — подключаться, не дожидаясь паузы."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._client is not None:
+            return self._client
+        if not force and time.monotonic() < self._retry_at:
+            return None
+        try:
+            import redis.asyncio as aioredis
+            client = aioredis.from_url(self._url, decode_responses=True, socket_timeout=self._socket_timeout)
+            await client.ping()
+        except Exception as e:
+            self._retry_at = time.monotonic() + self._backoff
+            logger.warning("Redis unavailable for %s (%s), retry in %.0f s", self._purpose, e, self._backoff)
+            self._backoff = min(self._backoff * 2, settings.REDIS_RETRY_MAX_SECONDS)
+            return None
+        if self._loop is loop and self._client is not None:
+            # Параллельный вызов подключился раньше
+            await client.aclose()
+            return self._client
+        # Клиент прежнего loop не закрываем: его соединения принадлежат тому loop
+        self._loop, self._client = loop, client
+        self._retry_at, self._backoff = 0.0, settings.REDIS_RETRY_MIN_SECONDS
+        return client
+
+    async def close(self) -> None:
+        """Закрыть клиент (shutdown приложения, конец задачи)."""
+        client, self._client, self._loop = self._client, None, None
+        if client is not None:
+            try:
+                await client.aclose()
+            except Exception:
+                pass
@@ -4,7 +4,7 @@ import secrets
 from datetime import datetime, timedelta, timezone
 
 import bcrypt
-from jose import jwt
+from jose import JWTError, jwt
 
 from app.core.config import settings
 
@@ -29,6 +29,24 @@ def decode_access_token(token: str) -> dict:
     return jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
 
 
+def create_quote_token(claims: dict) -> str:
+    """Подписанный токен расчёта доставки (живёт QUOTE_TOKEN_TTL_SECONDS)."""
+    expire = datetime.now(timezone.utc) + timedelta(seconds=settings.QUOTE_TOKEN_TTL_SECONDS)
+    payload = {**claims, "typ": "quote", "exp": expire}
+    return jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+
+def decode_quote_token(token: str) -> dict | None:
+    """Claims токена расчёта или None (подпись неверна, истёк, не тот тип токена)."""
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("typ") != "quote":
+        return None
+    return payload
+
+
 def generate_api_key() -> str:
     return secrets.token_hex(32)
 
@@ -4,13 +4,16 @@ from app.models.batch import Batch
 from app.models.company_settings import CompanySettings
 from app.models.customs_declaration import CustomsDeclaration
 from app.models.grouping_settings import GroupingSettings
+from app.models.hub_pool import HubPool
 from app.models.operator import Operator
 from app.models.order import Order
+from app.models.order_item import OrderItem
 from app.models.order_status_history import OrderStatusHistory
 from app.models.shipment_group import ShipmentGroup
 from app.models.shop import Shop
 from app.models.tn_ved_code import TnVedCode
 from app.models.tracking_event import TrackingEvent
+from app.models.webhook_outbox import WebhookOutbox
 
 __all__ = [
     "AuditLog",
@@ -19,11 +22,14 @@ __all__ = [
     "CompanySettings",
     "CustomsDeclaration",
     "GroupingSettings",
+    "HubPool",
     "Operator",
     "Order",
+    "OrderItem",
     "OrderStatusHistory",
     "ShipmentGroup",
     "Shop",
     "TnVedCode",
     "TrackingEvent",
+    "WebhookOutbox",
 ]
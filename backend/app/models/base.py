@@ -2,18 +2,33 @@ import uuid
 from datetime import datetime, timezone
 
 from sqlalchemy import DateTime, String, TypeDecorator
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
+from app.core.config import settings
+
+
+def native_types(dialect) -> bool:
+    """Нативные uuid/jsonb: только PostgreSQL и только после миграции (DB_NATIVE_TYPES)."""
+    return dialect.name == "postgresql" and settings.DB_NATIVE_TYPES
+
 
 class UUIDType(TypeDecorator):
-    """UUID stored as string for SQLite compatibility."""
+    """UUID: нативный uuid в PostgreSQL, строка String(36) в SQLite."""
     impl = String(36)
     cache_ok = True
 
+    def load_dialect_impl(self, dialect):
+        if native_types(dialect):
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=True))
+        return dialect.type_descriptor(String(36))
+
     def process_bind_param(self, value, dialect):
-        if value is not None:
-            return str(value)
-        return value
+        if value is None:
+            return value
+        if native_types(dialect):
+            return value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+        return str(value)
 
     def process_result_value(self, value, dialect):
         if value is not None:
@@ -37,3 +37,12 @@ class GroupingSettings(Base, TimestampMixin):
 
     # Описание для операторов
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    @classmethod
+    def defaults(cls) -> "GroupingSettings":
+        """Глобальные настройки из default колонок — пока записи в базе нет (не добавляется в сессию)."""
+        return cls(**{
+            column.key: column.default.arg
+            for column in cls.__table__.columns
+            if column.default is not None and column.default.is_scalar
+        })
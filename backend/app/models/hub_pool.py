@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, DateTime, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class HubPool(Base):
+    """Агрегаты пула заказов хаба: customs_cleared без группы отправки.
+
+    Поддерживаются инкрементально при входе и выходе заказов из пула
+    (services/hub_pool.py); оптимизатор и дашборд читают их вместо заказов.
+    """
+
+    __tablename__ = "hub_pools"
+
+    hub: Mapped[str] = mapped_column(String(50), primary_key=True)
+    orders_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    total_weight_grams: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    # Сумма публичных тарифов заказов, у которых он уже известен (priced_count из orders_count)
+    public_tariff_kopecks: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
+    priced_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # created_at самого старого заказа пула; дедлайн хаба = oldest_created_at + max_wait_hours
+    oldest_created_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        nullable=False,
+    )
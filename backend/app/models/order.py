@@ -1,26 +1,37 @@
+import logging
 import uuid
 
 import json
 
-from sqlalchemy import CheckConstraint, Float, ForeignKey, Index, Integer, String, Text, TypeDecorator, UniqueConstraint
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import CheckConstraint, Float, ForeignKey, Index, Integer, String, Text, TypeDecorator, UniqueConstraint, event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Mapped, mapped_column, query_expression, relationship
 
 from app.core.encryption import decrypt_pii, encrypt_pii
-from app.models.base import Base, TimestampMixin, generate_uuid
+from app.models.base import Base, TimestampMixin, generate_uuid, native_types
+from app.core.hubs import get_hub_for_postal_code
+
+logger = logging.getLogger(__name__)
 
 
 class JSONType(TypeDecorator):
-    """JSON type that works with both PostgreSQL and SQLite."""
+    """JSON: jsonb в PostgreSQL, текст с json.dumps/json.loads в SQLite."""
     impl = Text
     cache_ok = True
 
+    def load_dialect_impl(self, dialect):
+        if native_types(dialect):
+            return dialect.type_descriptor(postgresql.JSONB())
+        return dialect.type_descriptor(Text())
+
     def process_bind_param(self, value, dialect):
-        if value is not None:
+        # jsonb сериализует сам тип диалекта
+        if value is not None and not native_types(dialect):
             return json.dumps(value, ensure_ascii=False)
         return value
 
     def process_result_value(self, value, dialect):
-        if value is not None:
+        if value is not None and not native_types(dialect):
             return json.loads(value)
         return value
 
@@ -39,6 +50,15 @@ class EncryptedString(TypeDecorator):
         return decrypt_pii(value)
 
 
+# Пул оптимизатора группировки: прошёл таможню и ещё не в группе отправки
+POOL_STATUS = "customs_cleared"
+POOL_CONDITION_SQL = f"status = '{POOL_STATUS}' AND shipment_group_id IS NULL"
+
+
+def _hub_default(context) -> str:
+    return get_hub_for_postal_code(context.get_current_parameters()["recipient_postal_code"])
+
+
 class Order(Base, TimestampMixin):
     __tablename__ = "orders"
     __table_args__ = (
@@ -54,19 +74,34 @@ class Order(Base, TimestampMixin):
         Index("ix_orders_status", "status"),
         Index("ix_orders_batch_id", "batch_id"),
         Index("ix_orders_created_at", "created_at"),
+        # Keyset-пагинация списков: ORDER BY created_at DESC, id DESC
+        Index("ix_orders_created_at_id", "created_at", "id"),
         Index("ix_orders_customs_declaration_id", "customs_declaration_id"),
+        # POST /track/batch: поиск заказов магазина по трек-номеру ПР
+        Index("ix_orders_shop_id_track_number", "shop_id", "track_number"),
+        # GET /orders/changes: курсор (updated_at, id) в пределах магазина
+        Index("ix_orders_shop_id_updated_at_id", "shop_id", "updated_at", "id"),
+        # Пул оптимизатора группировки по хабу (services/hub_pool.py): заказы хаба и самый старый
+        Index(
+            "ix_orders_pool_hub_created_at", "hub", "created_at",
+            postgresql_where=text(POOL_CONDITION_SQL),
+            sqlite_where=text(POOL_CONDITION_SQL),
+        ),
     )
 
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=generate_uuid)
     shop_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("shops.id"), nullable=False)
     external_order_id: Mapped[str] = mapped_column(String(100), nullable=False)
-    status: Mapped[str] = mapped_column(String(30), default="accepted", nullable=False)
+    # active_history: старое значение нужно слушателю агрегатов пула (services/hub_pool.py)
+    status: Mapped[str] = mapped_column(String(30), default="accepted", nullable=False, active_history=True)
 
     recipient_name: Mapped[str] = mapped_column(String(255), nullable=False)
     recipient_phone: Mapped[str] = mapped_column(String(20), nullable=False)
     recipient_email: Mapped[str | None] = mapped_column(String(255), nullable=True)
     recipient_address: Mapped[str] = mapped_column(Text, nullable=False)
     recipient_postal_code: Mapped[str] = mapped_column(String(6), nullable=False)
+    # Хаб по индексу получателя (core/hubs.py) — считается при вставке, индекс не меняется
+    hub: Mapped[str | None] = mapped_column(String(50), default=_hub_default, nullable=True)
     # Паспортные данные получателя (требование ФТС для ДТЭГ)
     # Зашифрованы Fernet (AES-128-CBC + HMAC-SHA256) — требование ФЗ-152
     recipient_passport_series: Mapped[str | None] = mapped_column(EncryptedString, nullable=True)
@@ -74,24 +109,29 @@ class Order(Base, TimestampMixin):
 
     items: Mapped[list] = mapped_column(JSONType, nullable=False)
     total_amount_kopecks: Mapped[int] = mapped_column(Integer, nullable=False)
-    total_weight_grams: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_weight_grams: Mapped[int] = mapped_column(Integer, nullable=False, active_history=True)
     delivery_cost_kopecks: Mapped[int] = mapped_column(Integer, nullable=False)
     customs_fee_kopecks: Mapped[int] = mapped_column(Integer, nullable=False)
 
     track_number: Mapped[str | None] = mapped_column(String(30), nullable=True)
     internal_track_number: Mapped[str | None] = mapped_column(String(30), nullable=True, index=True)
     batch_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("batches.id"), nullable=True)
-    shipment_group_id: Mapped[uuid.UUID | None] = mapped_column(ForeignKey("shipment_groups.id"), nullable=True)
+    shipment_group_id: Mapped[uuid.UUID | None] = mapped_column(
+        ForeignKey("shipment_groups.id"), nullable=True, active_history=True
+    )
     customs_declaration_id: Mapped[uuid.UUID | None] = mapped_column(
         ForeignKey("customs_declarations.id"), nullable=True
     )
 
     # Тарифы: сохраняем при расчёте для отображения экономии в карточке
-    public_tariff_kopecks: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    public_tariff_kopecks: Mapped[int | None] = mapped_column(Integer, nullable=True, active_history=True)
     contract_tariff_kopecks: Mapped[int | None] = mapped_column(Integer, nullable=True)
     tariff_savings_kopecks: Mapped[int | None] = mapped_column(Integer, nullable=True)
     tariff_savings_percent: Mapped[float | None] = mapped_column(nullable=True)
 
+    # Число позиций, посчитанное в SQL для списков (with_expression), — без разбора items
+    items_count: Mapped[int | None] = query_expression()
+
     shop = relationship("Shop", back_populates="orders")
     batch = relationship("Batch", back_populates="orders")
     shipment_group = relationship("ShipmentGroup", back_populates="orders")
@@ -102,3 +142,61 @@ class Order(Base, TimestampMixin):
         order_by="TrackingEvent.created_at",
         foreign_keys="TrackingEvent.order_id",
     )
+
+
+# ── Поисковый индекс (запросы — services/order_search.py) ─────────────────────
+# PostgreSQL: GIN-индекс pg_trgm по склейке полей (ILIKE '%x%' идёт по индексу).
+# SQLite (dev): FTS5-таблица orders_search с trigram-токенизатором, синхронизируется триггерами.
+
+ORDER_SEARCH_COLUMNS = (
+    "recipient_name",
+    "external_order_id",
+    "track_number",
+    "internal_track_number",
+    "recipient_phone",
+    "recipient_email",
+)
+
+
+def order_search_document(table: str | None = "orders") -> str:
+    """SQL-выражение документа поиска. Текст должен совпадать в индексе и в запросе."""
+    prefix = f"{table}." if table else ""
+    return " || ' ' || ".join(f"coalesce({prefix}{column}, '')" for column in ORDER_SEARCH_COLUMNS)
+
+
+def order_search_ddl(dialect_name: str) -> list[str]:
+    """Идемпотентный DDL поискового индекса для диалекта (create_all и init_db)."""
+    if dialect_name == "postgresql":
+        return [
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+            "CREATE INDEX IF NOT EXISTS ix_orders_search_trgm ON orders "
+            f"USING gin (({order_search_document(None)}) gin_trgm_ops)",
+        ]
+    if dialect_name == "sqlite":
+        columns = ", ".join(ORDER_SEARCH_COLUMNS)
+        new_values = ", ".join(f"new.{c}" for c in ORDER_SEARCH_COLUMNS)
+        old_values = ", ".join(f"old.{c}" for c in ORDER_SEARCH_COLUMNS)
+        return [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS orders_search USING fts5({columns}, "
+            "content='orders', content_rowid='rowid', tokenize='trigram')",
+            "CREATE TRIGGER IF NOT EXISTS orders_search_ai AFTER INSERT ON orders BEGIN "
+            f"INSERT INTO orders_search(rowid, {columns}) VALUES (new.rowid, {new_values}); END",
+            "CREATE TRIGGER IF NOT EXISTS orders_search_ad AFTER DELETE ON orders BEGIN "
+            f"INSERT INTO orders_search(orders_search, rowid, {columns}) VALUES ('delete', old.rowid, {old_values}); END",
+            f"CREATE TRIGGER IF NOT EXISTS orders_search_au AFTER UPDATE OF {columns} ON orders BEGIN "
+            f"INSERT INTO orders_search(orders_search, rowid, {columns}) VALUES ('delete', old.rowid, {old_values}); "
+            f"INSERT INTO orders_search(rowid, {columns}) VALUES (new.rowid, {new_values}); END",
+            "INSERT INTO orders_search(orders_search) VALUES ('rebuild')",
+        ]
+    return []
+
+
+@event.listens_for(Order.__table__, "after_create")
+def _create_search_index(target, connection, **kw):
+    for statement in order_search_ddl(connection.dialect.name):
+        try:
+            with connection.begin_nested():
+                connection.exec_driver_sql(statement)
+        except Exception as e:
+            # Без индекса поиск работает, но медленнее (например, нет прав на CREATE EXTENSION)
+            logger.warning("Order search index: %s failed: %s", statement.split("(")[0], e)
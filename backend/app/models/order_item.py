@@ -0,0 +1,52 @@
+import uuid
+
+from sqlalchemy import ForeignKey, Index, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base, generate_uuid
+
+
+class OrderItem(Base):
+    """Позиция заказа — нормализованная копия элемента Order.items.
+
+    Order.items (JSON) остаётся в ответах API; строки пишутся вместе с ним
+    (services/order_items.py) и нужны для индексных запросов по ТН ВЭД и стране.
+    """
+
+    __tablename__ = "order_items"
+    __table_args__ = (
+        # Ведущая колонка order_id — индекс для выборки позиций заказа
+        UniqueConstraint("order_id", "position", name="uq_order_items_order_position"),
+        # varchar_pattern_ops: LIKE '6403%' по индексу при любой collation
+        Index("ix_order_items_tn_ved_code", "tn_ved_code", postgresql_ops={"tn_ved_code": "varchar_pattern_ops"}),
+        Index("ix_order_items_country_of_origin", "country_of_origin"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=generate_uuid)
+    order_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    position: Mapped[int] = mapped_column(Integer, nullable=False)  # индекс в Order.items
+
+    name: Mapped[str] = mapped_column(Text, nullable=False)
+    sku: Mapped[str | None] = mapped_column(Text, nullable=True)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    price_kopecks: Mapped[int] = mapped_column(Integer, nullable=False)
+    weight_grams: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    # Таможенные поля (заполняются оператором при создании ДТЭГ).
+    # Длины с запасом: магазин может прислать их в заказе без проверки формата
+    tn_ved_code: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    country_of_origin: Mapped[str | None] = mapped_column(String(10), nullable=True)
+    brand: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    def to_dict(self) -> dict:
+        """Элемент в формате Order.items."""
+        return {
+            "name": self.name,
+            "sku": self.sku,
+            "quantity": self.quantity,
+            "price_kopecks": self.price_kopecks,
+            "weight_grams": self.weight_grams,
+            "tn_ved_code": self.tn_ved_code,
+            "country_of_origin": self.country_of_origin,
+            "brand": self.brand,
+        }
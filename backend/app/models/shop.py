@@ -14,6 +14,8 @@ class Shop(Base, TimestampMixin):
     domain: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
     api_key: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
     webhook_url: Mapped[str | None] = mapped_column(String(512), nullable=True)
+    # Вебхуки пачками: JSON-массив событий, одна подпись на запрос (services/webhook_outbox.py)
+    webhook_batching: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     customs_fee_kopecks: Mapped[int] = mapped_column(Integer, default=15000, nullable=False)
     sender_postal_code: Mapped[str] = mapped_column(String(6), default="238311", nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
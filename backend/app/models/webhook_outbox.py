@@ -0,0 +1,38 @@
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base, generate_uuid
+from app.models.order import JSONType
+
+
+class WebhookOutbox(Base):
+    """Вебхук магазину, записанный в одной транзакции со сменой статуса.
+
+    Строку забирает relay (services/webhook_outbox.py) и удаляет после доставки.
+    pending — ждёт отправки с next_attempt_at; failed — попытки исчерпаны.
+    """
+
+    __tablename__ = "webhook_outbox"
+    __table_args__ = (
+        # Выборка relay: WHERE status = 'pending' AND next_attempt_at <= now ORDER BY next_attempt_at
+        Index("ix_webhook_outbox_status_next_attempt", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=generate_uuid)
+    shop_id: Mapped[uuid.UUID] = mapped_column(ForeignKey("shops.id"), nullable=False)
+    order_id: Mapped[uuid.UUID | None] = mapped_column(nullable=True)
+    event: Mapped[str] = mapped_column(String(50), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONType, nullable=False)
+
+    status: Mapped[str] = mapped_column(String(20), default="pending", nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
@@ -28,10 +28,11 @@ class BatchResponse(BaseModel):
 
 class BatchListResponse(BaseModel):
     items: list[BatchResponse]
-    total: int
+    total: int | None  # None при count=none
     page: int
     per_page: int
-    pages: int
+    pages: int | None
+    next_cursor: str | None = None  # для ?cursor= следующей страницы
 
 
 class BatchStatusUpdate(BaseModel):
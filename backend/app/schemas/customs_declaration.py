@@ -69,10 +69,11 @@ class CustomsDeclarationDetailResponse(CustomsDeclarationResponse):
 
 class CustomsDeclarationListResponse(BaseModel):
     items: list[CustomsDeclarationResponse]
-    total: int
+    total: int | None  # None при count=none
     page: int
     per_page: int
-    pages: int
+    pages: int | None
+    next_cursor: str | None = None  # для ?cursor= следующей страницы
 
 
 class OrderItemCustomsUpdate(BaseModel):
@@ -1,10 +1,32 @@
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
+# Коды вариантов доставки — см. services/delivery.py DELIVERY_OPTIONS
+DeliveryOptionCode = Literal["ONLINE_PARCEL", "ONLINE_COURIER", "EMS"]
+
 
 class CalculateRequest(BaseModel):
     postal_code: str = Field(..., min_length=5, max_length=6)
     weight_grams: int = Field(..., gt=0)
     total_amount_kopecks: int = Field(..., gt=0)
+    # Дополнительные варианты доставки: считаются параллельно в одном запросе
+    options: list[DeliveryOptionCode] | None = Field(None, max_length=5)
+    # "estimate" — мгновенная оценка по матрице тарифов (для checkout), "exact" — тариф Почты
+    mode: Literal["exact", "estimate"] = "exact"
+
+
+class DeliveryOptionQuote(BaseModel):
+    option: DeliveryOptionCode
+    delivery_cost_kopecks: int
+    customs_fee_kopecks: int
+    total_cost_kopecks: int
+    delivery_days_min: int
+    delivery_days_max: int
+    available: bool
+    rejection_reason: str | None = None
+    stale: bool = False
+    estimated: bool = False
 
 
 class CalculateResponse(BaseModel):
@@ -15,3 +37,8 @@ class CalculateResponse(BaseModel):
     delivery_days_max: int
     available: bool
     rejection_reason: str | None = None
+    stale: bool = False
+    estimated: bool = False
+    # Подписанный расчёт для POST /orders (поле quote_token) — заказ создаётся без повторного расчёта
+    quote_token: str | None = None
+    options: list[DeliveryOptionQuote] = []
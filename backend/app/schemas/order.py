@@ -71,6 +71,31 @@ class OrderCreate(BaseModel):
     external_order_id: str = Field(..., min_length=1)
     recipient: RecipientData
     items: list[OrderItem] = Field(..., min_length=1)
+    # quote_token из /delivery/calculate: если совпадают индекс, вес и сумма — тариф не пересчитывается
+    quote_token: str | None = None
+
+
+class OrderBulkCreate(BaseModel):
+    orders: list[OrderCreate] = Field(..., min_length=1, max_length=5000)
+
+
+class OrderBulkItemResult(BaseModel):
+    index: int  # позиция в запросе
+    external_order_id: str
+    success: bool
+    # Заказ с этим external_order_id уже был создан (повтор запроса) — возвращён он, тариф не пересчитан
+    existing: bool = False
+    order_id: UUID | None = None
+    delivery_cost_kopecks: int | None = None
+    customs_fee_kopecks: int | None = None
+    error: str | None = None
+
+
+class OrderBulkResponse(BaseModel):
+    results: list[OrderBulkItemResult]
+    total: int
+    success_count: int
+    error_count: int
 
 
 class OrderResponse(BaseModel):
@@ -116,6 +141,25 @@ class OrderStatusResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class OrderChange(BaseModel):
+    id: UUID
+    external_order_id: str
+    status: str
+    track_number: str | None
+    internal_track_number: str | None
+    updated_at: datetime
+    last_event_type: str | None
+    last_event_description: str | None
+    last_event_at: datetime | None
+
+
+class OrderChangesResponse(BaseModel):
+    items: list[OrderChange]
+    # Сохранить и передать в следующий запрос; не меняется, если изменений нет
+    next_cursor: str | None
+    has_more: bool
+
+
 class StatusHistoryEntry(BaseModel):
     old_status: str | None
     new_status: str
@@ -189,14 +233,58 @@ class OrderDetailResponse(BaseModel):
         return self
 
 
+class OrderListItem(BaseModel):
+    """Строка списка заказов: без паспортных данных и позиций (только их число)."""
+
+    id: UUID
+    external_order_id: str
+    shop_name: str | None = None
+    status: str
+    recipient_name: str
+    recipient_phone: str
+    recipient_email: str | None
+    recipient_address: str
+    recipient_postal_code: str
+    items_count: int
+    total_amount_kopecks: int
+    total_weight_grams: int
+    delivery_cost_kopecks: int
+    customs_fee_kopecks: int
+    track_number: str | None
+    internal_track_number: str | None = None
+    batch_id: UUID | None
+    customs_declaration_id: UUID | None = None
+    customs_declaration_number: str | None = None
+    customs_declaration_status: str | None = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
 class OrderListResponse(BaseModel):
-    items: list[OrderResponse]
-    total: int
+    items: list[OrderListItem]
+    total: int | None  # None при count=none
     page: int
     per_page: int
-    pages: int
+    pages: int | None
+    next_cursor: str | None = None  # для ?cursor= следующей страницы
 
 
 class ChangeStatusRequest(BaseModel):
     status: str
     comment: str | None = None
+
+
+class BulkChangeStatusRequest(BaseModel):
+    order_ids: list[UUID] = Field(..., min_length=1, max_length=5000)
+    status: str
+    comment: str | None = None
+
+
+class BulkChangeStatusResponse(BaseModel):
+    changed: list[UUID]
+    # order_id → причина, по которой статус не изменён
+    skipped: dict[UUID, str]
+    changed_count: int
+    skipped_count: int
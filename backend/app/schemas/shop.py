@@ -40,6 +40,7 @@ class ShopCreate(BaseModel):
     name: str = Field(..., min_length=1)
     domain: str = Field(..., min_length=3)
     webhook_url: str | None = None
+    webhook_batching: bool = False
     customs_fee_kopecks: int = Field(default=15000, ge=0)
     sender_postal_code: str = Field(default="238311", min_length=5, max_length=6)
 
@@ -52,6 +53,7 @@ class ShopCreate(BaseModel):
 class ShopUpdate(BaseModel):
     name: str | None = None
     webhook_url: str | None = None
+    webhook_batching: bool | None = None
     customs_fee_kopecks: int | None = None
     sender_postal_code: str | None = None
     is_active: bool | None = None
@@ -68,6 +70,7 @@ class ShopResponse(BaseModel):
     name: str
     domain: str
     webhook_url: str | None
+    webhook_batching: bool
     customs_fee_kopecks: int
     sender_postal_code: str
     is_active: bool
@@ -79,3 +82,25 @@ class ShopResponse(BaseModel):
 class ShopCreateResponse(ShopResponse):
     """Ответ при создании магазина — содержит API-ключ (показывается один раз)."""
     api_key: str
+
+
+class WebhookDeadLetter(BaseModel):
+    """Вебхук, который не удалось доставить за WEBHOOK_MAX_ATTEMPTS попыток."""
+    id: UUID
+    order_id: UUID | None
+    event: str
+    payload: dict
+    attempts: int
+    last_error: str | None
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+
+class WebhookReplayRequest(BaseModel):
+    # None — все недоставленные вебхуки магазина
+    ids: list[UUID] | None = Field(None, max_length=10000)
+
+
+class WebhookReplayResponse(BaseModel):
+    replayed: int
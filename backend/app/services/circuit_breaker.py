@@ -0,0 +1,102 @@
+"""Circuit breaker с адаптивным таймаутом для внешних API (Почта России).
+
+Состояния:
+    closed    — запросы идут как обычно, считаем подряд идущие ошибки;
+    open      — после failure_threshold ошибок подряд запросы сразу отклоняются
+                (CircuitOpenError) в течение reset_seconds;
+    half_open — по истечении reset_seconds пропускается один пробный запрос:
+                успех → closed, ошибка → снова open.
+
+Таймаут запроса подстраивается под наблюдаемую задержку:
+    timeout = clamp(p95(latency) * TIMEOUT_MULTIPLIER, timeout_min, timeout_max)
+Пока замеров мало, используется timeout_max.
+"""
+import time
+from collections import deque
+
+TIMEOUT_MULTIPLIER = 3.0
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 20
+MIN_HEDGE_DELAY = 0.2
+
+
+class CircuitOpenError(Exception):
+    """Запрос отклонён: circuit breaker эндпоинта открыт."""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Circuit open for {endpoint}, retry after {retry_after:.0f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        endpoint: str,
+        failure_threshold: int,
+        reset_seconds: float,
+        timeout_min: float,
+        timeout_max: float,
+    ):
+        self.endpoint = endpoint
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._timeout_min = timeout_min
+        self._timeout_max = timeout_max
+
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def check(self) -> None:
+        """Разрешить запрос или бросить CircuitOpenError."""
+        if self.state == "closed":
+            return
+        now = time.monotonic()
+        if self.state == "open":
+            retry_after = self._opened_at + self._reset_seconds - now
+            if retry_after > 0:
+                raise CircuitOpenError(self.endpoint, retry_after)
+            self.state = "half_open"
+        # half_open: пропускаем только один пробный запрос
+        if self._probe_in_flight:
+            raise CircuitOpenError(self.endpoint, self._reset_seconds)
+        self._probe_in_flight = True
+
+    def record_success(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._failures = 0
+        self._probe_in_flight = False
+        self.state = "closed"
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self._failures >= self._failure_threshold:
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Запрос отменён без результата (например, проигравший hedged-запрос)."""
+        self._probe_in_flight = False
+
+    def timeout(self) -> float:
+        p95 = self._percentile(0.95)
+        if p95 is None:
+            return self._timeout_max
+        return min(self._timeout_max, max(self._timeout_min, p95 * TIMEOUT_MULTIPLIER))
+
+    def hedge_delay(self) -> float | None:
+        """Через сколько секунд отправлять дублирующий запрос (None — пока не хеджируем)."""
+        p95 = self._percentile(0.95)
+        if p95 is None:
+            return None
+        return max(MIN_HEDGE_DELAY, p95)
+
+    def _percentile(self, q: float) -> float | None:
+        if len(self._latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
@@ -1,5 +1,4 @@
 """Бизнес-логика таможенных деклараций ДТЭГ (Решение ЕЭК №142)."""
-import copy
 import secrets
 import uuid
 from datetime import datetime, timezone
@@ -13,6 +12,8 @@ from sqlalchemy.orm.attributes import flag_modified
 from app.models.company_settings import CompanySettings
 from app.models.customs_declaration import CustomsDeclaration
 from app.models.order import Order
+from app.services.order import lean_order_options
+from app.services.order_items import load_order_items, replace_order_items
 
 
 DECLARATION_ALLOWED_TRANSITIONS = {
@@ -67,7 +68,7 @@ async def create_declaration(
     goods_location: str | None = None,
     operator_note: str | None = None,
 ) -> CustomsDeclaration:
-    result = await db.execute(select(Order).where(Order.id.in_(order_ids)))
+    result = await db.execute(select(Order).where(Order.id.in_(order_ids)).options(*lean_order_options()))
     orders = list(result.scalars().all())
 
     if len(orders) != len(order_ids):
@@ -107,7 +108,8 @@ async def create_declaration(
 
     total_weight = sum(o.total_weight_grams for o in orders)
     total_value = sum(o.total_amount_kopecks for o in orders)
-    total_items = sum(len(o.items) for o in orders)
+    items_by_order = await load_order_items(db, [o.id for o in orders])
+    total_items = sum(len(items) for items in items_by_order.values())
 
     total_value_usd_cents = 0
     if company.usd_rate_kopecks > 0:
@@ -158,7 +160,8 @@ async def get_declaration(
     stmt = (
         select(CustomsDeclaration)
         .where(CustomsDeclaration.id == declaration_id)
-        .options(selectinload(CustomsDeclaration.orders))
+        # Позиции читаются из order_items (load_order_items), JSON не разбирается
+        .options(selectinload(CustomsDeclaration.orders).defer(Order.items, raiseload=True))
     )
     if for_update:
         stmt = stmt.with_for_update()
@@ -236,6 +239,7 @@ async def validate_declaration(
         errors.append("Не заполнен отправитель (настройки компании)")
 
     eur_rate = company.eur_rate_kopecks or 10500
+    items_by_order = await load_order_items(db, [order.id for order in declaration.orders])
 
     for order in declaration.orders:
         order_prefix = f"Заказ {order.external_order_id}"
@@ -260,9 +264,9 @@ async def validate_declaration(
             )
 
         # Проверка товаров
-        for i, item in enumerate(order.items):
-            prefix = f"{order_prefix}, товар {i + 1} «{item['name']}»"
-            tn_code = item.get("tn_ved_code", "")
+        for i, item in enumerate(items_by_order[order.id]):
+            prefix = f"{order_prefix}, товар {i + 1} «{item.name}»"
+            tn_code = item.tn_ved_code or ""
             if not tn_code:
                 errors.append(f"{prefix}: нет кода ТН ВЭД")
             elif len(tn_code.strip()) < 6:
@@ -270,7 +274,7 @@ async def validate_declaration(
             elif _is_prohibited_tn_ved(tn_code.strip()):
                 errors.append(f"{prefix}: код ТН ВЭД {tn_code} — запрещённый/подакцизный товар")
 
-            if not item.get("country_of_origin"):
+            if not item.country_of_origin:
                 errors.append(f"{prefix}: нет страны происхождения")
 
     return len(errors) == 0, errors
@@ -287,8 +291,9 @@ async def update_order_items_customs(
     if not order:
         raise HTTPException(404, "Заказ не найден")
 
-    # Deep copy to ensure SQLAlchemy detects changes in JSON field
-    items = copy.deepcopy(order.items)
+    # Новый список (элементы — плоские dict, хватает поверхностной копии),
+    # чтобы SQLAlchemy увидел изменение JSON-поля
+    items = [dict(item) for item in order.items]
     for upd in updates:
         idx = upd["item_index"]
         if idx < 0 or idx >= len(items):
@@ -300,6 +305,7 @@ async def update_order_items_customs(
 
     order.items = items
     flag_modified(order, "items")
+    await replace_order_items(db, order.id, items)
     await db.commit()
     await db.refresh(order)
     return order
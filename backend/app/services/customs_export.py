@@ -10,6 +10,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models.customs_declaration import CustomsDeclaration
+from app.models.order import Order
+from app.services.order_items import load_order_items
 
 
 def _esc(value: Any) -> str:
@@ -37,7 +39,7 @@ async def _get_declaration(db: AsyncSession, declaration_id: uuid.UUID) -> Custo
     result = await db.execute(
         select(CustomsDeclaration)
         .where(CustomsDeclaration.id == declaration_id)
-        .options(selectinload(CustomsDeclaration.orders))
+        .options(selectinload(CustomsDeclaration.orders).defer(Order.items, raiseload=True))
     )
     declaration = result.scalar_one_or_none()
     if not declaration:
@@ -48,6 +50,7 @@ async def _get_declaration(db: AsyncSession, declaration_id: uuid.UUID) -> Custo
 async def generate_csv(db: AsyncSession, declaration_id: uuid.UUID) -> io.StringIO:
     """CSV по структуре ДТЭГ (Решение ЕЭК №142) для импорта в таможенное ПО."""
     declaration = await _get_declaration(db, declaration_id)
+    items_by_order = await load_order_items(db, [order.id for order in declaration.orders])
 
     output = io.StringIO()
     # BOM for Excel
@@ -94,22 +97,22 @@ async def generate_csv(db: AsyncSession, declaration_id: uuid.UUID) -> io.String
         waybill_seq += 1
         item_in_waybill = 0
 
-        for item in order.items:
+        for item in items_by_order[order.id]:
             item_global_seq += 1
             item_in_waybill += 1
 
-            qty = item["quantity"]
-            weight_brutto_kg = round(item["weight_grams"] * qty / 1000, 3)
+            qty = item.quantity
+            weight_brutto_kg = round(item.weight_grams * qty / 1000, 3)
             # Для товаров ≤200 EUR масса нетто = масса брутто (п.27 ДТЭГ)
             weight_netto_kg = weight_brutto_kg
-            value_rub = round(item["price_kopecks"] * qty / 100, 2)
+            value_rub = round(item.price_kopecks * qty / 100, 2)
             # Таможенная стоимость = стоимость товара (для ≤200 EUR)
             customs_value_rub = value_rub
 
             value_usd = 0.0
             if declaration.total_value_kopecks > 0 and declaration.total_value_usd_cents > 0:
                 ratio = declaration.total_value_usd_cents / declaration.total_value_kopecks
-                value_usd = round(item["price_kopecks"] * qty * ratio / 100, 2)
+                value_usd = round(item.price_kopecks * qty * ratio / 100, 2)
 
             writer.writerow([_sanitize_csv_value(v) for v in [
                 declaration.number,
@@ -127,10 +130,10 @@ async def generate_csv(db: AsyncSession, declaration_id: uuid.UUID) -> io.String
                 order.recipient_passport_series or "",
                 order.recipient_passport_number or "",
                 f"{item_global_seq}/{item_in_waybill}",
-                item["name"],
-                item.get("tn_ved_code", ""),
-                item.get("country_of_origin", ""),
-                item.get("brand", ""),
+                item.name,
+                item.tn_ved_code or "",
+                item.country_of_origin or "",
+                item.brand or "",
                 "",  # Доп. единицы (не обязательно при ≤200 EUR)
                 weight_brutto_kg,
                 weight_netto_kg,
@@ -170,6 +173,7 @@ async def generate_pdf(db: AsyncSession, declaration_id: uuid.UUID) -> io.BytesI
     import os
 
     declaration = await _get_declaration(db, declaration_id)
+    items_by_order = await load_order_items(db, [order.id for order in declaration.orders])
 
     # Регистрация кириллического шрифта (regular + bold)
     fonts_dir = os.path.join(os.path.dirname(__file__), "fonts")
@@ -292,18 +296,18 @@ async def generate_pdf(db: AsyncSession, declaration_id: uuid.UUID) -> io.BytesI
         waybill_seq += 1
         item_in_waybill = 0
 
-        for item in order.items:
+        for item in items_by_order[order.id]:
             item_global_seq += 1
             item_in_waybill += 1
 
-            qty = item["quantity"]
-            weight_brutto_kg = round(item["weight_grams"] * qty / 1000, 3)
+            qty = item.quantity
+            weight_brutto_kg = round(item.weight_grams * qty / 1000, 3)
             weight_netto_kg = weight_brutto_kg  # При ≤200 EUR нетто = брутто
-            value_rub = round(item["price_kopecks"] * qty / 100, 2)
+            value_rub = round(item.price_kopecks * qty / 100, 2)
             customs_value_rub = value_rub  # При ≤200 EUR таможенная стоимость = стоимость
 
-            brand_str = f" ({_esc(item['brand'])})" if item.get("brand") else ""
-            name_str = f"{_esc(item['name'])}{brand_str}"
+            brand_str = f" ({_esc(item.brand)})" if item.brand else ""
+            name_str = f"{_esc(item.name)}{brand_str}"
 
             row = [
                 Paragraph(str(waybill_seq), small),
@@ -318,8 +322,8 @@ async def generate_pdf(db: AsyncSession, declaration_id: uuid.UUID) -> io.BytesI
                 ),
                 Paragraph(f"{item_global_seq}/{item_in_waybill}", small),
                 Paragraph(name_str, small),
-                Paragraph(_esc(item.get("tn_ved_code")), small),
-                Paragraph(_esc(item.get("country_of_origin")), small),
+                Paragraph(_esc(item.tn_ved_code), small),
+                Paragraph(_esc(item.country_of_origin), small),
                 Paragraph(str(weight_brutto_kg), small),
                 Paragraph(str(weight_netto_kg), small),
                 Paragraph(f"RUB<br/>{value_rub:.2f}", small),
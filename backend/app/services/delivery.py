@@ -1,8 +1,18 @@
+import asyncio
 from dataclasses import dataclass
 
 from app.core.config import settings
+from app.core.security import create_quote_token, decode_quote_token
 from app.models.shop import Shop
 from app.services.pochta import PochtaClient
+from app.services.tariff_matrix import tariff_matrix_store
+
+# Варианты доставки для checkout: код варианта → object_code публичного тарификатора
+DELIVERY_OPTIONS: dict[str, int] = {
+    "ONLINE_PARCEL": 23030,   # Посылка онлайн обыкновенная
+    "ONLINE_COURIER": 24030,  # Курьер онлайн обыкновенный
+    "EMS": 7030,              # EMS обыкновенное
+}
 
 
 @dataclass
@@ -14,6 +24,66 @@ class DeliveryCalculation:
     delivery_days_max: int
     available: bool
     rejection_reason: str | None
+    stale: bool = False  # тариф из кеша последнего успешного расчёта (Почта недоступна)
+    estimated: bool = False  # оценка по матрице тарифов, без запроса к Почте
+
+
+def _rejected(reason: str) -> DeliveryCalculation:
+    return DeliveryCalculation(
+        delivery_cost_kopecks=0,
+        customs_fee_kopecks=0,
+        total_cost_kopecks=0,
+        delivery_days_min=0,
+        delivery_days_max=0,
+        available=False,
+        rejection_reason=reason,
+    )
+
+
+def issue_quote_token(
+    shop: Shop, postal_code: str, weight_grams: int, total_amount_kopecks: int, calc: DeliveryCalculation,
+) -> str | None:
+    """Токен с результатом расчёта для POST /orders.
+
+    Оценки, отказы и stale-тарифы (Почта была недоступна) токен не получают —
+    при создании заказа они пересчитываются.
+    """
+    if not calc.available or calc.estimated or calc.stale:
+        return None
+    return create_quote_token({
+        "shop": str(shop.id),
+        "postal_code": postal_code,
+        "weight": weight_grams,
+        "amount": total_amount_kopecks,
+        "delivery": calc.delivery_cost_kopecks,
+        "customs": calc.customs_fee_kopecks,
+        "days_min": calc.delivery_days_min,
+        "days_max": calc.delivery_days_max,
+    })
+
+
+def redeem_quote_token(
+    token: str, shop: Shop, postal_code: str, weight_grams: int, total_amount_kopecks: int,
+) -> DeliveryCalculation | None:
+    """Расчёт из токена, если он действителен и выдан на те же магазин, индекс, вес и сумму."""
+    claims = decode_quote_token(token)
+    if (
+        claims is None
+        or claims.get("shop") != str(shop.id)
+        or claims.get("postal_code") != postal_code
+        or claims.get("weight") != weight_grams
+        or claims.get("amount") != total_amount_kopecks
+    ):
+        return None
+    return DeliveryCalculation(
+        delivery_cost_kopecks=claims["delivery"],
+        customs_fee_kopecks=claims["customs"],
+        total_cost_kopecks=claims["delivery"] + claims["customs"],
+        delivery_days_min=claims["days_min"],
+        delivery_days_max=claims["days_max"],
+        available=True,
+        rejection_reason=None,
+    )
 
 
 class DeliveryService:
@@ -22,51 +92,94 @@ class DeliveryService:
 
     async def calculate(
         self, shop: Shop, postal_code: str, weight_grams: int, total_amount_kopecks: int,
-        eur_rate_kopecks: int | None = None,
+        eur_rate_kopecks: int | None = None, object_code: int | None = None, estimate: bool = False,
     ) -> DeliveryCalculation:
+        rejection = self._check_limits(weight_grams, total_amount_kopecks, eur_rate_kopecks)
+        if rejection:
+            return _rejected(rejection)
+        return await self._quote(
+            shop, postal_code, weight_grams, object_code or settings.POCHTA_OBJECT_CODE, estimate,
+        )
+
+    async def calculate_options(
+        self, shop: Shop, postal_code: str, weight_grams: int, total_amount_kopecks: int,
+        options: list[str], eur_rate_kopecks: int | None = None, estimate: bool = False,
+    ) -> dict[str, DeliveryCalculation]:
+        """Расчёт нескольких вариантов доставки параллельно (один round-trip = max задержки).
+
+        Возвращает {код варианта: DeliveryCalculation} в порядке options.
+        """
+        rejection = self._check_limits(weight_grams, total_amount_kopecks, eur_rate_kopecks)
+        if rejection:
+            return {option: _rejected(rejection) for option in options}
+
+        quotes = await asyncio.gather(*(
+            self._quote(shop, postal_code, weight_grams, DELIVERY_OPTIONS[option], estimate)
+            for option in options
+        ))
+        return dict(zip(options, quotes))
+
+    async def calculate_many(
+        self, shop: Shop, requests: list[tuple[str, int, int]], concurrency: int,
+        eur_rate_kopecks: int | None = None,
+    ) -> list[DeliveryCalculation]:
+        """Расчёт для многих заказов (postal_code, weight_grams, total_amount_kopecks).
+
+        Лимиты проверяются по каждому заказу, а тарифы Почты запрашиваются один раз
+        на уникальную пару (индекс, вес), не более concurrency одновременно.
+        """
+        rejections = [self._check_limits(weight, amount, eur_rate_kopecks) for _postal, weight, amount in requests]
+        keys = list(dict.fromkeys(
+            (postal_code, weight)
+            for (postal_code, weight, _amount), rejection in zip(requests, rejections)
+            if rejection is None
+        ))
+        semaphore = asyncio.Semaphore(concurrency)
+        object_code = settings.POCHTA_OBJECT_CODE
+
+        async def quote(postal_code: str, weight: int) -> DeliveryCalculation:
+            async with semaphore:
+                return await self._quote(shop, postal_code, weight, object_code)
+
+        quotes = dict(zip(keys, await asyncio.gather(*(quote(*key) for key in keys))))
+        return [
+            _rejected(rejection) if rejection else quotes[(postal_code, weight)]
+            for (postal_code, weight, _amount), rejection in zip(requests, rejections)
+        ]
+
+    @staticmethod
+    def _check_limits(weight_grams: int, total_amount_kopecks: int, eur_rate_kopecks: int | None) -> str | None:
         # Лимит 200 EUR на посылку (Калининградский эксперимент, ПП №1223)
         # Курс берётся из company_settings (БД), fallback на config (.env)
         rate = eur_rate_kopecks or settings.EUR_RATE_KOPECKS
         max_value_kopecks = settings.MAX_PACKAGE_VALUE_EUR * rate
 
         if total_amount_kopecks > max_value_kopecks:
-            return DeliveryCalculation(
-                delivery_cost_kopecks=0,
-                customs_fee_kopecks=0,
-                total_cost_kopecks=0,
-                delivery_days_min=0,
-                delivery_days_max=0,
-                available=False,
-                rejection_reason="exceeds_value_limit",
-            )
+            return "exceeds_value_limit"
 
         if weight_grams > settings.MAX_PACKAGE_WEIGHT_GRAMS:
-            return DeliveryCalculation(
-                delivery_cost_kopecks=0,
-                customs_fee_kopecks=0,
-                total_cost_kopecks=0,
-                delivery_days_min=0,
-                delivery_days_max=0,
-                available=False,
-                rejection_reason="exceeds_weight_limit",
-            )
+            return "exceeds_weight_limit"
+
+        return None
+
+    async def _quote(
+        self, shop: Shop, postal_code: str, weight_grams: int, object_code: int, estimate: bool = False,
+    ) -> DeliveryCalculation:
+        if estimate:
+            quote = await self._estimate(shop, postal_code, weight_grams, object_code)
+            if quote is not None:
+                return quote
+            # Направление не покрыто матрицей — считаем через Почту
 
         try:
             tariff, _log = await self._pochta.calculate_tariff_public(
                 index_from=shop.sender_postal_code,
                 index_to=postal_code,
                 weight_grams=weight_grams,
+                object_code=object_code,
             )
         except Exception:
-            return DeliveryCalculation(
-                delivery_cost_kopecks=0,
-                customs_fee_kopecks=0,
-                total_cost_kopecks=0,
-                delivery_days_min=0,
-                delivery_days_max=0,
-                available=False,
-                rejection_reason="delivery_unavailable",
-            )
+            return _rejected("delivery_unavailable")
 
         customs_fee = shop.customs_fee_kopecks
         total = tariff.total_kopecks + customs_fee
@@ -79,4 +192,33 @@ class DeliveryService:
             delivery_days_max=tariff.max_days,
             available=True,
             rejection_reason=None,
+            stale=tariff.stale,
+        )
+
+    @staticmethod
+    async def _estimate(
+        shop: Shop, postal_code: str, weight_grams: int, object_code: int,
+    ) -> DeliveryCalculation | None:
+        """Оценка по матрице тарифов; None, если матрица не подходит для этого запроса."""
+        matrix = await tariff_matrix_store.get()
+        if (
+            matrix is None
+            or matrix.sender_postal_code != shop.sender_postal_code
+            or matrix.object_code != object_code
+        ):
+            return None
+        tariff = matrix.estimate(postal_code, weight_grams)
+        if tariff is None:
+            return None
+
+        customs_fee = shop.customs_fee_kopecks
+        return DeliveryCalculation(
+            delivery_cost_kopecks=tariff.total_kopecks,
+            customs_fee_kopecks=customs_fee,
+            total_cost_kopecks=tariff.total_kopecks + customs_fee,
+            delivery_days_min=tariff.min_days,
+            delivery_days_max=tariff.max_days,
+            available=True,
+            rejection_reason=None,
+            estimated=True,
         )
@@ -16,22 +16,31 @@
     1. score > 0  (экономия перевешивает штрафы)
     2. ИЛИ любой заказ в группе превысил свой дедлайн (принудительная отправка)
     3. ИЛИ накопилось >= min_group_size заказов И savings >= min_savings_rub
+
+Хабы, по которым ни одно из условий выполниться не может, отсеиваются по агрегатам
+пула (services/hub_pool.py): заказы и тарифы Почты запрашиваются только для остальных.
 """
 
+import asyncio
 import logging
-from dataclasses import dataclass
+import uuid
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings as app_settings
 from app.models.grouping_settings import GroupingSettings
-from app.models.order import Order
+from app.models.order import POOL_STATUS, Order
 from app.models.order_status_history import OrderStatusHistory
 from app.models.shipment_group import ShipmentGroup
 from app.models.tracking_event import TrackingEvent
+from app.services import hub_pool
 from app.services.hub_router import get_hub_for_postal_code, HUB_REGISTRY
+from app.services.order import lean_order_options
 from app.services.pochta import PochtaClient
+from app.services.tariff_matrix import tariff_matrix_store
 
 logger = logging.getLogger(__name__)
 
@@ -45,27 +54,51 @@ class GroupDecision:
     public_cost_kopecks: int
     contract_cost_kopecks: int
     reason: str  # "score", "deadline_exceeded", "min_size_reached", "forced"
+    # Заказы, по которым не удалось получить тариф: order_id → текст ошибки
+    failed_orders: dict[uuid.UUID, str] = field(default_factory=dict)
 
 
 class GroupingOptimizer:
-    def __init__(self, session: AsyncSession, pochta_client: PochtaClient):
+    def __init__(
+        self,
+        session: AsyncSession,
+        pochta_client: PochtaClient,
+        tariff_concurrency: int | None = None,
+        tariff_timeout_seconds: float | None = None,
+        tariff_mode: str | None = None,
+    ):
         self._session = session
         self._pochta = pochta_client
+        self._tariff_concurrency = tariff_concurrency or app_settings.GROUPING_TARIFF_CONCURRENCY
+        self._tariff_timeout = tariff_timeout_seconds or app_settings.GROUPING_TARIFF_TIMEOUT_SECONDS
+        self._tariff_mode = tariff_mode or app_settings.GROUPING_TARIFF_MODE
 
-    async def run(self, sender_postal_code: str = "238311") -> list[GroupDecision]:
-        """Основной метод — анализирует все pending-заказы и возвращает решения."""
+    async def run(self, sender_postal_code: str = "238311", hubs: list[str] | None = None) -> list[GroupDecision]:
+        """Основной метод — анализирует pending-заказы хабов hubs (None — всех) и возвращает решения."""
         settings = await self._load_settings()
         if not settings.enabled:
             return []
 
-        orders = await self._load_pending_orders()
+        # Какие хабы могут дать решение — по агрегатам пула, без загрузки заказов
+        pools = await hub_pool.load(self._session)
+        if not pools:
+            pools = await hub_pool.rebuild(self._session)
+        now = datetime.now(timezone.utc)
+        candidates = [
+            pool.hub for pool in pools
+            if (hubs is None or pool.hub in hubs) and hub_pool.should_evaluate(pool, settings, now)
+        ]
+        if not candidates:
+            return []
+
+        orders = await self._load_pending_orders(candidates)
         if not orders:
             return []
 
         # Группируем по хабу
         by_hub: dict[str, list[Order]] = {}
         for order in orders:
-            hub = get_hub_for_postal_code(order.recipient_postal_code)
+            hub = order.hub or get_hub_for_postal_code(order.recipient_postal_code)
             by_hub.setdefault(hub, []).append(order)
 
         decisions = []
@@ -76,6 +109,8 @@ class GroupingOptimizer:
             if decision is not None:
                 decisions.append(decision)
 
+        # Публичные тарифы, полученные при оценке, — в заказы (и в сумму тарифов пула хаба)
+        await self._session.commit()
         return decisions
 
     async def apply_decision(self, decision: GroupDecision, operator_id=None) -> ShipmentGroup:
@@ -116,15 +151,13 @@ class GroupingOptimizer:
             )
             self._session.add(history)
 
-            event = TrackingEvent(
-                order_id=order.id,
-                shipment_group_id=group.id,
-                internal_track_number=order.internal_track_number,
-                event_type="group_formed",
-                description=f"Включён в группу {group_number} → {group.hub_name}",
-                location="Калининград",
-            )
-            self._session.add(event)
+        # Одно событие на группу — в таймлайн заказов подмешивается при чтении
+        self._session.add(TrackingEvent(
+            shipment_group_id=group.id,
+            event_type="group_formed",
+            description=f"Включён в группу {group_number} → {group.hub_name}",
+            location="Калининград",
+        ))
 
         await self._session.commit()
         logger.info(
@@ -171,6 +204,16 @@ class GroupingOptimizer:
                 )
             return None
 
+        failed = tariffs["failed"]
+        if failed:
+            logger.warning(
+                "Хаб %s: нет тарифа для %d из %d заказов: %s",
+                hub, len(failed), len(orders),
+                "; ".join(f"{order_id}: {err}" for order_id, err in failed.items()),
+            )
+        # Заказы без тарифа остаются в пуле до следующего запуска (кроме принудительной отправки)
+        priced_orders = [o for o in orders if o.id not in failed]
+
         public_total = tariffs["public_total"]
         contract_total = tariffs["contract_total"]
         savings = public_total - contract_total
@@ -191,9 +234,9 @@ class GroupingOptimizer:
         reason = None
         if deadline_exceeded:
             reason = "deadline_exceeded"
-        elif score > 0 and savings >= settings.min_savings_rub * 100 and len(orders) >= settings.min_group_size:
+        elif score > 0 and savings >= settings.min_savings_rub * 100 and len(priced_orders) >= settings.min_group_size:
             reason = "score"
-        elif len(orders) >= settings.min_group_size and savings >= settings.min_savings_rub * 100:
+        elif len(priced_orders) >= settings.min_group_size and savings >= settings.min_savings_rub * 100:
             reason = "min_size_reached"
 
         if reason is None:
@@ -201,46 +244,94 @@ class GroupingOptimizer:
 
         return GroupDecision(
             hub=hub,
-            orders=orders,
+            orders=orders if reason == "deadline_exceeded" else priced_orders,
             savings_kopecks=savings,
             savings_percent=savings_pct,
             public_cost_kopecks=public_total,
             contract_cost_kopecks=contract_total,
             reason=reason,
+            failed_orders=failed,
         )
 
     async def _get_group_tariffs(self, orders: list[Order], sender_postal_code: str) -> dict:
         """
         public_total = сумма тарифов для каждого заказа по отдельности (публичный)
         contract_total = тариф на суммарный вес (контрактный)
+        failed = заказы без публичного тарифа (order_id → ошибка); в суммы не входят
+
+        Публичные тарифы запрашиваются параллельно, не более tariff_concurrency
+        одновременно, каждый с таймаутом tariff_timeout. Ошибка по одному заказу
+        не прерывает оценку хаба; если не удалось получить ни одного тарифа
+        (или контрактный тариф) — исключение.
+
+        В режиме tariff_mode="estimate" публичные тарифы берутся из матрицы тарифов
+        (запрос к Почте — только для направлений, не покрытых матрицей). Контрактный
+        тариф всегда запрашивается у Почты: он сохраняется в группе как фактическая стоимость.
         """
-        total_weight = sum(o.total_weight_grams for o in orders)
-        # Берём репрезентативный индекс — самый частый в группе
-        index_to = max(set(o.recipient_postal_code for o in orders),
-                       key=lambda idx: sum(1 for o in orders if o.recipient_postal_code == idx))
+        semaphore = asyncio.Semaphore(self._tariff_concurrency)
+        matrix = None
+        if self._tariff_mode == "estimate":
+            matrix = await tariff_matrix_store.get()
+            if matrix is not None and matrix.sender_postal_code != sender_postal_code:
+                matrix = None
+
+        async def public_tariff(order: Order) -> int:
+            if matrix is not None:
+                estimate = matrix.estimate(order.recipient_postal_code, order.total_weight_grams)
+                if estimate is not None:
+                    return estimate.total_kopecks
+            async with semaphore:
+                result, _log = await asyncio.wait_for(
+                    self._pochta.calculate_tariff_public(
+                        sender_postal_code, order.recipient_postal_code, order.total_weight_grams
+                    ),
+                    timeout=self._tariff_timeout,
+                )
+                return result.total_kopecks
+
+        results = await asyncio.gather(*(public_tariff(o) for o in orders), return_exceptions=True)
 
         public_sum = 0
-        for order in orders:
-            result, _log = await self._pochta.calculate_tariff_public(
-                sender_postal_code, order.recipient_postal_code, order.total_weight_grams
-            )
-            public_sum += result.total_kopecks
+        failed: dict[uuid.UUID, str] = {}
+        for order, result in zip(orders, results):
+            if isinstance(result, asyncio.TimeoutError):
+                failed[order.id] = f"timeout {self._tariff_timeout:g}s"
+            elif isinstance(result, BaseException):
+                failed[order.id] = str(result) or type(result).__name__
+            else:
+                public_sum += result
+                order.public_tariff_kopecks = result
+
+        priced = [o for o in orders if o.id not in failed]
+        if not priced:
+            raise RuntimeError(f"Не удалось получить ни одного публичного тарифа ({len(orders)} заказов)")
+
+        total_weight = sum(o.total_weight_grams for o in priced)
+        # Берём репрезентативный индекс — самый частый в группе
+        index_to = max(set(o.recipient_postal_code for o in priced),
+                       key=lambda idx: sum(1 for o in priced if o.recipient_postal_code == idx))
 
-        contract_result, _log = await self._pochta.calculate_tariff_contract(
-            sender_postal_code, index_to, total_weight
+        contract_result, _log = await asyncio.wait_for(
+            self._pochta.calculate_tariff_contract(sender_postal_code, index_to, total_weight),
+            timeout=self._tariff_timeout,
         )
 
         return {
             "public_total": public_sum,
             "contract_total": contract_result.total_kopecks,
+            "failed": failed,
         }
 
-    async def _load_pending_orders(self) -> list[Order]:
+    async def _load_pending_orders(self, hubs: list[str]) -> list[Order]:
         result = await self._session.execute(
-            select(Order).where(
-                Order.status == "customs_cleared",
+            select(Order)
+            .where(
+                Order.status == POOL_STATUS,
                 Order.shipment_group_id.is_(None),
+                Order.hub.in_(hubs),
             )
+            # Паспорт и позиции оптимизатору не нужны — без расшифровки на весь пул
+            .options(*lean_order_options())
         )
         return list(result.scalars().all())
 
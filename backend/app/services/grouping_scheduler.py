@@ -0,0 +1,178 @@
+"""Планировщик оптимизатора группировки: когда и какие хабы проверять.
+
+Celery Beat раз в GROUPING_SCHEDULER_TICK_SECONDS запускает tick() — два лёгких
+запроса (настройки и hub_pools), без заказов и Почты:
+- прогон оптимизатора по хабам, где возможно решение (hub_pool.should_evaluate),
+  не чаще GroupingSettings.worker_interval_minutes — ключ Redis с TTL интервала;
+  PATCH настроек сбрасывает ключ (reset_interval), новый интервал действует сразу;
+- хаб, у которого дедлайн самого старого заказа (oldest_created_at + max_wait_hours)
+  наступит до следующих тиков, ставится на проверку с countdown ровно к дедлайну —
+  одна задача на хаб и дедлайн.
+
+Пул хаба вырос (после commit, по дельтам hub_pool) — проверка хаба через
+GROUPING_TRIGGER_DEBOUNCE_SECONDS: события за это окно сливаются в одну задачу.
+Задача отсекает хабы по should_evaluate, поэтому к Почте идёт только хаб,
+дошедший до min_group_size; рост пула после этого снова даёт проверку — экономия растёт.
+
+Прогоны не пересекаются по хабам: хаб проверяется под блокировкой в Redis (lock_hubs).
+Занятый хаб событийная проверка откладывает на следующее окно.
+
+Без Redis нет и брокера Celery: события и тики ничего не ставят, прогон идёт без блокировок.
+"""
+import logging
+import math
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app.core.config import settings
+from app.core.redis_client import RedisConnector
+from app.models.grouping_settings import GroupingSettings
+from app.services import hub_pool
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ostrov:grouping"
+INTERVAL_KEY = f"{KEY_PREFIX}:interval"
+
+# Снять только свои блокировки: чужая могла появиться после истечения нашего TTL
+_RELEASE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('get', key) == ARGV[1] then redis.call('del', key) end
+end
+return 0
+"""
+
+_redis = RedisConnector("grouping scheduler")
+
+
+def _enqueue(hubs: list[str], countdown: int = 0) -> None:
+    try:
+        from app.workers.tasks_grouping import run_grouping_optimizer
+
+        run_grouping_optimizer.apply_async(kwargs={"hubs": hubs}, countdown=countdown)
+    except Exception:
+        # Хабы проверит прогон по интервалу
+        logger.exception("Failed to enqueue grouping optimizer for hubs %s", hubs)
+
+
+async def request_evaluation(hubs: list[str], delay: int | None = None) -> list[str]:
+    """Проверить хабы через delay секунд, если проверка ещё не стоит (debounce).
+
+    Возвращает хабы, для которых поставлена задача.
+    """
+    if delay is None:
+        delay = settings.GROUPING_TRIGGER_DEBOUNCE_SECONDS
+    redis = await _redis.get()
+    if redis is None or not hubs:
+        return []
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for hub in hubs:
+                pipe.set(f"{KEY_PREFIX}:pending:{hub}", "1", nx=True, ex=max(delay, 1))
+            flags = await pipe.execute()
+    except Exception:
+        logger.warning("Grouping scheduler: debounce failed for hubs %s", hubs, exc_info=True)
+        return []
+    queued = [hub for hub, flag in zip(hubs, flags) if flag]
+    if queued:
+        _enqueue(queued, delay)
+    return queued
+
+
+async def reset_interval() -> None:
+    """Следующий тик запустит прогон и возьмёт новый worker_interval_minutes."""
+    redis = await _redis.get()
+    if redis is None:
+        return
+    try:
+        await redis.delete(INTERVAL_KEY)
+    except Exception:
+        logger.warning("Grouping scheduler: interval reset failed", exc_info=True)
+
+
+@asynccontextmanager
+async def lock_hubs(hubs: list[str]):
+    """Заблокировать хабы на время прогона. Отдаёт список захваченных (без Redis — все)."""
+    redis = await _redis.get()
+    if redis is None:
+        yield list(hubs)
+        return
+    token = uuid.uuid4().hex
+    locked = []
+    try:
+        for hub in hubs:
+            if await redis.set(f"{KEY_PREFIX}:lock:{hub}", token, nx=True, ex=settings.GROUPING_LOCK_SECONDS):
+                locked.append(hub)
+    except Exception:
+        logger.warning("Grouping scheduler: hub locks failed", exc_info=True)
+    try:
+        yield locked
+    finally:
+        if locked:
+            try:
+                await redis.eval(_RELEASE_SCRIPT, len(locked), *(f"{KEY_PREFIX}:lock:{hub}" for hub in locked), token)
+            except Exception:
+                # Блокировки истекут по TTL
+                logger.warning("Grouping scheduler: hub unlock failed", exc_info=True)
+
+
+async def _load_settings(db: AsyncSession) -> GroupingSettings:
+    result = await db.execute(select(GroupingSettings).where(GroupingSettings.scope == "global"))
+    return result.scalar_one_or_none() or GroupingSettings.defaults()
+
+
+async def tick(db: AsyncSession) -> dict:
+    """Один тик Beat: прогон по интервалу и проверки к дедлайнам. Возвращает поставленные хабы."""
+    scheduled = {"interval": [], "deadline": []}
+    config = await _load_settings(db)
+    if not config.enabled:
+        return scheduled
+    redis = await _redis.get()
+    if redis is None:
+        return scheduled
+    pools = await hub_pool.load(db)
+    if not pools:
+        pools = await hub_pool.rebuild(db)
+    now = datetime.now(timezone.utc)
+
+    interval = max(config.worker_interval_minutes * 60 - settings.GROUPING_SCHEDULER_TICK_SECONDS // 2, 1)
+    if await redis.set(INTERVAL_KEY, now.isoformat(), nx=True, ex=interval):
+        hubs = [pool.hub for pool in pools if hub_pool.should_evaluate(pool, config, now)]
+        if hubs:
+            _enqueue(hubs)
+            scheduled["interval"] = hubs
+
+    # Два тика вперёд: пропущенный тик Beat не сдвигает проверку к дедлайну
+    horizon = now + timedelta(seconds=2 * settings.GROUPING_SCHEDULER_TICK_SECONDS)
+    for pool in pools:
+        deadline = hub_pool.deadline(pool, config)
+        if deadline is None or deadline > horizon or pool.hub in scheduled["interval"]:
+            continue
+        # +1 с: should_evaluate считает дедлайн истёкшим строго после него
+        countdown = max(math.ceil((deadline - now).total_seconds()) + 1, 0)
+        key = f"{KEY_PREFIX}:deadline:{pool.hub}:{int(deadline.timestamp())}"
+        # Хаб не сгруппировался к дедлайну (ошибки Почты) — повтор через несколько тиков
+        ttl = countdown + 5 * settings.GROUPING_SCHEDULER_TICK_SECONDS
+        if await redis.set(key, "1", nx=True, ex=ttl):
+            _enqueue([pool.hub], countdown)
+            scheduled["deadline"].append(pool.hub)
+    return scheduled
+
+
+# ── Слушатели сессии ──────────────────────────────────────────────────────────
+
+@event.listens_for(Session, "after_commit")
+def _trigger_after_commit(session):
+    hubs = session.info.pop(hub_pool.GROWN_HUBS, None)
+    if not hubs or not settings.GROUPING_EVENT_TRIGGERS:
+        return
+    try:
+        await_only(request_evaluation(hubs))
+    except Exception:
+        logger.warning("Grouping scheduler: trigger skipped (no async context)", exc_info=True)
@@ -0,0 +1,304 @@
+"""Агрегаты пула оптимизатора группировки по хабам (таблица hub_pools).
+
+Пул хаба — заказы customs_cleared без группы отправки (POOL_CONDITION_SQL).
+На хаб хранятся число заказов, вес, сумма известных публичных тарифов и
+created_at самого старого заказа. GroupingOptimizer по ним за O(хабов) решает,
+какие хабы проверять, и грузит заказы только этих хабов; дашборд — GET /admin/groups/pool.
+
+Агрегаты меняются дельтами в транзакции, которая меняет пул:
+- ORM (change_order_status, apply_decision, тарифы оптимизатора) — слушатель
+  before_flush по истории атрибутов заказа;
+- set-based UPDATE (transition_orders) — record_transition: у Core UPDATE нет
+  старых значений, вызов явный.
+Дельты копятся в session.info и пишутся перед commit одним UPDATE на хаб: строка
+hub_pools заблокирована только до commit, хабы по порядку — без взаимоблокировок.
+Когда пул покидает самый старый заказ, oldest_created_at пересчитывается
+по индексу ix_orders_pool_hub_created_at.
+
+Хабы, пул которых вырос, после commit получает grouping_scheduler (проверка хаба).
+
+rebuild() считает всё заново (init_db; после правок заказов в обход приложения).
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import DateTime, bindparam, case, delete, event, func, insert, inspect, literal, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.grouping_settings import GroupingSettings
+from app.models.hub_pool import HubPool
+from app.models.order import POOL_CONDITION_SQL, POOL_STATUS, Order
+from app.services.hub_router import HUB_REGISTRY, get_hub_for_postal_code
+
+logger = logging.getLogger(__name__)
+
+_PENDING = "hub_pool_deltas"
+# Хабы, пул которых вырос в транзакции (для grouping_scheduler после commit)
+GROWN_HUBS = "hub_pool_grown"
+BACKFILL_BATCH_SIZE = 1000
+
+
+@dataclass
+class _Delta:
+    count: int = 0
+    weight: int = 0
+    tariff: int = 0
+    priced: int = 0
+    # Самый старый из вошедших / вышедших заказов (для oldest_created_at)
+    entered_oldest: datetime | None = None
+    left_oldest: datetime | None = None
+
+
+def _aware(value: datetime | None) -> datetime | None:
+    # SQLite отдаёт naive datetime
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _delta(info: dict, hub: str) -> _Delta:
+    return info.setdefault(_PENDING, {}).setdefault(hub, _Delta())
+
+
+def _enter(info: dict, hub: str, weight: int, tariff: int | None, created_at: datetime | None) -> None:
+    d = _delta(info, hub)
+    d.count += 1
+    d.weight += weight or 0
+    if tariff is not None:
+        d.tariff += tariff
+        d.priced += 1
+    created_at = _aware(created_at) or datetime.now(timezone.utc)
+    if d.entered_oldest is None or created_at < d.entered_oldest:
+        d.entered_oldest = created_at
+
+
+def _leave(info: dict, hub: str, weight: int, tariff: int | None, created_at: datetime | None) -> None:
+    d = _delta(info, hub)
+    d.count -= 1
+    d.weight -= weight or 0
+    if tariff is not None:
+        d.tariff -= tariff
+        d.priced -= 1
+    created_at = _aware(created_at)
+    if created_at is not None and (d.left_oldest is None or created_at < d.left_oldest):
+        d.left_oldest = created_at
+
+
+def in_pool(status: str | None, shipment_group_id) -> bool:
+    return status == POOL_STATUS and shipment_group_id is None
+
+
+def record_transition(db: AsyncSession, rows, new_status: str) -> None:
+    """Дельты пула для set-based смены статуса (transition_orders).
+
+    rows — строки заказов до UPDATE: status, shipment_group_id, hub, recipient_postal_code,
+    total_weight_grams, public_tariff_kopecks, created_at.
+    """
+    for row in rows:
+        was = in_pool(row.status, row.shipment_group_id)
+        now = in_pool(new_status, row.shipment_group_id)
+        if was == now:
+            continue
+        hub = row.hub or get_hub_for_postal_code(row.recipient_postal_code)
+        apply = _enter if now else _leave
+        apply(db.info, hub, row.total_weight_grams, row.public_tariff_kopecks, row.created_at)
+
+
+def deadline(pool: HubPool, settings: GroupingSettings) -> datetime | None:
+    """Дедлайн самого старого заказа пула (None — пул пуст)."""
+    oldest = _aware(pool.oldest_created_at)
+    if pool.orders_count <= 0 or oldest is None:
+        return None
+    return oldest + timedelta(hours=settings.max_wait_hours)
+
+
+def should_evaluate(pool: HubPool, settings: GroupingSettings, now: datetime) -> bool:
+    """Может ли оптимизатор принять решение по хабу (необходимое условие, без тарифов Почты)."""
+    if pool.orders_count <= 0:
+        return False
+    pool_deadline = deadline(pool, settings)
+    if pool_deadline is not None and pool_deadline < now:
+        return True  # deadline_exceeded
+    if pool.orders_count < settings.min_group_size:
+        return False
+    # Экономия не больше суммы публичных тарифов: все тарифы известны и их мало — решения не будет
+    if pool.priced_count >= pool.orders_count and pool.public_tariff_kopecks < settings.min_savings_rub * 100:
+        return False
+    return True
+
+
+async def load(db: AsyncSession) -> list[HubPool]:
+    result = await db.execute(select(HubPool).order_by(HubPool.hub))
+    return list(result.scalars().all())
+
+
+def _aggregate_query():
+    orders = Order.__table__
+    return (
+        select(
+            orders.c.hub,
+            func.count().label("orders_count"),
+            func.coalesce(func.sum(orders.c.total_weight_grams), 0).label("total_weight_grams"),
+            func.coalesce(func.sum(orders.c.public_tariff_kopecks), 0).label("public_tariff_kopecks"),
+            func.count(orders.c.public_tariff_kopecks).label("priced_count"),
+            func.min(orders.c.created_at).label("oldest_created_at"),
+        )
+        .where(text(POOL_CONDITION_SQL))
+        .group_by(orders.c.hub)
+    )
+
+
+async def backfill_hubs(db: AsyncSession, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Проставить Order.hub заказам, созданным до колонки. Идемпотентно, commit на порцию."""
+    orders = Order.__table__
+    # updated_at не трогаем: заказы не должны попасть в ленту изменений
+    stmt = (
+        update(orders)
+        .where(orders.c.id == bindparam("_id"))
+        .values(hub=bindparam("_hub"), updated_at=orders.c.updated_at)
+    )
+    processed = 0
+    while True:
+        chunk = (await db.execute(
+            select(orders.c.id, orders.c.recipient_postal_code).where(orders.c.hub.is_(None)).limit(batch_size)
+        )).all()
+        if not chunk:
+            return processed
+        await db.execute(stmt, [
+            {"_id": order_id, "_hub": get_hub_for_postal_code(postal_code)} for order_id, postal_code in chunk
+        ])
+        await db.commit()
+        processed += len(chunk)
+
+
+async def rebuild(db: AsyncSession) -> list[HubPool]:
+    """Пересчитать агрегаты всех хабов по заказам (с commit). Строка есть у каждого хаба HUB_REGISTRY."""
+    await backfill_hubs(db)
+    rows = {row.hub: row._asdict() for row in (await db.execute(_aggregate_query())).all()}
+    now = datetime.now(timezone.utc)
+    empty = {"orders_count": 0, "total_weight_grams": 0, "public_tariff_kopecks": 0, "priced_count": 0, "oldest_created_at": None}
+    await db.execute(delete(HubPool))
+    await db.execute(insert(HubPool), [
+        {**empty, **rows.get(hub, {}), "hub": hub, "updated_at": now}
+        for hub in sorted(set(HUB_REGISTRY) | set(rows))
+    ])
+    await db.commit()
+    return await load(db)
+
+
+# ── Слушатели сессии ──────────────────────────────────────────────────────────
+
+def _old(state, key: str):
+    """Значение атрибута до изменений в этой сессии (active_history — старое загружено)."""
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return getattr(state.obj(), key)
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_orm_changes(session, flush_context, instances):
+    info = session.info
+    for obj in session.new:
+        if isinstance(obj, Order) and in_pool(obj.status, obj.shipment_group_id):
+            if obj.created_at is None:
+                # default колонки сработает позже и даст другое время, чем oldest_created_at пула
+                obj.created_at = datetime.now(timezone.utc)
+            hub = obj.hub or get_hub_for_postal_code(obj.recipient_postal_code)
+            _enter(info, hub, obj.total_weight_grams, obj.public_tariff_kopecks, obj.created_at)
+    for obj in session.deleted:
+        if isinstance(obj, Order) and in_pool(obj.status, obj.shipment_group_id):
+            hub = obj.hub or get_hub_for_postal_code(obj.recipient_postal_code)
+            _leave(info, hub, obj.total_weight_grams, obj.public_tariff_kopecks, obj.created_at)
+    for obj in session.dirty:
+        if not isinstance(obj, Order):
+            continue
+        state = inspect(obj)
+        was = in_pool(_old(state, "status"), _old(state, "shipment_group_id"))
+        now = in_pool(obj.status, obj.shipment_group_id)
+        if not was and not now:
+            continue
+        old_weight, old_tariff = _old(state, "total_weight_grams"), _old(state, "public_tariff_kopecks")
+        if was and now and (old_weight, old_tariff) == (obj.total_weight_grams, obj.public_tariff_kopecks):
+            continue
+        hub = obj.hub or get_hub_for_postal_code(obj.recipient_postal_code)
+        if was and now:
+            # Остался в пуле, изменились вес или тариф
+            d = _delta(info, hub)
+            d.weight += (obj.total_weight_grams or 0) - (old_weight or 0)
+            d.tariff += (obj.public_tariff_kopecks or 0) - (old_tariff or 0)
+            d.priced += (obj.public_tariff_kopecks is not None) - (old_tariff is not None)
+        elif was:
+            _leave(info, hub, old_weight, old_tariff, obj.created_at)
+        else:
+            _enter(info, hub, obj.total_weight_grams, obj.public_tariff_kopecks, obj.created_at)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_deltas(session):
+    # Финальный flush commit идёт после before_commit — его дельты нужны сейчас
+    session.flush()
+    deltas = session.info.pop(_PENDING, None)
+    if not deltas:
+        return
+    pools = HubPool.__table__
+    orders = Order.__table__
+    oldest = pools.c.oldest_created_at
+    now = datetime.now(timezone.utc)
+    for hub in sorted(deltas):
+        d = deltas[hub]
+        new_oldest = oldest
+        if d.entered_oldest is not None:
+            entered = literal(d.entered_oldest, DateTime(timezone=True))
+            new_oldest = case((or_(oldest.is_(None), oldest > entered), entered), else_=oldest)
+        if d.left_oldest is not None:
+            # Ушёл самый старый заказ пула — новый минимум по индексу пула хаба
+            pool_min = (
+                select(func.min(orders.c.created_at))
+                .where(text(POOL_CONDITION_SQL), orders.c.hub == hub)
+                .scalar_subquery()
+            )
+            left = literal(d.left_oldest, DateTime(timezone=True))
+            new_oldest = case((or_(oldest.is_(None), oldest >= left), pool_min), else_=new_oldest)
+        apply_delta = (
+            update(pools)
+            .where(pools.c.hub == hub)
+            .values(
+                orders_count=pools.c.orders_count + d.count,
+                total_weight_grams=pools.c.total_weight_grams + d.weight,
+                public_tariff_kopecks=pools.c.public_tariff_kopecks + d.tariff,
+                priced_count=pools.c.priced_count + d.priced,
+                oldest_created_at=new_oldest,
+                updated_at=now,
+            )
+        )
+        if session.execute(apply_delta).rowcount > 0:
+            continue
+        # Хаба ещё нет в hub_pools (база до init_db) — строка по заказам, уже с изменениями транзакции
+        logger.warning("hub_pools: no row for hub %s, computing from orders", hub)
+        aggregate = _aggregate_query().where(orders.c.hub == hub).subquery()
+        try:
+            # SAVEPOINT: конфликт по hub не должен откатывать транзакцию заказов
+            with session.begin_nested():
+                session.execute(insert(pools).from_select(
+                    ["hub", "orders_count", "total_weight_grams", "public_tariff_kopecks", "priced_count",
+                     "oldest_created_at", "updated_at"],
+                    select(*aggregate.c, literal(now, DateTime(timezone=True))),
+                ))
+        except IntegrityError:
+            # Строку вставила параллельная транзакция — по заказам без наших изменений, добавляем дельту
+            session.execute(apply_delta)
+    grown = [hub for hub in sorted(deltas) if deltas[hub].count > 0]
+    if grown:
+        session.info[GROWN_HUBS] = grown
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_deltas(session):
+    session.info.pop(_PENDING, None)
+    session.info.pop(GROWN_HUBS, None)
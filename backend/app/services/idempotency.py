@@ -0,0 +1,42 @@
+"""Idempotency-Key для POST /orders: ключ магазина → id созданного заказа (Redis).
+
+Без Redis ключи не хранятся — повторы всё равно ловит проверка
+(shop_id, external_order_id) перед расчётом тарифа.
+"""
+import logging
+import uuid
+
+from app.core.config import settings
+from app.core.redis_client import RedisConnector
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ostrov:idempotency"
+
+_redis = RedisConnector("idempotency keys")
+
+
+def _key(shop_id: uuid.UUID, idempotency_key: str) -> str:
+    return f"{KEY_PREFIX}:{shop_id}:{idempotency_key}"
+
+
+async def get_order_id(shop_id: uuid.UUID, idempotency_key: str) -> uuid.UUID | None:
+    redis = await _redis.get()
+    if redis is None:
+        return None
+    try:
+        value = await redis.get(_key(shop_id, idempotency_key))
+        return uuid.UUID(value) if value else None
+    except Exception:
+        logger.debug("Idempotency: Redis GET failed", exc_info=True)
+        return None
+
+
+async def remember_order_id(shop_id: uuid.UUID, idempotency_key: str, order_id: uuid.UUID) -> None:
+    redis = await _redis.get()
+    if redis is None:
+        return
+    try:
+        await redis.set(_key(shop_id, idempotency_key), str(order_id), ex=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+    except Exception:
+        logger.debug("Idempotency: Redis SET failed", exc_info=True)
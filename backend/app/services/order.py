@@ -1,15 +1,29 @@
 import logging
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
 
 from fastapi import HTTPException, status
-from sqlalchemy import func, select
+from sqlalchemy import JSON, Integer, Row, cast, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import defer, load_only, selectinload, with_expression
 
+from app.core.pagination import CountMode, Page, paginate
+from app.models.base import native_types
+from app.models.customs_declaration import CustomsDeclaration
 from app.models.order import Order
+from app.models.order_item import OrderItem
 from app.models.order_status_history import OrderStatusHistory
+from app.models.shop import Shop
 from app.models.tracking_event import TrackingEvent
+from app.services.order_items import item_rows, missing_customs_condition
+from app.services.order_search import search_page
+from app.services import webhook_outbox
+# Слушатели сессии при записи TrackingEvent (API и Celery): сброс кеша /track,
+# updated_at заказа для ленты изменений, публикация в SSE-поток магазина;
+# при входе/выходе заказа из пула группировки — агрегаты хабов и проверка выросших хабов
+from app.services import grouping_scheduler, hub_pool, order_feed, tracking_cache, tracking_stream  # noqa: F401
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +70,10 @@ async def create_order(db: AsyncSession, order: Order) -> Order:
     db.add(order)
     await db.flush()
 
+    rows = item_rows(order.id, order.items)
+    if rows:
+        await db.execute(insert(OrderItem), rows)
+
     history = OrderStatusHistory(order_id=order.id, old_status=None, new_status="accepted")
     db.add(history)
 
@@ -73,6 +91,105 @@ async def create_order(db: AsyncSession, order: Order) -> Order:
     return order
 
 
+@dataclass
+class BulkCreateResult:
+    # позиция во входном списке → id созданного заказа / текст ошибки
+    created: dict[int, uuid.UUID] = field(default_factory=dict)
+    # позиция → заказ, созданный раньше с тем же external_order_id (строка find_existing_orders)
+    existing: dict[int, Row] = field(default_factory=dict)
+    errors: dict[int, str] = field(default_factory=dict)
+
+
+DUPLICATE_IN_REQUEST_ERROR = "Duplicate external_order_id in request"
+
+
+async def find_existing_orders(
+    db: AsyncSession, shop_id: uuid.UUID, external_order_ids: list[str],
+) -> dict[str, Row]:
+    """Заказы магазина с данными external_order_id (индекс uq_shop_external_order).
+
+    external_order_id → строка (id, external_order_id, delivery_cost_kopecks, customs_fee_kopecks).
+    """
+    if not external_order_ids:
+        return {}
+    result = await db.execute(
+        select(Order.id, Order.external_order_id, Order.delivery_cost_kopecks, Order.customs_fee_kopecks)
+        .where(Order.shop_id == shop_id, Order.external_order_id.in_(external_order_ids))
+    )
+    return {row.external_order_id: row for row in result.all()}
+
+
+async def create_orders_bulk(db: AsyncSession, shop_id: uuid.UUID, orders: dict[int, dict]) -> BulkCreateResult:
+    """Создание многих заказов одного магазина в одной транзакции.
+
+    orders — позиция во входном списке → значения колонок Order (без id и shop_id).
+    Заказ, external_order_id которого уже есть у магазина, не создаётся и попадает
+    в existing — как повтор POST /orders; повтор external_order_id в запросе — ошибка.
+    Заказы, их позиции, история и TrackingEvent вставляются multi-row INSERT'ами, один commit.
+    """
+    result = BulkCreateResult()
+
+    seen: set[str] = set()
+    pending: dict[int, dict] = {}
+    for position, values in orders.items():
+        external_id = values["external_order_id"]
+        if external_id in seen:
+            result.errors[position] = DUPLICATE_IN_REQUEST_ERROR
+        else:
+            seen.add(external_id)
+            pending[position] = values
+
+    # Повторная попытка — если параллельный запрос успел вставить тот же external_order_id
+    for attempt in range(2):
+        existing = await find_existing_orders(db, shop_id, [v["external_order_id"] for v in pending.values()])
+        for position in [p for p, v in pending.items() if v["external_order_id"] in existing]:
+            result.existing[position] = existing[pending.pop(position)["external_order_id"]]
+        if not pending:
+            return result
+
+        ids = {position: uuid.uuid4() for position in pending}
+        try:
+            await db.execute(insert(Order), [
+                {**values, "id": ids[position], "shop_id": shop_id, "status": "accepted"}
+                for position, values in pending.items()
+            ])
+            await db.execute(insert(OrderItem), [
+                row
+                for position, values in pending.items()
+                for row in item_rows(ids[position], values["items"])
+            ])
+            await db.execute(insert(OrderStatusHistory), [
+                {"order_id": order_id, "old_status": None, "new_status": "accepted"}
+                for order_id in ids.values()
+            ])
+            event_type, description = STATUS_TO_TRACKING_EVENT["accepted"]
+            await db.execute(insert(TrackingEvent), [
+                {"order_id": order_id, "event_type": event_type, "description": description}
+                for order_id in ids.values()
+            ])
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            if attempt:
+                raise
+            continue
+
+        result.created.update(ids)
+        return result
+
+    return result
+
+
+async def get_order_by_external_id(
+    db: AsyncSession, shop_id: uuid.UUID, external_order_id: str,
+) -> Order | None:
+    """Поиск по (shop_id, external_order_id) — индекс uq_shop_external_order."""
+    result = await db.execute(
+        select(Order).where(Order.shop_id == shop_id, Order.external_order_id == external_order_id)
+    )
+    return result.scalar_one_or_none()
+
+
 async def change_order_status(
     db: AsyncSession,
     order_id: uuid.UUID,
@@ -123,42 +240,168 @@ async def change_order_status(
         )
         db.add(tracking_event)
 
+    # Webhook магазину — строкой outbox в этой же транзакции
+    countdowns = []
+    if order.shop and order.shop.webhook_url:
+        countdowns = await webhook_outbox.add_webhooks(db, [(order.shop_id, _webhook_payload(
+            order.id, order.external_order_id, order.track_number, old_status, new_status,
+        ))])
+
     await db.commit()
     await db.refresh(order)
 
-    # Отправка webhook магазину (в фоне через Celery)
-    _enqueue_webhook(order, old_status, new_status)
+    webhook_outbox.kick_relay(countdowns)
 
     return order
 
 
-def _enqueue_webhook(order: Order, old_status: str, new_status: str) -> None:
-    """Ставит Celery-задачу на отправку webhook магазину."""
-    try:
-        shop = order.shop
-        if not shop or not shop.webhook_url:
-            return
+@dataclass
+class BulkStatusResult:
+    changed: list[uuid.UUID] = field(default_factory=list)
+    # order_id → причина, по которой заказ не переведён
+    skipped: dict[uuid.UUID, str] = field(default_factory=dict)
+    # (shop_id, payload) — вебхуки по переведённым заказам, уже записаны в outbox
+    webhooks: list[tuple[uuid.UUID, dict]] = field(default_factory=list)
+    # Через сколько секунд записанные вебхуки готовы к отправке (kick_relay)
+    relay_countdowns: list[int] = field(default_factory=list)
 
-        from app.workers.tasks_webhook import send_webhook
 
-        payload = {
-            "event": "order.status_changed",
-            "order_id": str(order.id),
-            "external_order_id": order.external_order_id,
-            "old_status": old_status,
+async def transition_orders(
+    db: AsyncSession,
+    order_ids: list[uuid.UUID],
+    new_status: str,
+    changed_by: uuid.UUID | None = None,
+    comment: str | None = None,
+    comments: dict[uuid.UUID, str] | None = None,
+) -> BulkStatusResult:
+    """Set-based смена статуса многих заказов в текущей транзакции (без commit).
+
+    Один SELECT ... FOR UPDATE, один условный UPDATE ... WHERE status IN (...) RETURNING,
+    multi-row INSERT истории и TrackingEvent. Заказы, для которых переход недопустим
+    по ALLOWED_TRANSITIONS, пропускаются и возвращаются в skipped (без исключения).
+    comments — комментарий для отдельных заказов (перекрывает comment).
+
+    Вебхуки магазинам пишутся в outbox в этой же транзакции; вызывающий коммитит
+    и затем запускает relay: enqueue_status_webhooks().
+    """
+    result = BulkStatusResult()
+    if not order_ids:
+        return result
+
+    source_statuses = [s for s, targets in ALLOWED_TRANSITIONS.items() if new_status in targets]
+
+    rows = (await db.execute(
+        select(
+            Order.id, Order.status, Order.shop_id, Order.external_order_id,
+            Order.track_number, Order.internal_track_number,
+            # Для агрегатов пула группировки (hub_pool.record_transition)
+            Order.shipment_group_id, Order.hub, Order.recipient_postal_code,
+            Order.total_weight_grams, Order.public_tariff_kopecks, Order.created_at,
+        )
+        .where(Order.id.in_(order_ids))
+        .with_for_update()
+    )).all()
+    by_id = {row.id: row for row in rows}
+
+    candidates = []
+    for order_id in dict.fromkeys(order_ids):
+        row = by_id.get(order_id)
+        if row is None:
+            result.skipped[order_id] = "Order not found"
+        elif row.status not in source_statuses:
+            result.skipped[order_id] = f"Cannot transition from '{row.status}' to '{new_status}'"
+        else:
+            candidates.append(order_id)
+
+    if not candidates:
+        return result
+
+    # Условный UPDATE: строки, статус которых успел измениться, не затрагиваются
+    updated = await db.execute(
+        update(Order)
+        .where(Order.id.in_(candidates), Order.status.in_(source_statuses))
+        .values(status=new_status)
+        .returning(Order.id)
+    )
+    changed_ids = set(updated.scalars().all())
+    result.changed = [order_id for order_id in candidates if order_id in changed_ids]
+    for order_id in candidates:
+        if order_id not in changed_ids:
+            result.skipped[order_id] = "Status changed concurrently"
+
+    if not result.changed:
+        return result
+
+    hub_pool.record_transition(db, [by_id[order_id] for order_id in result.changed], new_status)
+
+    comments = comments or {}
+    await db.execute(insert(OrderStatusHistory), [
+        {
+            "order_id": order_id,
+            "old_status": by_id[order_id].status,
             "new_status": new_status,
-            "track_number": order.track_number,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "comment": comments.get(order_id, comment),
+            "changed_by": changed_by,
         }
+        for order_id in result.changed
+    ])
 
-        send_webhook.delay(shop.webhook_url, payload, shop.api_key)
-        logger.info(
-            "Webhook queued: order=%s status=%s→%s url=%s",
-            order.id, old_status, new_status, shop.webhook_url,
-        )
-    except Exception:
-        # Вебхук не должен ломать основной процесс
-        logger.exception("Failed to enqueue webhook for order %s", order.id)
+    event_info = STATUS_TO_TRACKING_EVENT.get(new_status)
+    if event_info:
+        event_type, description = event_info
+        await db.execute(insert(TrackingEvent), [
+            {
+                "order_id": order_id,
+                "internal_track_number": by_id[order_id].internal_track_number,
+                "event_type": event_type,
+                "description": description,
+                "location": comments.get(order_id, comment),
+            }
+            for order_id in result.changed
+        ])
+
+    for order_id in result.changed:
+        row = by_id[order_id]
+        result.webhooks.append((row.shop_id, _webhook_payload(
+            order_id, row.external_order_id, row.track_number, row.status, new_status,
+        )))
+    result.relay_countdowns = await webhook_outbox.add_webhooks(db, result.webhooks)
+
+    return result
+
+
+async def change_orders_status_bulk(
+    db: AsyncSession,
+    order_ids: list[uuid.UUID],
+    new_status: str,
+    changed_by: uuid.UUID | None = None,
+    comment: str | None = None,
+    comments: dict[uuid.UUID, str] | None = None,
+) -> BulkStatusResult:
+    """transition_orders + commit + вебхуки магазинам."""
+    result = await transition_orders(db, order_ids, new_status, changed_by, comment, comments)
+    await db.commit()
+    enqueue_status_webhooks(result)
+    return result
+
+
+def enqueue_status_webhooks(result: BulkStatusResult) -> None:
+    """После commit transition_orders: запустить relay outbox (вебхуки уже записаны в транзакции)."""
+    webhook_outbox.kick_relay(result.relay_countdowns)
+
+
+def _webhook_payload(
+    order_id: uuid.UUID, external_order_id: str, track_number: str | None, old_status: str, new_status: str,
+) -> dict:
+    return {
+        "event": "order.status_changed",
+        "order_id": str(order_id),
+        "external_order_id": external_order_id,
+        "old_status": old_status,
+        "new_status": new_status,
+        "track_number": track_number,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
 
 
 async def get_order_with_history(db: AsyncSession, order_id: uuid.UUID) -> Order | None:
@@ -174,6 +417,28 @@ async def get_order_with_history(db: AsyncSession, order_id: uuid.UUID) -> Order
     return result.scalar_one_or_none()
 
 
+def lean_order_options(*, items: bool = False) -> list:
+    """Опции загрузки Order без паспортных колонок (и без items, если items=False).
+
+    Каждая паспортная колонка при загрузке расшифровывается Fernet (проверка HMAC),
+    items — разбор JSON. Обращение к отложенной колонке — ошибка (raiseload), а не
+    скрытый SELECT на каждую строку.
+    """
+    columns = [Order.recipient_passport_series, Order.recipient_passport_number]
+    if not items:
+        columns.append(Order.items)
+    return [defer(column, raiseload=True) for column in columns]
+
+
+def order_items_count(dialect):
+    """Число позиций заказа, посчитанное в SQL (items — jsonb или JSON-текст)."""
+    if native_types(dialect):
+        return func.jsonb_array_length(Order.items, type_=Integer)
+    if dialect.name == "postgresql":
+        return func.json_array_length(cast(Order.items, JSON), type_=Integer)
+    return func.json_array_length(Order.items, type_=Integer)
+
+
 async def list_orders(
     db: AsyncSession,
     shop_id: uuid.UUID | None = None,
@@ -181,34 +446,43 @@ async def list_orders(
     page: int = 1,
     per_page: int = 20,
     search: str | None = None,
-) -> tuple[list[Order], int]:
+    cursor: str | None = None,
+    count: CountMode = "exact",
+    tn_ved_prefix: str | None = None,
+    customs_missing: bool = False,
+) -> Page:
     query = select(Order)
-    count_query = select(func.count(Order.id))
 
     if shop_id:
         query = query.where(Order.shop_id == shop_id)
-        count_query = count_query.where(Order.shop_id == shop_id)
     if status_filter:
         query = query.where(Order.status == status_filter)
-        count_query = count_query.where(Order.status == status_filter)
-    if search:
-        pattern = f"%{search}%"
-        query = query.where(
-            Order.recipient_name.ilike(pattern)
-            | Order.external_order_id.ilike(pattern)
-            | Order.track_number.ilike(pattern)
-        )
-        count_query = count_query.where(
-            Order.recipient_name.ilike(pattern)
-            | Order.external_order_id.ilike(pattern)
-            | Order.track_number.ilike(pattern)
-        )
-
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-
-    query = query.options(selectinload(Order.shop), selectinload(Order.customs_declaration)).order_by(Order.created_at.desc()).offset((page - 1) * per_page).limit(per_page)
-    result = await db.execute(query)
-    orders = list(result.scalars().all())
-
-    return orders, total
+    # Фильтры по позициям — EXISTS по индексам order_items
+    if tn_ved_prefix:
+        # Только цифры (проверяет endpoint) — экранировать LIKE не нужно
+        query = query.where(exists().where(
+            OrderItem.order_id == Order.id, OrderItem.tn_ved_code.like(f"{tn_ved_prefix}%"),
+        ))
+    if customs_missing:
+        query = query.where(exists().where(OrderItem.order_id == Order.id, missing_customs_condition()))
+
+    # Только колонки строки списка: без расшифровки паспорта и разбора items
+    query = query.options(
+        load_only(
+            Order.id, Order.shop_id, Order.external_order_id, Order.status,
+            Order.recipient_name, Order.recipient_phone, Order.recipient_email,
+            Order.recipient_address, Order.recipient_postal_code,
+            Order.total_amount_kopecks, Order.total_weight_grams,
+            Order.delivery_cost_kopecks, Order.customs_fee_kopecks,
+            Order.track_number, Order.internal_track_number, Order.batch_id,
+            Order.customs_declaration_id, Order.created_at, Order.updated_at,
+            raiseload=True,
+        ),
+        with_expression(Order.items_count, order_items_count(db.bind.dialect)),
+        selectinload(Order.shop).load_only(Shop.name),
+        selectinload(Order.customs_declaration).load_only(CustomsDeclaration.number, CustomsDeclaration.status),
+    )
+    if search and search.strip():
+        # Ранжированный top-N по поисковому индексу, без курсора и полного COUNT
+        return await search_page(db, query, search, page, per_page)
+    return await paginate(db, query, Order, page=page, per_page=per_page, cursor=cursor, count=count)
@@ -0,0 +1,151 @@
+"""Лента изменений заказов магазина (GET /orders/changes) и таймлайн событий заказа.
+
+Таймлайн заказа — его собственные TrackingEvent плюс события его группы отправки:
+событие группы (order_id IS NULL, shipment_group_id) хранится одной строкой и
+подмешивается при чтении (order_timeline_condition).
+
+Курсор ленты — (updated_at, id) последнего отданного заказа, индекс
+ix_orders_shop_id_updated_at_id. updated_at меняется при любом UPDATE заказа
+(onupdate), а при записи TrackingEvent без изменения заказа (события групп)
+поднимается слушателем сессии ниже — в той же транзакции, одним UPDATE на группу.
+
+Лента отдаёт только заказы, изменённые раньше чем CHANGE_FEED_SETTLE_SECONDS назад:
+updated_at ставится при flush, а видна строка после commit, поэтому транзакция,
+начатая раньше, может закоммитить меньший updated_at уже после того, как курсор
+клиента ушёл вперёд. Задержка покрывает такие транзакции (они короткие).
+"""
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, event, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.pagination import decode_cursor, encode_cursor
+from app.models.order import Order
+from app.models.tracking_event import TrackingEvent
+
+
+@dataclass
+class ChangesPage:
+    orders: list
+    last_events: dict[uuid.UUID, list]
+    next_cursor: str | None
+    has_more: bool
+
+
+def order_timeline_condition():
+    """JOIN Order → TrackingEvent: события заказа и события его группы."""
+    return or_(
+        TrackingEvent.order_id == Order.id,
+        and_(
+            TrackingEvent.order_id.is_(None),
+            TrackingEvent.shipment_group_id == Order.shipment_group_id,
+        ),
+    )
+
+
+async def tracking_events_by_order(
+    db: AsyncSession, order_ids: list[uuid.UUID], *, latest_only: bool = False,
+) -> dict[uuid.UUID, list]:
+    """Таймлайн заказов по возрастанию created_at; latest_only — только последнее (ROW_NUMBER)."""
+    by_order: dict[uuid.UUID, list] = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return by_order
+
+    query = (
+        select(
+            Order.id.label("order_id"),
+            TrackingEvent.event_type,
+            TrackingEvent.description,
+            TrackingEvent.location,
+            TrackingEvent.details,
+            TrackingEvent.created_at,
+        )
+        .join(TrackingEvent, order_timeline_condition())
+        .where(Order.id.in_(order_ids))
+    )
+    if latest_only:
+        rank = func.row_number().over(
+            partition_by=Order.id,
+            order_by=(TrackingEvent.created_at.desc(), TrackingEvent.id.desc()),
+        ).label("rank")
+        ranked = query.add_columns(rank).subquery()
+        query = select(*[c for c in ranked.c if c.name != "rank"]).where(ranked.c.rank == 1)
+    else:
+        query = query.order_by(Order.id, TrackingEvent.created_at)
+
+    for row in (await db.execute(query)).all():
+        by_order[row.order_id].append(row)
+    return by_order
+
+
+async def changes_page(db: AsyncSession, shop_id: uuid.UUID, cursor: str | None, limit: int) -> ChangesPage:
+    """Заказы магазина, изменённые после курсора, по возрастанию (updated_at, id)."""
+    settled_before = datetime.now(timezone.utc) - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+    query = (
+        select(
+            Order.id,
+            Order.external_order_id,
+            Order.internal_track_number,
+            Order.track_number,
+            Order.status,
+            Order.updated_at,
+        )
+        .where(Order.shop_id == shop_id, Order.updated_at <= settled_before)
+        .order_by(Order.updated_at, Order.id)
+        .limit(limit + 1)
+    )
+    if cursor:
+        updated_at, order_id = decode_cursor(cursor)
+        query = query.where(or_(
+            Order.updated_at > updated_at,
+            and_(Order.updated_at == updated_at, Order.id > order_id),
+        ))
+
+    orders = (await db.execute(query)).all()
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    if not orders:
+        # Ничего не изменилось — клиент продолжает с тем же курсором
+        return ChangesPage(orders=[], last_events={}, next_cursor=cursor, has_more=False)
+
+    last_events = await tracking_events_by_order(db, [o.id for o in orders], latest_only=True)
+    return ChangesPage(
+        orders=orders,
+        last_events=last_events,
+        next_cursor=encode_cursor(orders[-1].updated_at, orders[-1].id),
+        has_more=has_more,
+    )
+
+
+# ── updated_at заказа при записи TrackingEvent ────────────────────────────────
+
+@event.listens_for(Session, "before_flush")
+def _touch_orders_with_new_events(session, flush_context, instances):
+    events = [obj for obj in session.new if isinstance(obj, TrackingEvent)]
+    order_ids = {obj.order_id for obj in events if obj.order_id}
+    group_ids = {obj.shipment_group_id for obj in events if not obj.order_id and obj.shipment_group_id}
+    if not order_ids and not group_ids:
+        return
+    now = datetime.now(timezone.utc)
+    orders = Order.__table__
+    if group_ids:
+        # Событие группы — все её заказы одним UPDATE (заказы группы в сессию не грузятся)
+        session.connection().execute(
+            update(orders).where(orders.c.shipment_group_id.in_(group_ids)).values(updated_at=now)
+        )
+    missing = []
+    for order_id in order_ids:
+        order = session.identity_map.get(session.identity_key(Order, order_id))
+        if order is not None:
+            order.updated_at = now
+        else:
+            missing.append(order_id)
+    if missing:
+        # Заказ не загружен в сессию — без ORM (flush уже идёт)
+        session.connection().execute(
+            update(orders).where(orders.c.id.in_(missing)).values(updated_at=now)
+        )
@@ -0,0 +1,109 @@
+"""Позиции заказа в таблице order_items — нормализованная копия Order.items.
+
+Запись идёт вместе с Order.items (dual-write): create_order, create_orders_bulk,
+update_order_items_customs. Таможенные проверки и экспорт ДТЭГ читают таблицу;
+для заказов без строк (созданы до её появления и ещё не перенесены
+backfill_order_items) позиции берутся из JSON (dual-read).
+"""
+import logging
+import uuid
+
+from sqlalchemy import delete, exists, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.order import Order
+from app.models.order_item import OrderItem
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def item_rows(order_id: uuid.UUID, items: list[dict]) -> list[dict]:
+    """Значения колонок order_items для элементов Order.items."""
+    return [
+        {
+            "order_id": order_id,
+            "position": position,
+            "name": item.get("name") or "",
+            "sku": item.get("sku"),
+            "quantity": item.get("quantity") or 0,
+            "price_kopecks": item.get("price_kopecks") or 0,
+            "weight_grams": item.get("weight_grams") or 0,
+            "tn_ved_code": item.get("tn_ved_code") or None,
+            "country_of_origin": item.get("country_of_origin") or None,
+            "brand": item.get("brand") or None,
+        }
+        for position, item in enumerate(items or [])
+    ]
+
+
+async def replace_order_items(db: AsyncSession, order_id: uuid.UUID, items: list[dict]) -> None:
+    """Переписать строки заказа по Order.items (без commit)."""
+    await db.execute(delete(OrderItem).where(OrderItem.order_id == order_id))
+    rows = item_rows(order_id, items)
+    if rows:
+        await db.execute(insert(OrderItem), rows)
+
+
+async def load_order_items(db: AsyncSession, order_ids: list[uuid.UUID]) -> dict[uuid.UUID, list[OrderItem]]:
+    """Позиции заказов по порядку position. Для заказов без строк — из Order.items."""
+    by_order: dict[uuid.UUID, list[OrderItem]] = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return by_order
+
+    result = await db.execute(
+        select(OrderItem)
+        .where(OrderItem.order_id.in_(order_ids))
+        .order_by(OrderItem.order_id, OrderItem.position)
+    )
+    for item in result.scalars():
+        by_order[item.order_id].append(item)
+
+    missing = [order_id for order_id, items in by_order.items() if not items]
+    if missing:
+        result = await db.execute(select(Order.id, Order.items).where(Order.id.in_(missing)))
+        for order_id, items in result.all():
+            # Несохраняемые объекты: тот же интерфейс, что у строк таблицы
+            by_order[order_id] = [OrderItem(**row) for row in item_rows(order_id, items)]
+    return by_order
+
+
+def missing_customs_condition():
+    """Позиция без кода ТН ВЭД или страны происхождения."""
+    return or_(
+        OrderItem.tn_ved_code.is_(None),
+        OrderItem.tn_ved_code == "",
+        OrderItem.country_of_origin.is_(None),
+        OrderItem.country_of_origin == "",
+    )
+
+
+async def backfill_order_items(db: AsyncSession, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """Перенести Order.items заказов без строк в order_items. Идемпотентно, commit на порцию.
+
+    Возвращает число обработанных заказов.
+    """
+    processed = 0
+    last_id = None
+    while True:
+        query = (
+            select(Order.id, Order.items)
+            .where(~exists().where(OrderItem.order_id == Order.id))
+            .order_by(Order.id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            query = query.where(Order.id > last_id)
+        chunk = (await db.execute(query)).all()
+        if not chunk:
+            return processed
+
+        rows = [row for order_id, items in chunk for row in item_rows(order_id, items)]
+        if rows:
+            await db.execute(insert(OrderItem), rows)
+        await db.commit()
+
+        processed += len(chunk)
+        last_id = chunk[-1][0]
+        logger.info("order_items backfill: %d orders", processed)
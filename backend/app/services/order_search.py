@@ -0,0 +1,75 @@
+"""Поиск заказов по индексу: ФИО, номер заказа магазина, трек-номера, телефон, email.
+
+PostgreSQL — ILIKE по документу order_search_document() через GIN pg_trgm,
+ранжирование word_similarity. SQLite — FTS5 orders_search (trigram), ранжирование bm25.
+Точное совпадение номера заказа или трека всегда выше остальных.
+
+Возвращается только top-N (SEARCH_MAX_RESULTS) — без COUNT(*) по всей таблице.
+Запросы короче 3 символов индекс trigram не ускоряет — для них ILIKE по полям.
+"""
+from sqlalchemy import Select, case, column, func, literal_column, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.pagination import Page
+from app.models.order import ORDER_SEARCH_COLUMNS, Order, order_search_document
+
+SEARCH_MAX_RESULTS = 200
+MIN_INDEXED_QUERY_LENGTH = 3
+
+_fts = table("orders_search", column("rowid"), column("rank"))
+
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def apply_search(query: Select, dialect_name: str, term: str) -> Select:
+    """Фильтр по строке поиска и сортировка по релевантности."""
+    term = term.strip()
+    exact = case(
+        (or_(
+            Order.external_order_id == term,
+            Order.track_number == term,
+            Order.internal_track_number == term,
+        ), 1),
+        else_=0,
+    )
+
+    if len(term) >= MIN_INDEXED_QUERY_LENGTH and dialect_name == "postgresql":
+        document = literal_column(f"({order_search_document()})")
+        return (
+            query.where(document.ilike(_like_pattern(term), escape="\\"))
+            .order_by(exact.desc(), func.word_similarity(term, document).desc(), Order.created_at.desc())
+        )
+
+    if len(term) >= MIN_INDEXED_QUERY_LENGTH and dialect_name == "sqlite":
+        phrase = '"' + term.replace('"', '""') + '"'
+        return (
+            query.join(_fts, _fts.c.rowid == literal_column("orders.rowid"))
+            .where(literal_column("orders_search").op("MATCH")(phrase))
+            .order_by(exact.desc(), _fts.c.rank, Order.created_at.desc())
+        )
+
+    pattern = _like_pattern(term)
+    return (
+        query.where(or_(*(getattr(Order, c).ilike(pattern, escape="\\") for c in ORDER_SEARCH_COLUMNS)))
+        .order_by(exact.desc(), Order.created_at.desc())
+    )
+
+
+async def search_page(db: AsyncSession, query: Select, term: str, page: int, per_page: int) -> Page:
+    """Страница результатов поиска; total — число найденных в пределах top-N."""
+    ranked = apply_search(query, db.bind.dialect.name, term).limit(SEARCH_MAX_RESULTS)
+
+    total = (await db.execute(
+        select(func.count()).select_from(ranked.order_by(None).subquery())
+    )).scalar_one()
+
+    offset = (page - 1) * per_page
+    limit = max(0, min(per_page, SEARCH_MAX_RESULTS - offset))
+    items = []
+    if limit:
+        result = await db.execute(ranked.offset(offset).limit(limit))
+        items = list(result.scalars().all())
+    return Page(items=items, total=total, next_cursor=None)
@@ -1,10 +1,16 @@
+import asyncio
 import base64
+import logging
 import time
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, replace
 
 import httpx
 
 from app.core.config import Settings
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.tariff_cache import TariffCache, weight_bucket
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -25,6 +31,7 @@ class TariffResult:
     total_kopecks: int
     min_days: int
     max_days: int
+    stale: bool = False  # Почта недоступна, это последний известный тариф
 
 
 @dataclass
@@ -54,6 +61,8 @@ class AddressResult:
     quality_code: str
     validation_code: str
     is_valid: bool
+    # Массовая нормализация: чанк с этим значением не обработан (текст ошибки)
+    error: str | None = None
 
 
 @dataclass
@@ -62,6 +71,7 @@ class FioResult:
     name: str
     middle_name: str
     quality_code: str
+    error: str | None = None
 
 
 @dataclass
@@ -70,6 +80,7 @@ class PhoneResult:
     city_code: str
     number: str
     quality_code: str
+    error: str | None = None
 
 
 @dataclass
@@ -78,20 +89,156 @@ class ShipmentResult:
     barcode: str         # Трек-номер (ШПИ)
 
 
+@dataclass
+class ShipmentItem:
+    recipient_name: str
+    recipient_address: str
+    recipient_postal_code: str
+    recipient_phone: str
+    weight_grams: int
+    order_num: str = ""
+    declared_value_kopecks: int = 0
+    mail_type: str = "ONLINE_PARCEL"
+
+
+@dataclass
+class BulkShipmentResult:
+    pochta_id: int | None
+    barcode: str
+    error: str | None = None
+
+
 GOOD_QUALITY_CODES = {"GOOD", "POSTAL_BOX", "ON_DEMAND", "UNDEF_05"}
 GOOD_VALIDATION_CODES = {"VALIDATED", "OVERRIDDEN", "CONFIRMED_MANUALLY"}
 
 
+def _backlog_item(item: ShipmentItem) -> dict:
+    """Элемент массива для PUT /1.0/user/backlog."""
+    # Разбираем ФИО
+    parts = item.recipient_name.strip().split()
+    surname = parts[0] if len(parts) >= 1 else item.recipient_name
+    name = parts[1] if len(parts) >= 2 else ""
+    middle_name = " ".join(parts[2:]) if len(parts) >= 3 else ""
+
+    # Очищаем телефон для Почты (только цифры, без +)
+    phone_digits = item.recipient_phone.replace("+", "").replace("-", "").replace(" ", "").replace("(", "").replace(")", "")
+
+    payload = {
+        "address-type-to": "DEFAULT",
+        "given-name": name,
+        "house-to": "",
+        "index-to": int(item.recipient_postal_code),
+        "mail-category": "ORDINARY",
+        "mail-type": item.mail_type,
+        "mass": item.weight_grams,
+        "middle-name": middle_name,
+        "order-num": item.order_num,
+        "place-to": "",
+        "recipient-name": item.recipient_name,
+        "region-to": "",
+        "street-to": item.recipient_address,
+        "surname": surname,
+        "tel-address": int(phone_digits) if phone_digits.isdigit() else 0,
+    }
+
+    # Если есть объявленная ценность
+    if item.declared_value_kopecks > 0:
+        payload["insr-value"] = item.declared_value_kopecks
+    return payload
+
+
+def _map_backlog_response(data: dict, count: int) -> list[BulkShipmentResult]:
+    """Сопоставление ответа /user/backlog с позициями запроса.
+
+    Ответ: {"result-ids": [...], "errors": [{"position": N, "error-codes": [...]}],
+    "orders": [{"result-id": ..., "barcode": ...}]}. result-ids идут по порядку
+    успешных позиций (позиции из errors пропускаются).
+    """
+    errors: dict[int, str] = {}
+    for err in data.get("errors", []):
+        codes = err.get("error-codes", [])
+        message = "; ".join(c.get("description") or c.get("code", "") for c in codes) or "Ошибка Почты"
+        errors[err.get("position", -1)] = message
+
+    barcodes = {o.get("result-id"): o.get("barcode", "") for o in data.get("orders", [])}
+    result_ids = iter(data.get("result-ids") or [o.get("result-id") for o in data.get("orders", [])])
+
+    results: list[BulkShipmentResult] = []
+    for position in range(count):
+        if position in errors:
+            results.append(BulkShipmentResult(pochta_id=None, barcode="", error=errors[position]))
+            continue
+        pochta_id = next(result_ids, None)
+        if pochta_id is None:
+            results.append(BulkShipmentResult(pochta_id=None, barcode="", error="Нет result-id в ответе Почты"))
+            continue
+        results.append(BulkShipmentResult(pochta_id=pochta_id, barcode=barcodes.get(pochta_id, "")))
+    return results
+
+
+def _parse_address(data: dict) -> AddressResult:
+    quality = data.get("quality-code", "")
+    validation = data.get("validation-code", "")
+    return AddressResult(
+        index=data.get("index", ""),
+        region=data.get("region", ""),
+        place=data.get("place", ""),
+        street=data.get("street", ""),
+        house=data.get("house", ""),
+        room=data.get("room", ""),
+        quality_code=quality,
+        validation_code=validation,
+        is_valid=quality in GOOD_QUALITY_CODES and validation in GOOD_VALIDATION_CODES,
+    )
+
+
+def _parse_fio(data: dict) -> FioResult:
+    return FioResult(
+        surname=data.get("surname", ""),
+        name=data.get("name", ""),
+        middle_name=data.get("middle-name", ""),
+        quality_code=data.get("quality-code", ""),
+    )
+
+
+def _parse_phone(data: dict) -> PhoneResult:
+    return PhoneResult(
+        country_code=data.get("phone-country-code", ""),
+        city_code=data.get("phone-city-code", ""),
+        number=data.get("phone-number", ""),
+        quality_code=data.get("quality-code", ""),
+    )
+
+
 class PochtaClient:
     BASE_URL = "https://otpravka-api.pochta.ru/1.0"
     POSTOFFICE_URL = "https://otpravka-api.pochta.ru/postoffice/1.0"
     PUBLIC_TARIFF_URL = "https://tariff.pochta.ru/v2"
 
+    # /clean/*: максимум записей в одном запросе и число параллельных запросов
+    CLEAN_MAX_BATCH = 500
+    CLEAN_CONCURRENCY = 4
+    # /user/backlog: то же для массового создания отправлений
+    BACKLOG_MAX_BATCH = 100
+    BACKLOG_CONCURRENCY = 2
+
     def __init__(self, settings: Settings):
         self._api_token = settings.POCHTA_API_TOKEN
         self._login = settings.POCHTA_LOGIN
         self._password = settings.POCHTA_PASSWORD
         self._client: httpx.AsyncClient | None = None
+        self._tariff_cache = TariffCache(settings)
+        self._hedge_enabled = settings.POCHTA_HEDGE_ENABLED
+        self._breakers = {
+            endpoint: CircuitBreaker(
+                endpoint,
+                failure_threshold=settings.POCHTA_BREAKER_FAILURE_THRESHOLD,
+                reset_seconds=settings.POCHTA_BREAKER_RESET_SECONDS,
+                timeout_min=settings.POCHTA_TIMEOUT_MIN_SECONDS,
+                timeout_max=settings.POCHTA_TIMEOUT_MAX_SECONDS,
+            )
+            for endpoint in ("tariff_public", "tariff_contract", "clean", "backlog")
+        }
 
     def _auth_headers(self) -> dict[str, str]:
         user_auth = base64.b64encode(f"{self._login}:{self._password}".encode()).decode()
@@ -116,9 +263,95 @@ class PochtaClient:
     async def close(self):
         if self._client:
             await self._client.aclose()
+        await self._tariff_cache.close()
+
+    async def _cached_tariff(self, key: str, fetch) -> tuple[TariffResult, RawHttpLog]:
+        """Тариф через двухуровневый кеш; в кеше хранится результат вместе с логом запроса."""
+        async def fetch_serialized() -> dict:
+            result, log = await fetch()
+            return {"result": asdict(result), "log": asdict(log)}
+
+        try:
+            data = await self._tariff_cache.get_or_fetch(key, fetch_serialized)
+        except (CircuitOpenError, httpx.TransportError, httpx.HTTPStatusError) as e:
+            # 4xx — ошибка запроса (индекс, вес), а не недоступность Почты: старый тариф её скрыл бы
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                raise
+            # Почта недоступна — отдаём последний успешный тариф с пометкой stale
+            data = await self._tariff_cache.get_stale(key)
+            if data is None:
+                raise
+            logger.warning("Pochta unavailable (%s), using stale tariff for %s", e, key)
+            return TariffResult(**{**data["result"], "stale": True}), RawHttpLog(**data["log"])
+        return TariffResult(**data["result"]), RawHttpLog(**data["log"])
+
+    def breaker_states(self) -> dict[str, str]:
+        return {endpoint: breaker.state for endpoint, breaker in self._breakers.items()}
+
+    async def _request(self, endpoint: str, method: str, url: str, hedge: bool = False, **kwargs) -> httpx.Response:
+        """HTTP-запрос к Почте через circuit breaker эндпоинта с адаптивным таймаутом.
+
+        Сбоем считаются сетевые ошибки, таймауты и ответы 5xx; 4xx — ошибка запроса,
+        не состояния Почты. hedge=True (только для идемпотентных GET): если ответа нет
+        дольше p95 задержки, отправляется дублирующий запрос, побеждает первый ответ.
+        """
+        breaker = self._breakers[endpoint]
+        breaker.check()
+        timeout = breaker.timeout()
+
+        async def send() -> httpx.Response:
+            t0 = time.monotonic()
+            try:
+                resp = await self._client.request(method, url, timeout=timeout, **kwargs)
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception:
+                breaker.record_failure()
+                raise
+            if resp.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success(time.monotonic() - t0)
+            return resp
+
+        delay = breaker.hedge_delay() if hedge else None
+        if delay is None:
+            return await send()
+
+        first = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        second = asyncio.ensure_future(send())
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            # Оба запроса завершились ошибкой — пробрасываем первую
+            return first.result()
+        finally:
+            for task in pending:
+                task.cancel()
 
     async def calculate_tariff_public(
-        self, index_from: str, index_to: str, weight_grams: int, object_code: int = 23030
+        self, index_from: str, index_to: str, weight_grams: int, object_code: int = 23030,
+        use_cache: bool = True,
+    ) -> tuple[TariffResult, RawHttpLog]:
+        if use_cache:
+            weight = weight_bucket(weight_grams, self._tariff_cache.weight_step)
+            key = self._tariff_cache.make_key("public", index_from, index_to, weight, object_code)
+            return await self._cached_tariff(
+                key, lambda: self._fetch_tariff_public(index_from, index_to, weight, object_code)
+            )
+        return await self._fetch_tariff_public(index_from, index_to, weight_grams, object_code)
+
+    async def _fetch_tariff_public(
+        self, index_from: str, index_to: str, weight_grams: int, object_code: int
     ) -> tuple[TariffResult, RawHttpLog]:
         params = {
             "json": "",
@@ -130,7 +363,8 @@ class PochtaClient:
         }
         url = f"{self.PUBLIC_TARIFF_URL}/calculate/tariff/delivery"
         t0 = time.monotonic()
-        resp = await self._client.get(url, params=params)
+        # GET тарификатора идемпотентен — можно хеджировать медленные запросы
+        resp = await self._request("tariff_public", "GET", url, hedge=self._hedge_enabled, params=params)
         duration_ms = int((time.monotonic() - t0) * 1000)
         resp.raise_for_status()
         data = resp.json()
@@ -157,7 +391,19 @@ class PochtaClient:
         ), log
 
     async def calculate_tariff_contract(
-        self, index_from: str, index_to: str, weight_grams: int, mail_type: str = "ONLINE_PARCEL"
+        self, index_from: str, index_to: str, weight_grams: int, mail_type: str = "ONLINE_PARCEL",
+        use_cache: bool = True,
+    ) -> tuple[TariffResult, RawHttpLog]:
+        if use_cache:
+            weight = weight_bucket(weight_grams, self._tariff_cache.weight_step)
+            key = self._tariff_cache.make_key("contract", index_from, index_to, weight, mail_type)
+            return await self._cached_tariff(
+                key, lambda: self._fetch_tariff_contract(index_from, index_to, weight, mail_type)
+            )
+        return await self._fetch_tariff_contract(index_from, index_to, weight_grams, mail_type)
+
+    async def _fetch_tariff_contract(
+        self, index_from: str, index_to: str, weight_grams: int, mail_type: str
     ) -> tuple[TariffResult, RawHttpLog]:
         payload = {
             "index-from": index_from,
@@ -169,7 +415,7 @@ class PochtaClient:
         }
         url = f"{self.BASE_URL}/tariff"
         t0 = time.monotonic()
-        resp = await self._client.post(url, headers=self._auth_headers(), json=payload)
+        resp = await self._request("tariff_contract", "POST", url, headers=self._auth_headers(), json=payload)
         duration_ms = int((time.monotonic() - t0) * 1000)
         resp.raise_for_status()
         data = resp.json()
@@ -198,77 +444,94 @@ class PochtaClient:
     async def normalize_address(self, address: str) -> tuple[AddressResult, RawHttpLog]:
         payload = [{"id": "0", "original-address": address}]
         url = f"{self.BASE_URL}/clean/address"
-        t0 = time.monotonic()
-        resp = await self._client.post(url, headers=self._auth_headers(), json=payload)
-        duration_ms = int((time.monotonic() - t0) * 1000)
-        resp.raise_for_status()
-        raw = resp.json()
-        data = raw[0]
-
-        quality = data.get("quality-code", "")
-        validation = data.get("validation-code", "")
-        is_valid = quality in GOOD_QUALITY_CODES and validation in GOOD_VALIDATION_CODES
-
-        log = RawHttpLog(
-            method="POST", url=url, headers=self._safe_headers(),
-            request_body=payload, response_status=resp.status_code,
-            response_body=raw, duration_ms=duration_ms,
-        )
-        return AddressResult(
-            index=data.get("index", ""),
-            region=data.get("region", ""),
-            place=data.get("place", ""),
-            street=data.get("street", ""),
-            house=data.get("house", ""),
-            room=data.get("room", ""),
-            quality_code=quality,
-            validation_code=validation,
-            is_valid=is_valid,
-        ), log
+        raw, log = await self._post_clean(url, payload)
+        return _parse_address(raw[0]), log
 
     async def normalize_fio(self, fio: str) -> tuple[FioResult, RawHttpLog]:
         payload = [{"id": "0", "original-fio": fio}]
         url = f"{self.BASE_URL}/clean/physical"
-        t0 = time.monotonic()
-        resp = await self._client.post(url, headers=self._auth_headers(), json=payload)
-        duration_ms = int((time.monotonic() - t0) * 1000)
-        resp.raise_for_status()
-        raw = resp.json()
-        data = raw[0]
-
-        log = RawHttpLog(
-            method="POST", url=url, headers=self._safe_headers(),
-            request_body=payload, response_status=resp.status_code,
-            response_body=raw, duration_ms=duration_ms,
-        )
-        return FioResult(
-            surname=data.get("surname", ""),
-            name=data.get("name", ""),
-            middle_name=data.get("middle-name", ""),
-            quality_code=data.get("quality-code", ""),
-        ), log
+        raw, log = await self._post_clean(url, payload)
+        return _parse_fio(raw[0]), log
 
     async def normalize_phone(self, phone: str) -> tuple[PhoneResult, RawHttpLog]:
         payload = [{"id": "0", "original-phone": phone}]
         url = f"{self.BASE_URL}/clean/phone"
+        raw, log = await self._post_clean(url, payload)
+        return _parse_phone(raw[0]), log
+
+    async def normalize_addresses(self, addresses: list[str]) -> tuple[list[AddressResult], list[RawHttpLog]]:
+        """Массовая нормализация адресов. Результаты — в порядке входного списка."""
+        return await self._clean_bulk(f"{self.BASE_URL}/clean/address", "original-address", addresses, _parse_address)
+
+    async def normalize_fios(self, fios: list[str]) -> tuple[list[FioResult], list[RawHttpLog]]:
+        """Массовая нормализация ФИО. Результаты — в порядке входного списка."""
+        return await self._clean_bulk(f"{self.BASE_URL}/clean/physical", "original-fio", fios, _parse_fio)
+
+    async def normalize_phones(self, phones: list[str]) -> tuple[list[PhoneResult], list[RawHttpLog]]:
+        """Массовая нормализация телефонов. Результаты — в порядке входного списка."""
+        return await self._clean_bulk(f"{self.BASE_URL}/clean/phone", "original-phone", phones, _parse_phone)
+
+    async def _post_clean(self, url: str, payload: list[dict]) -> tuple[list, RawHttpLog]:
         t0 = time.monotonic()
-        resp = await self._client.post(url, headers=self._auth_headers(), json=payload)
+        resp = await self._request("clean", "POST", url, headers=self._auth_headers(), json=payload)
         duration_ms = int((time.monotonic() - t0) * 1000)
         resp.raise_for_status()
         raw = resp.json()
-        data = raw[0]
 
         log = RawHttpLog(
             method="POST", url=url, headers=self._safe_headers(),
             request_body=payload, response_status=resp.status_code,
             response_body=raw, duration_ms=duration_ms,
         )
-        return PhoneResult(
-            country_code=data.get("phone-country-code", ""),
-            city_code=data.get("phone-city-code", ""),
-            number=data.get("phone-number", ""),
-            quality_code=data.get("quality-code", ""),
-        ), log
+        return raw, log
+
+    async def _clean_bulk(self, url: str, field: str, values: list[str], parse) -> tuple[list, list[RawHttpLog]]:
+        """Нормализация через /clean/*: дедупликация, чанки по CLEAN_MAX_BATCH,
+        параллельная отправка чанков (не более CLEAN_CONCURRENCY), сопоставление по id.
+
+        Ошибка чанка не прерывает остальные: его значения получают пустой результат
+        с error. Исключение — только если не обработан ни один чанк.
+        """
+        unique = list(dict.fromkeys(values))
+        if not unique:
+            return [], []
+
+        items = [{"id": str(i), field: value} for i, value in enumerate(unique)]
+        chunks = [items[i:i + self.CLEAN_MAX_BATCH] for i in range(0, len(items), self.CLEAN_MAX_BATCH)]
+        semaphore = asyncio.Semaphore(self.CLEAN_CONCURRENCY)
+
+        async def send(chunk: list[dict]) -> tuple[list, RawHttpLog | None, Exception | None]:
+            async with semaphore:
+                try:
+                    raw, log = await self._post_clean(url, chunk)
+                except Exception as e:
+                    return [], None, e
+            return raw, log, None
+
+        responses = await asyncio.gather(*(send(chunk) for chunk in chunks))
+        errors = [error for _raw, _log, error in responses if error is not None]
+        if len(errors) == len(chunks):
+            raise errors[0]
+
+        by_id: dict[str, dict] = {}
+        failed: dict[str, str] = {}
+        logs: list[RawHttpLog] = []
+        for chunk, (raw, log, error) in zip(chunks, responses):
+            if error is not None:
+                logger.warning("Pochta %s: chunk of %d failed: %s", url, len(chunk), error)
+                failed.update((item["id"], str(error)) for item in chunk)
+                continue
+            logs.append(log)
+            for data in raw:
+                by_id[str(data.get("id"))] = data
+
+        by_value = {}
+        for i, value in enumerate(unique):
+            result = parse(by_id.get(str(i), {}))
+            if str(i) in failed:
+                result = replace(result, error=failed[str(i)])
+            by_value[value] = result
+        return [by_value[value] for value in values], logs
 
     async def get_balance(self) -> int | None:
         """Возвращает баланс в копейках или None если эндпоинт недоступен (нет договора)."""
@@ -284,7 +547,15 @@ class PochtaClient:
     async def compare_tariffs(
         self, index_from: str, index_to: str, weight_grams: int, object_code: int = 23030, mail_type: str = "ONLINE_PARCEL"
     ) -> tuple[TariffCompareResult, list[RawHttpLog]]:
-        public, log_public = await self.calculate_tariff_public(index_from, index_to, weight_grams, object_code)
+        # Публичный и контрактный тарифы запрашиваем параллельно: задержка = max, а не сумма
+        public_outcome, contract_outcome = await asyncio.gather(
+            self.calculate_tariff_public(index_from, index_to, weight_grams, object_code),
+            self.calculate_tariff_contract(index_from, index_to, weight_grams, mail_type),
+            return_exceptions=True,
+        )
+        if isinstance(public_outcome, BaseException):
+            raise public_outcome
+        public, log_public = public_outcome
         logs: list[RawHttpLog] = [log_public]
 
         contract_cost = 0
@@ -292,15 +563,15 @@ class PochtaClient:
         contract_total = 0
         contract_available = False
         contract_error = None
-        try:
-            contract, log_contract = await self.calculate_tariff_contract(index_from, index_to, weight_grams, mail_type)
+        if isinstance(contract_outcome, BaseException):
+            contract_error = str(contract_outcome)
+        else:
+            contract, log_contract = contract_outcome
             contract_cost = contract.cost_kopecks
             contract_vat = contract.vat_kopecks
             contract_total = contract.total_kopecks
             contract_available = True
             logs.append(log_contract)
-        except Exception as e:
-            contract_error = str(e)
 
         savings_kopecks = public.total_kopecks - contract_total if contract_available else 0
         savings_percent = (savings_kopecks / public.total_kopecks * 100) if contract_available and public.total_kopecks > 0 else 0.0
@@ -336,42 +607,64 @@ class PochtaClient:
 
         Возвращает ShipmentResult с ID и трек-номером (barcode).
         """
-        # Разбираем ФИО
-        parts = recipient_name.strip().split()
-        surname = parts[0] if len(parts) >= 1 else recipient_name
-        name = parts[1] if len(parts) >= 2 else ""
-        middle_name = " ".join(parts[2:]) if len(parts) >= 3 else ""
-
-        # Очищаем телефон для Почты (только цифры, без +)
-        phone_digits = recipient_phone.replace("+", "").replace("-", "").replace(" ", "").replace("(", "").replace(")", "")
-
         payload = [
-            {
-                "address-type-to": "DEFAULT",
-                "given-name": name,
-                "house-to": "",
-                "index-to": int(recipient_postal_code),
-                "mail-category": "ORDINARY",
-                "mail-type": mail_type,
-                "mass": weight_grams,
-                "middle-name": middle_name,
-                "order-num": order_num,
-                "place-to": "",
-                "recipient-name": recipient_name,
-                "region-to": "",
-                "street-to": recipient_address,
-                "surname": surname,
-                "tel-address": int(phone_digits) if phone_digits.isdigit() else 0,
-            }
+            _backlog_item(ShipmentItem(
+                recipient_name=recipient_name,
+                recipient_address=recipient_address,
+                recipient_postal_code=recipient_postal_code,
+                recipient_phone=recipient_phone,
+                weight_grams=weight_grams,
+                order_num=order_num,
+                declared_value_kopecks=declared_value_kopecks,
+                mail_type=mail_type,
+            ))
         ]
 
-        # Если есть объявленная ценность
-        if declared_value_kopecks > 0:
-            payload[0]["insr-value"] = declared_value_kopecks
+        data, log = await self._put_backlog(payload)
+
+        # Ответ: {"result-ids": [12345]} или {"orders": [{"barcode": "...", "result-id": 12345}]}
+        result_ids = data.get("result-ids", [])
+        orders = data.get("orders", [])
+
+        pochta_id = result_ids[0] if result_ids else (orders[0].get("result-id", 0) if orders else 0)
+        barcode = orders[0].get("barcode", "") if orders else ""
 
+        return ShipmentResult(pochta_id=pochta_id, barcode=barcode), log
+
+    async def create_shipments(
+        self, items: list[ShipmentItem]
+    ) -> tuple[list[BulkShipmentResult], list[RawHttpLog]]:
+        """Массовое создание отправлений: много заказов в одном PUT /1.0/user/backlog.
+
+        Элементы отправляются чанками по BACKLOG_MAX_BATCH (не более BACKLOG_CONCURRENCY
+        запросов одновременно). Результаты — в порядке items; ошибка отдельной позиции
+        или всего чанка не прерывает остальные.
+        """
+        chunks = [items[i:i + self.BACKLOG_MAX_BATCH] for i in range(0, len(items), self.BACKLOG_MAX_BATCH)]
+        semaphore = asyncio.Semaphore(self.BACKLOG_CONCURRENCY)
+
+        async def send(chunk: list[ShipmentItem]) -> tuple[list[BulkShipmentResult], RawHttpLog | None]:
+            async with semaphore:
+                try:
+                    data, log = await self._put_backlog([_backlog_item(item) for item in chunk])
+                except Exception as e:
+                    return [BulkShipmentResult(pochta_id=None, barcode="", error=str(e)) for _ in chunk], None
+            return _map_backlog_response(data, len(chunk)), log
+
+        responses = await asyncio.gather(*(send(chunk) for chunk in chunks))
+
+        results: list[BulkShipmentResult] = []
+        logs: list[RawHttpLog] = []
+        for chunk_results, log in responses:
+            results.extend(chunk_results)
+            if log is not None:
+                logs.append(log)
+        return results, logs
+
+    async def _put_backlog(self, payload: list[dict]) -> tuple[dict, RawHttpLog]:
         url = f"{self.BASE_URL}/user/backlog"
         t0 = time.monotonic()
-        resp = await self._client.put(url, headers=self._auth_headers(), json=payload)
+        resp = await self._request("backlog", "PUT", url, headers=self._auth_headers(), json=payload)
         duration_ms = int((time.monotonic() - t0) * 1000)
         resp.raise_for_status()
         data = resp.json()
@@ -385,12 +678,4 @@ class PochtaClient:
             response_body=data,
             duration_ms=duration_ms,
         )
-
-        # Ответ: {"result-ids": [12345]} или {"orders": [{"barcode": "...", "result-id": 12345}]}
-        result_ids = data.get("result-ids", [])
-        orders = data.get("orders", [])
-
-        pochta_id = result_ids[0] if result_ids else (orders[0].get("result-id", 0) if orders else 0)
-        barcode = orders[0].get("barcode", "") if orders else ""
-
-        return ShipmentResult(pochta_id=pochta_id, barcode=barcode), log
+        return data, log
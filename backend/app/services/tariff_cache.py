@@ -0,0 +1,148 @@
+"""Двухуровневый кеш тарифов Почты России.
+
+Уровни:
+    1. In-process LRU (OrderedDict) с TTL — мгновенный ответ в пределах воркера.
+    2. Redis с TTL — общий кеш для всех uvicorn- и Celery-воркеров.
+
+Одинаковые параллельные запросы схлопываются в один запрос к Почте (single-flight):
+первый вызов идёт в API, остальные ждут его результат.
+
+Дополнительно хранится копия последнего успешного тарифа с долгим TTL (stale):
+она отдаётся, когда Почта недоступна (circuit breaker открыт, таймауты).
+
+Ключ: (вид тарифа, индекс откуда, индекс куда, весовая ступень, object_code / mail_type).
+Вес округляется вверх до ступени TARIFF_CACHE_WEIGHT_STEP_GRAMS, и в Почту уходит
+именно округлённый вес — тариф в кеше точен для всей ступени.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from app.core.config import Settings
+from app.core.redis_client import RedisConnector
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "ostrov:tariff"
+
+
+def weight_bucket(weight_grams: int, step_grams: int) -> int:
+    """Округление веса вверх до ступени (1..100 → 100 при шаге 100 г)."""
+    if step_grams <= 1:
+        return weight_grams
+    return max(step_grams, -(-weight_grams // step_grams) * step_grams)
+
+
+class TariffCache:
+    def __init__(self, settings: Settings):
+        self._enabled = settings.TARIFF_CACHE_ENABLED
+        self._local_ttl = settings.TARIFF_CACHE_LOCAL_TTL_SECONDS
+        self._local_max = settings.TARIFF_CACHE_LOCAL_MAX_ENTRIES
+        self._redis_ttl = settings.TARIFF_CACHE_REDIS_TTL_SECONDS
+        self._stale_ttl = settings.TARIFF_CACHE_STALE_TTL_SECONDS
+        self.weight_step = settings.TARIFF_CACHE_WEIGHT_STEP_GRAMS
+
+        self._local: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._stale: OrderedDict[str, Any] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        # Без Redis кеш работает только in-process
+        self._redis = RedisConnector("tariff cache", settings.REDIS_URL)
+
+    @staticmethod
+    def make_key(kind: str, index_from: str, index_to: str, weight_grams: int, code: str | int) -> str:
+        return f"{CACHE_KEY_PREFIX}:{kind}:{index_from}:{index_to}:{weight_grams}:{code}"
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Вернуть значение из кеша или получить его через fetch() (один раз на ключ)."""
+        if not self._enabled:
+            return await fetch()
+
+        cached = self._local_get(key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._redis_get(key)
+            if value is None:
+                value = await fetch()
+                await self._redis_set(key, value, self._redis_ttl)
+                await self._stale_set(key, value)
+            self._local_set(key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            # Отмена ведущего запроса (например, по таймауту вызывающего) не должна
+            # отменять ожидающих — они получают обычное исключение
+            exc = e if isinstance(e, Exception) else RuntimeError("Tariff lookup cancelled")
+            future.set_exception(exc)
+            # Помечаем исключение как полученное, если ожидающих не было
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_stale(self, key: str) -> Any:
+        """Последнее успешное значение по ключу (без учёта основного TTL) или None."""
+        if key in self._stale:
+            return self._stale[key]
+        return await self._redis_get(f"{key}:stale")
+
+    async def close(self):
+        await self._redis.close()
+
+    # ── in-process LRU ───────────────────────────────────────────────────────
+
+    def _local_get(self, key: str) -> Any:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._local.pop(key, None)
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _local_set(self, key: str, value: Any) -> None:
+        self._local[key] = (time.monotonic() + self._local_ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self._local_max:
+            self._local.popitem(last=False)
+
+    # ── Redis ────────────────────────────────────────────────────────────────
+
+    async def _redis_get(self, key: str) -> Any:
+        redis = await self._redis.get()
+        if redis is None:
+            return None
+        try:
+            raw = await redis.get(key)
+            return json.loads(raw) if raw else None
+        except Exception:
+            logger.debug("Tariff cache: Redis GET failed for %s", key, exc_info=True)
+            return None
+
+    async def _stale_set(self, key: str, value: Any) -> None:
+        self._stale[key] = value
+        self._stale.move_to_end(key)
+        while len(self._stale) > self._local_max:
+            self._stale.popitem(last=False)
+        await self._redis_set(f"{key}:stale", value, self._stale_ttl)
+
+    async def _redis_set(self, key: str, value: Any, ttl: int) -> None:
+        redis = await self._redis.get()
+        if redis is None:
+            return
+        try:
+            await redis.set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+        except Exception:
+            logger.debug("Tariff cache: Redis SET failed for %s", key, exc_info=True)
@@ -0,0 +1,244 @@
+"""Предрасчитанная матрица тарифов: SENDER_POSTAL_CODE → регионы (3 цифры индекса) × вес.
+
+Ночная задача Celery (tasks_tariff_matrix.build_tariff_matrix) запрашивает у Почты
+публичный и контрактный тарифы и сроки доставки для каждого префикса региона из
+hub_router._PREFIX_TO_HUB на ступенях веса WEIGHT_BREAKPOINTS. Результат хранится
+в Redis одним JSON и держится в памяти воркера в виде плоских array('i').
+
+Оценка (estimate) для произвольного веса — линейная интерполяция между соседними
+ступенями, сроки берутся по верхней ступени. Ячейка -1 означает, что Почта не
+вернула тариф; для таких направлений оценка недоступна и нужен живой запрос.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import time
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from app.core.config import settings
+from app.core.redis_client import RedisConnector
+from app.services.hub_router import _PREFIX_TO_HUB
+from app.services.pochta import PochtaClient
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY = "ostrov:tariff_matrix"
+MISSING = -1
+# Ниже этой доли заполненных ячеек новая матрица не сохраняется (Почта сбоила при расчёте)
+MIN_COVERAGE = 0.5
+
+# Ступени веса, г (обрезаются по MAX_PACKAGE_WEIGHT_GRAMS, максимум добавляется всегда)
+WEIGHT_BREAKPOINTS = (100, 250, 500, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 25000, 31000)
+
+
+@dataclass
+class TariffEstimate:
+    total_kopecks: int
+    min_days: int
+    max_days: int
+
+
+class TariffMatrix:
+    """Матрица prefixes × weights; значения в плоских массивах, индекс = p * len(weights) + w."""
+
+    def __init__(
+        self,
+        sender_postal_code: str,
+        object_code: int,
+        prefixes: list[int],
+        weights: list[int],
+        public: array,
+        contract: array,
+        days_min: array,
+        days_max: array,
+        built_at: str,
+    ):
+        self.sender_postal_code = sender_postal_code
+        self.object_code = object_code
+        self.prefixes = prefixes
+        self.weights = weights
+        self.public = public
+        self.contract = contract
+        self.days_min = days_min
+        self.days_max = days_max
+        self.built_at = built_at
+        self._prefix_row = {prefix: i for i, prefix in enumerate(prefixes)}
+
+    def estimate(self, postal_code: str, weight_grams: int, kind: str = "public") -> TariffEstimate | None:
+        """Оценка тарифа по матрице или None (регион не покрыт, вес вне диапазона, нет данных)."""
+        try:
+            row = self._prefix_row.get(int(postal_code[:3]))
+        except ValueError:
+            return None
+        if row is None or weight_grams <= 0 or weight_grams > self.weights[-1]:
+            return None
+
+        values = self.public if kind == "public" else self.contract
+        base = row * len(self.weights)
+        hi = bisect.bisect_left(self.weights, weight_grams)
+        hi_value = values[base + hi]
+        if hi_value == MISSING:
+            return None
+
+        total = hi_value
+        if hi > 0 and self.weights[hi] != weight_grams:
+            lo_value = values[base + hi - 1]
+            if lo_value != MISSING:
+                w_lo, w_hi = self.weights[hi - 1], self.weights[hi]
+                total = lo_value + (hi_value - lo_value) * (weight_grams - w_lo) // (w_hi - w_lo)
+
+        return TariffEstimate(
+            total_kopecks=total,
+            min_days=self.days_min[base + hi],
+            max_days=self.days_max[base + hi],
+        )
+
+    def coverage(self) -> float:
+        """Доля заполненных ячеек публичного тарифа."""
+        if not self.public:
+            return 0.0
+        return sum(1 for v in self.public if v != MISSING) / len(self.public)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "sender_postal_code": self.sender_postal_code,
+            "object_code": self.object_code,
+            "built_at": self.built_at,
+            "prefixes": self.prefixes,
+            "weights": self.weights,
+            "public": self.public.tolist(),
+            "contract": self.contract.tolist(),
+            "days_min": self.days_min.tolist(),
+            "days_max": self.days_max.tolist(),
+        }, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "TariffMatrix":
+        data = json.loads(raw)
+        return cls(
+            sender_postal_code=data["sender_postal_code"],
+            object_code=data["object_code"],
+            prefixes=data["prefixes"],
+            weights=data["weights"],
+            public=array("i", data["public"]),
+            contract=array("i", data["contract"]),
+            days_min=array("i", data["days_min"]),
+            days_max=array("i", data["days_max"]),
+            built_at=data["built_at"],
+        )
+
+
+def weight_breakpoints(max_weight_grams: int) -> list[int]:
+    weights = [w for w in WEIGHT_BREAKPOINTS if w < max_weight_grams]
+    weights.append(max_weight_grams)
+    return weights
+
+
+async def build_tariff_matrix(
+    pochta: PochtaClient,
+    sender_postal_code: str,
+    object_code: int,
+    max_weight_grams: int,
+    concurrency: int,
+) -> TariffMatrix:
+    """Опросить Почту по всем префиксам регионов и ступеням веса.
+
+    Для каждого префикса берётся индекс «<префикс>000». Ошибка по ячейке
+    не прерывает расчёт — ячейка остаётся MISSING.
+    """
+    prefixes = sorted(_PREFIX_TO_HUB)
+    weights = weight_breakpoints(max_weight_grams)
+    size = len(prefixes) * len(weights)
+    public = array("i", [MISSING] * size)
+    contract = array("i", [MISSING] * size)
+    days_min = array("i", [0] * size)
+    days_max = array("i", [0] * size)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fill(row: int, col: int, prefix: int, weight: int) -> None:
+        index_to = f"{prefix:03d}000"
+        i = row * len(weights) + col
+        async with semaphore:
+            try:
+                result, _log = await pochta.calculate_tariff_public(
+                    sender_postal_code, index_to, weight, object_code, use_cache=False,
+                )
+                public[i] = result.total_kopecks
+                days_min[i] = result.min_days
+                days_max[i] = result.max_days
+            except Exception as e:
+                logger.warning("Tariff matrix: public %s → %s, %d г: %s", sender_postal_code, index_to, weight, e)
+            try:
+                result, _log = await pochta.calculate_tariff_contract(
+                    sender_postal_code, index_to, weight, use_cache=False,
+                )
+                contract[i] = result.total_kopecks
+            except Exception as e:
+                logger.warning("Tariff matrix: contract %s → %s, %d г: %s", sender_postal_code, index_to, weight, e)
+
+    await asyncio.gather(*(
+        fill(row, col, prefix, weight)
+        for row, prefix in enumerate(prefixes)
+        for col, weight in enumerate(weights)
+    ))
+
+    return TariffMatrix(
+        sender_postal_code=sender_postal_code,
+        object_code=object_code,
+        prefixes=prefixes,
+        weights=weights,
+        public=public,
+        contract=contract,
+        days_min=days_min,
+        days_max=days_max,
+        built_at=datetime.now(timezone.utc).isoformat(),
+    )
+
+
+class TariffMatrixStore:
+    """Матрица в памяти процесса, перечитывается из Redis раз в reload_seconds."""
+
+    def __init__(self, redis_url: str, reload_seconds: int):
+        self._redis = RedisConnector("tariff matrix", redis_url, socket_timeout=2)
+        self._reload_seconds = reload_seconds
+        self._matrix: TariffMatrix | None = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> TariffMatrix | None:
+        if time.monotonic() - self._loaded_at < self._reload_seconds:
+            return self._matrix
+        async with self._lock:
+            if time.monotonic() - self._loaded_at >= self._reload_seconds:
+                await self._load()
+        return self._matrix
+
+    async def save(self, matrix: TariffMatrix) -> None:
+        # Ночной пересчёт не ждёт паузы после чужой неудачной попытки
+        redis = await self._redis.get(force=True)
+        if redis is None:
+            raise RuntimeError("Redis недоступен — матрица тарифов не сохранена")
+        await redis.set(REDIS_KEY, matrix.to_json())
+        self._matrix = matrix
+        self._loaded_at = time.monotonic()
+
+    async def close(self) -> None:
+        await self._redis.close()
+
+    async def _load(self) -> None:
+        self._loaded_at = time.monotonic()
+        redis = await self._redis.get()
+        if redis is None:
+            return
+        try:
+            raw = await redis.get(REDIS_KEY)
+            if raw:
+                self._matrix = TariffMatrix.from_json(raw)
+        except Exception:
+            logger.warning("Tariff matrix: не удалось загрузить из Redis", exc_info=True)
+
+
+tariff_matrix_store = TariffMatrixStore(settings.REDIS_URL, settings.TARIFF_MATRIX_RELOAD_SECONDS)
@@ -0,0 +1,158 @@
+"""Кеш ответов трекинга (/track) в Redis: ключ (shop_id, вид запроса, номер).
+
+Витрины магазинов опрашивают трекинг постоянно; повторный запрос отдаётся из Redis
+без обращения к БД. Ключи ответа заказа собраны в множества-теги
+ostrov:tracking:order:{order_id} и ostrov:tracking:group:{shipment_group_id}.
+При commit сессии, записавшей TrackingEvent заказа или группы (ORM add или
+insert(TrackingEvent)) или изменившей заказ через ORM, теги и все их ключи
+удаляются — слушатели сессии ниже. TTL — страховка для изменений без события
+(например, трек-номер Почты).
+
+Без Redis кеш выключен, ответы строятся из БД; подключение повторяется после
+паузы (core/redis_client.py). Сброс, пропущенный из-за недоступного Redis,
+пишется в лог: до TTL другие процессы могут отдавать старый ответ.
+"""
+import logging
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app.core.config import settings
+from app.core.redis_client import RedisConnector
+from app.models.order import Order
+from app.models.tracking_event import TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ostrov:tracking"
+_PENDING = "tracking_cache_tags"
+
+_redis = RedisConnector("tracking cache")
+
+
+def _key(shop_id: uuid.UUID, kind: str, query: str) -> str:
+    return f"{KEY_PREFIX}:{shop_id}:{kind}:{query}"
+
+
+def _tag(order_id: uuid.UUID | str) -> str:
+    return f"{KEY_PREFIX}:order:{order_id}"
+
+
+def _group_tag(group_id: uuid.UUID | str) -> str:
+    return f"{KEY_PREFIX}:group:{group_id}"
+
+
+async def get_cached(shop_id: uuid.UUID, kind: str, query: str) -> str | None:
+    if not settings.TRACKING_CACHE_ENABLED:
+        return None
+    redis = await _redis.get()
+    if redis is None:
+        return None
+    try:
+        return await redis.get(_key(shop_id, kind, query))
+    except Exception:
+        logger.debug("Tracking cache: Redis GET failed", exc_info=True)
+        return None
+
+
+async def set_cached(
+    shop_id: uuid.UUID, kind: str, query: str, order_id: uuid.UUID, body: str, group_id: uuid.UUID | None = None,
+) -> None:
+    if not settings.TRACKING_CACHE_ENABLED:
+        return
+    redis = await _redis.get()
+    if redis is None:
+        return
+    key = _key(shop_id, kind, query)
+    ttl = settings.TRACKING_CACHE_TTL_SECONDS
+    tags = [_tag(order_id)] + ([_group_tag(group_id)] if group_id else [])
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, body, ex=ttl)
+            for tag in tags:
+                pipe.sadd(tag, key)
+                pipe.expire(tag, ttl)
+            await pipe.execute()
+    except Exception:
+        logger.debug("Tracking cache: Redis SET failed", exc_info=True)
+
+
+async def invalidate(order_ids=(), group_ids=()) -> None:
+    """Удалить закешированные ответы трекинга заказов и заказов групп."""
+    await _delete_tags([_tag(order_id) for order_id in order_ids] + [_group_tag(group_id) for group_id in group_ids])
+
+
+async def _delete_tags(tags: list[str]) -> None:
+    if not tags:
+        return
+    redis = await _redis.get()
+    if redis is None:
+        # Другие процессы, у которых Redis есть, отдают старый ответ до TTL
+        logger.warning(
+            "Tracking cache: Redis unavailable, invalidation dropped for %d tags (stale up to %d s)",
+            len(tags), settings.TRACKING_CACHE_TTL_SECONDS,
+        )
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.smembers(tag)
+            members = await pipe.execute()
+        keys = [key for group in members for key in group]
+        await redis.delete(*tags, *keys)
+    except Exception:
+        logger.warning("Tracking cache: invalidation failed for %d tags", len(tags), exc_info=True)
+
+
+# ── Инвалидация при записи TrackingEvent ──────────────────────────────────────
+
+def _event_tag(order_id, group_id) -> str | None:
+    if order_id:
+        return _tag(order_id)
+    if group_id:
+        return _group_tag(group_id)
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_added(session, flush_context):
+    tags = {_event_tag(obj.order_id, obj.shipment_group_id) for obj in session.new if isinstance(obj, TrackingEvent)}
+    tags.discard(None)
+    # Заказ изменён без своего события (например, включён в группу: событие — у группы)
+    tags.update(_tag(obj.id) for obj in session.dirty if isinstance(obj, Order))
+    if tags:
+        session.info.setdefault(_PENDING, set()).update(tags)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_insert(orm_execute_state):
+    if not orm_execute_state.is_insert:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not TrackingEvent:
+        return
+    params = orm_execute_state.parameters
+    rows = params if isinstance(params, list) else [params or {}]
+    tags = {_event_tag(row.get("order_id"), row.get("shipment_group_id")) for row in rows} - {None}
+    if tags:
+        orm_execute_state.session.info.setdefault(_PENDING, set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    tags = session.info.pop(_PENDING, None)
+    if not tags or not settings.TRACKING_CACHE_ENABLED:
+        return
+    try:
+        # AsyncSession выполняет commit в greenlet — ждём Redis до возврата из commit,
+        # чтобы следующий опрос не получил старый ответ
+        await_only(_delete_tags(list(tags)))
+    except Exception:
+        logger.warning("Tracking cache: invalidation skipped (no async context)", exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
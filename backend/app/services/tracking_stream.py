@@ -0,0 +1,195 @@
+"""Поток событий трекинга магазина для SSE (GET /track/stream).
+
+Каждое событие TrackingEvent, записанное в БД (change_order_status, transition_orders,
+GroupingOptimizer.apply_decision, смена статуса группы), после commit
+публикуется в Redis Stream ostrov:stream:{shop_id}. Слушатели сессии ниже
+собирают события при flush, перед commit дочитывают магазин и статус заказов,
+после commit пишут в Redis — источники событий ничего не вызывают. Событие
+группы (одна строка в БД) публикуется для каждого заказа группы.
+
+Stream, а не PUBLISH: у pub/sub нет истории, а SSE-клиент после обрыва
+продолжает с Last-Event-ID. ID записи в Stream — id SSE-события; поток
+ограничен TRACKING_STREAM_MAXLEN записями на магазин.
+
+Без Redis события не публикуются, эндпоинт отвечает 503.
+"""
+import json
+import logging
+import re
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.util import await_only
+
+from app.core.config import settings
+from app.core.redis_client import RedisConnector
+from app.models.order import Order
+from app.models.tracking_event import TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ostrov:stream"
+_PENDING = "tracking_stream_events"
+_RESOLVE_CHUNK = 500
+
+STREAM_ID_RE = re.compile(r"^\d+-\d+$")
+
+_publisher = RedisConnector("tracking stream")
+# Чтение: XREAD BLOCK держит соединение дольше socket_timeout публикации
+_reader = RedisConnector("tracking stream reader", socket_timeout=settings.TRACKING_STREAM_PING_SECONDS + 10)
+
+
+def stream_key(shop_id: uuid.UUID | str) -> str:
+    return f"{KEY_PREFIX}:{shop_id}"
+
+
+def _stream_id(value: str) -> tuple[int, int]:
+    ms, seq = value.split("-")
+    return int(ms), int(seq)
+
+
+async def publish(events: list[dict]) -> None:
+    """Записать события (с ключом shop_id) в потоки магазинов."""
+    redis = await _publisher.get()
+    if redis is None or not events:
+        return
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            for payload in events:
+                pipe.xadd(
+                    stream_key(payload.pop("shop_id")),
+                    {"data": json.dumps(payload, ensure_ascii=False)},
+                    maxlen=settings.TRACKING_STREAM_MAXLEN,
+                    approximate=True,
+                )
+            await pipe.execute()
+    except Exception:
+        logger.warning("Tracking stream: publish failed for %d events", len(events), exc_info=True)
+
+
+async def get_reader():
+    """Redis-клиент для чтения потоков (None — Redis недоступен)."""
+    return await _reader.get()
+
+
+async def start_id(redis, shop_id: uuid.UUID, last_event_id: str | None) -> tuple[str, bool]:
+    """С какого id читать поток и потеряна ли часть истории после last_event_id.
+
+    Без last_event_id — с последней записи (только новые события).
+    """
+    key = stream_key(shop_id)
+    if last_event_id is None:
+        last = await redis.xrevrange(key, count=1)
+        return (last[0][0] if last else "0-0"), False
+    first = await redis.xrange(key, count=1)
+    # Записи после last_event_id уже вытеснены MAXLEN — клиенту нужна ресинхронизация
+    lost = bool(first) and _stream_id(first[0][0]) > _stream_id(last_event_id) and last_event_id != "0-0"
+    return last_event_id, lost
+
+
+# ── Сбор событий из сессии ────────────────────────────────────────────────────
+
+def _event_payload(order_id, group_id, event_type, description, location, created_at) -> dict:
+    return {
+        "order_id": order_id,
+        "shipment_group_id": None if order_id else group_id,
+        "event_type": event_type,
+        "description": description,
+        "location": location,
+        "created_at": (created_at or datetime.now(timezone.utc)).isoformat(),
+    }
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_added(session, flush_context):
+    if not settings.TRACKING_STREAM_ENABLED:
+        return
+    events = [
+        _event_payload(obj.order_id, obj.shipment_group_id, obj.event_type, obj.description, obj.location, obj.created_at)
+        for obj in session.new
+        if isinstance(obj, TrackingEvent) and (obj.order_id or obj.shipment_group_id)
+    ]
+    if events:
+        session.info.setdefault(_PENDING, []).extend(events)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_insert(orm_execute_state):
+    if not settings.TRACKING_STREAM_ENABLED or not orm_execute_state.is_insert:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not TrackingEvent:
+        return
+    params = orm_execute_state.parameters
+    rows = params if isinstance(params, list) else [params or {}]
+    events = [
+        _event_payload(
+            row.get("order_id"), row.get("shipment_group_id"),
+            row.get("event_type"), row.get("description"), row.get("location"), row.get("created_at"),
+        )
+        for row in rows
+        if row.get("order_id") or row.get("shipment_group_id")
+    ]
+    if events:
+        orm_execute_state.session.info.setdefault(_PENDING, []).extend(events)
+
+
+@event.listens_for(Session, "before_commit")
+def _resolve_orders(session):
+    if not settings.TRACKING_STREAM_ENABLED:
+        return
+    # События, добавленные после последнего flush, попадут в after_flush
+    session.flush()
+    events = session.info.get(_PENDING)
+    if not events:
+        return
+    columns = (Order.id, Order.shop_id, Order.external_order_id, Order.internal_track_number, Order.status)
+    order_ids = list({payload["order_id"] for payload in events if payload["order_id"]})
+    group_ids = list({payload["shipment_group_id"] for payload in events if payload["shipment_group_id"]})
+    orders = {}
+    by_group: dict = {}
+    for i in range(0, len(order_ids), _RESOLVE_CHUNK):
+        result = session.execute(select(*columns).where(Order.id.in_(order_ids[i:i + _RESOLVE_CHUNK])))
+        orders.update({row.id: row for row in result})
+    if group_ids:
+        result = session.execute(
+            select(*columns, Order.shipment_group_id).where(Order.shipment_group_id.in_(group_ids))
+        )
+        for row in result:
+            by_group.setdefault(row.shipment_group_id, []).append(row)
+
+    resolved = []
+    for payload in events:
+        if payload["order_id"]:
+            targets = [orders[payload["order_id"]]] if payload["order_id"] in orders else []
+        else:
+            targets = by_group.get(payload["shipment_group_id"], [])
+        for order in targets:
+            resolved.append({
+                **payload,
+                "order_id": str(order.id),
+                "shipment_group_id": str(payload["shipment_group_id"]) if payload["shipment_group_id"] else None,
+                "shop_id": order.shop_id,
+                "external_order_id": order.external_order_id,
+                "internal_track_number": order.internal_track_number,
+                "status": order.status,
+            })
+    session.info[_PENDING] = resolved
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session):
+    events = session.info.pop(_PENDING, None)
+    if not events:
+        return
+    try:
+        await_only(publish(events))
+    except Exception:
+        logger.warning("Tracking stream: publish skipped (no async context)", exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,281 @@
+"""Transactional outbox вебхуков магазинам (таблица webhook_outbox).
+
+Смена статуса заказа пишет вебхук строкой outbox в той же транзакции
+(add_webhooks) — после commit он не потеряется, даже если процесс упадёт
+до постановки задачи в Celery. После commit вызывающий дёргает relay
+(kick_relay, одна задача на транзакцию); Celery Beat раз в
+WEBHOOK_RELAY_INTERVAL_SECONDS подбирает всё, что осталось.
+
+Relay забирает пачку SELECT ... FOR UPDATE SKIP LOCKED (параллельные relay
+берут разные строки), сдвигает им next_attempt_at на WEBHOOK_RELAY_LEASE_SECONDS
+и коммитит — блокировки не держатся во время HTTP-запросов, а строки relay,
+упавшего посреди пачки, после аренды заберёт следующий. Доставка at-least-once.
+
+Отправка асинхронная: один httpx.AsyncClient с keep-alive пулом на хост,
+не больше WEBHOOK_MAX_CONNECTIONS запросов всего и WEBHOOK_SHOP_CONCURRENCY
+на магазин. Порядок вебхуков одного магазина не гарантируется — у каждого
+есть timestamp. После WEBHOOK_SHOP_FAILURE_LIMIT ошибок подряд остаток
+пачки магазина не отправляется, а откладывается как неудачная попытка:
+лежащий магазин не держит relay на таймаутах.
+
+Магазины с webhook_batching получают JSON-массив событий с одной подписью
+на запрос. Строки таких магазинов становятся готовыми через
+WEBHOOK_BATCH_WINDOW_SECONDS (окно набора пачки) или сразу, если транзакция
+записала магазину не меньше WEBHOOK_BATCH_MAX_SIZE вебхуков.
+
+Доставленные и отвергнутые с 4xx строки удаляются; остальные повторяются
+с задержкой 60·2^n секунд, после WEBHOOK_MAX_ATTEMPTS — status='failed'
+(dead letter: список и повторная отправка — dead_letters, replay_dead_letters).
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import Counter
+from collections.abc import Iterable
+from datetime import datetime, timedelta, timezone
+
+import httpx
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.security import compute_webhook_signature
+from app.models.shop import Shop
+from app.models.webhook_outbox import WebhookOutbox
+
+logger = logging.getLogger(__name__)
+
+
+async def add_webhooks(db: AsyncSession, webhooks: list[tuple[uuid.UUID, dict]]) -> list[int]:
+    """Записать вебхуки [(shop_id, payload), ...] в outbox текущей транзакции (без commit).
+
+    Магазины без webhook_url пропускаются. Возвращает задержки (секунды), через
+    которые записанные строки станут готовыми, — для kick_relay после commit.
+    """
+    if not webhooks:
+        return []
+    shop_ids = {shop_id for shop_id, _payload in webhooks}
+    result = await db.execute(
+        select(Shop.id, Shop.webhook_batching).where(Shop.id.in_(shop_ids), Shop.webhook_url.is_not(None))
+    )
+    batching = dict(result.all())
+    per_shop = Counter(shop_id for shop_id, _payload in webhooks if shop_id in batching)
+
+    now = datetime.now(timezone.utc)
+    delays = {}
+    for shop_id, count in per_shop.items():
+        wait = batching[shop_id] and count < settings.WEBHOOK_BATCH_MAX_SIZE
+        delays[shop_id] = settings.WEBHOOK_BATCH_WINDOW_SECONDS if wait else 0
+
+    rows = [
+        {
+            "shop_id": shop_id,
+            "order_id": uuid.UUID(payload["order_id"]) if payload.get("order_id") else None,
+            "event": payload["event"],
+            "payload": payload,
+            "next_attempt_at": now + timedelta(seconds=delays[shop_id]),
+        }
+        for shop_id, payload in webhooks
+        if shop_id in batching
+    ]
+    if rows:
+        await db.execute(insert(WebhookOutbox), rows)
+    return sorted(set(delays.values()))
+
+
+# Одна быстрая повторная попытка: kick_relay вызывается в запросе API, а строки,
+# которые не удалось поставить, всё равно подберёт Beat
+_KICK_RETRY_POLICY = {"max_retries": 1, "interval_start": 0, "interval_step": 0.2, "interval_max": 0.2}
+
+
+def kick_relay(countdowns: Iterable[int] = (0,)) -> None:
+    """Запустить relay после commit, не дожидаясь Beat (по задаче на каждую задержку)."""
+    try:
+        from app.workers.tasks_webhook import relay_webhook_outbox
+
+        for countdown in countdowns:
+            relay_webhook_outbox.apply_async(countdown=countdown, retry=True, retry_policy=_KICK_RETRY_POLICY)
+    except Exception:
+        # Строки уже в outbox — их подберёт Beat
+        logger.exception("Failed to enqueue webhook relay")
+
+
+async def dead_letters(db: AsyncSession, shop_id: uuid.UUID, limit: int = 100) -> list[WebhookOutbox]:
+    """Недоставленные вебхуки магазина, новые первыми."""
+    result = await db.execute(
+        select(WebhookOutbox)
+        .where(WebhookOutbox.shop_id == shop_id, WebhookOutbox.status == "failed")
+        .order_by(WebhookOutbox.created_at.desc())
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def replay_dead_letters(db: AsyncSession, shop_id: uuid.UUID, ids: list[uuid.UUID] | None = None) -> int:
+    """Вернуть недоставленные вебхуки магазина в очередь с обнулёнными попытками (без commit)."""
+    query = (
+        update(WebhookOutbox)
+        .where(WebhookOutbox.shop_id == shop_id, WebhookOutbox.status == "failed")
+        .values(status="pending", attempts=0, next_attempt_at=datetime.now(timezone.utc), last_error=None)
+    )
+    if ids is not None:
+        query = query.where(WebhookOutbox.id.in_(ids))
+    result = await db.execute(query)
+    return result.rowcount
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=60 * (2 ** (attempts - 1)))  # 60s, 120s, 240s, 480s, 960s
+
+
+async def _claim_batch(db: AsyncSession, batch_size: int) -> list:
+    """Забрать пачку готовых к отправке строк и закрепить их за собой на время аренды."""
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        select(
+            WebhookOutbox.id,
+            WebhookOutbox.shop_id,
+            WebhookOutbox.payload,
+            WebhookOutbox.attempts,
+            Shop.webhook_url,
+            Shop.webhook_batching,
+            Shop.api_key,
+        )
+        .join(Shop, Shop.id == WebhookOutbox.shop_id)
+        .where(WebhookOutbox.status == "pending", WebhookOutbox.next_attempt_at <= now)
+        .order_by(WebhookOutbox.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True, of=WebhookOutbox)
+    )
+    rows = result.all()
+    if rows:
+        await db.execute(
+            update(WebhookOutbox)
+            .where(WebhookOutbox.id.in_([row.id for row in rows]))
+            .values(next_attempt_at=now + timedelta(seconds=settings.WEBHOOK_RELAY_LEASE_SECONDS))
+        )
+    await db.commit()
+    return rows
+
+
+async def _post(client: httpx.AsyncClient, url: str, api_key: str, payload) -> str | None:
+    """POST одного вебхука или пачки. None — доставлен или повторять бесполезно, иначе текст ошибки."""
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "X-Ostrov-Signature": compute_webhook_signature(body, api_key),
+    }
+    try:
+        resp = await client.post(url, content=body, headers=headers)
+    except Exception as exc:
+        return f"{type(exc).__name__}: {exc}"
+    if 400 <= resp.status_code < 500:
+        # 4xx — ошибка клиента, ретрай бесполезен
+        logger.warning("Webhook %s returned %s, not retrying", url, resp.status_code)
+        return None
+    if not resp.is_success:
+        return f"HTTP {resp.status_code}"
+    return None
+
+
+async def _dispatch_shop(client: httpx.AsyncClient, rows: list, limit: asyncio.Semaphore) -> list[tuple[list, str | None]]:
+    """Отправить строки одного магазина. Возвращает [(строки запроса, ошибка или None), ...]."""
+    first = rows[0]
+    if not first.webhook_url:
+        # Магазин убрал webhook_url после записи в outbox
+        return [(rows, None)]
+    if first.webhook_batching:
+        size = settings.WEBHOOK_BATCH_MAX_SIZE
+        chunks = [rows[i:i + size] for i in range(0, len(rows), size)]
+    else:
+        chunks = [[row] for row in rows]
+
+    shop_limit = asyncio.Semaphore(settings.WEBHOOK_SHOP_CONCURRENCY)
+    failures = 0
+
+    async def send(chunk: list) -> tuple[list, str | None]:
+        nonlocal failures
+        async with shop_limit, limit:
+            if failures >= settings.WEBHOOK_SHOP_FAILURE_LIMIT:
+                return chunk, "Skipped: shop endpoint is failing"
+            payload = [row.payload for row in chunk] if first.webhook_batching else chunk[0].payload
+            error = await _post(client, first.webhook_url, first.api_key, payload)
+        failures = failures + 1 if error else 0
+        return chunk, error
+
+    return await asyncio.gather(*(send(chunk) for chunk in chunks))
+
+
+def new_client() -> httpx.AsyncClient:
+    """HTTP-клиент relay: keep-alive пул на хост, общий лимит соединений."""
+    return httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+        ),
+    )
+
+
+async def relay(session_factory, client: httpx.AsyncClient | None = None, *, time_budget: float = 240.0) -> dict:
+    """Отправить вебхуки из outbox пачками по WEBHOOK_RELAY_BATCH_SIZE.
+
+    Работает, пока очередь не опустеет или не выйдет time_budget секунд.
+    Возвращает счётчики строк {"sent", "retried", "failed"}.
+    """
+    stats = {"sent": 0, "retried": 0, "failed": 0}
+    own_client = client is None
+    if own_client:
+        client = new_client()
+    limit = asyncio.Semaphore(settings.WEBHOOK_MAX_CONNECTIONS)
+    deadline = time.monotonic() + time_budget
+    try:
+        while time.monotonic() < deadline:
+            async with session_factory() as db:
+                rows = await _claim_batch(db, settings.WEBHOOK_RELAY_BATCH_SIZE)
+            if not rows:
+                break
+
+            by_shop: dict[uuid.UUID, list] = {}
+            for row in rows:
+                by_shop.setdefault(row.shop_id, []).append(row)
+            results = await asyncio.gather(*(_dispatch_shop(client, shop_rows, limit) for shop_rows in by_shop.values()))
+
+            done = []
+            retries = []
+            now = datetime.now(timezone.utc)
+            for shop_results in results:
+                for chunk, error in shop_results:
+                    if error is None:
+                        done.extend(row.id for row in chunk)
+                        continue
+                    logger.warning("Webhook %s failed (%s), %d events", chunk[0].webhook_url, error, len(chunk))
+                    for row in chunk:
+                        attempts = row.attempts + 1
+                        failed = attempts >= settings.WEBHOOK_MAX_ATTEMPTS
+                        retries.append({
+                            "id": row.id,
+                            "attempts": attempts,
+                            "status": "failed" if failed else "pending",
+                            "next_attempt_at": now + _backoff(attempts),
+                            "last_error": error[:1000],
+                        })
+                        stats["failed" if failed else "retried"] += 1
+
+            async with session_factory() as db:
+                if done:
+                    await db.execute(delete(WebhookOutbox).where(WebhookOutbox.id.in_(done)))
+                if retries:
+                    # ORM bulk UPDATE по первичному ключу — один executemany
+                    await db.execute(update(WebhookOutbox), retries)
+                await db.commit()
+            stats["sent"] += len(done)
+
+            if len(rows) < settings.WEBHOOK_RELAY_BATCH_SIZE:
+                break
+    finally:
+        if own_client:
+            await client.aclose()
+    return stats
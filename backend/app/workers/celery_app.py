@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.schedules import crontab
 
 from app.core.config import settings
 
@@ -9,6 +10,7 @@ celery_app = Celery(
     include=[
         "app.workers.tasks_webhook",
         "app.workers.tasks_grouping",
+        "app.workers.tasks_tariff_matrix",
     ],
 )
 
@@ -23,8 +25,17 @@ celery_app.conf.update(
 )
 
 celery_app.conf.beat_schedule = {
-    "run-grouping-optimizer": {
-        "task": "tasks_grouping.run_grouping_optimizer",
-        "schedule": 30 * 60,  # каждые 30 минут; переопределяется через GroupingSettings
+    "schedule-grouping-optimizer": {
+        "task": "tasks_grouping.schedule_grouping_optimizer",
+        # Лёгкий тик: прогон по GroupingSettings.worker_interval_minutes и проверки к дедлайнам
+        "schedule": settings.GROUPING_SCHEDULER_TICK_SECONDS,
+    },
+    "relay-webhook-outbox": {
+        "task": "tasks_webhook.relay_webhook_outbox",
+        "schedule": settings.WEBHOOK_RELAY_INTERVAL_SECONDS,  # страховка: основной запуск — после commit
+    },
+    "build-tariff-matrix": {
+        "task": "tasks_tariff_matrix.build_tariff_matrix",
+        "schedule": crontab(hour=0, minute=30),  # 03:30 МСК, ночью нагрузка на API Почты минимальна
     },
 }
@@ -1,46 +1,83 @@
 import asyncio
 import logging
 
+from app.core.config import settings
 from app.workers.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
 
 
-@celery_app.task(name="tasks_grouping.run_grouping_optimizer")
-def run_grouping_optimizer():
+@celery_app.task(name="tasks_grouping.run_grouping_optimizer", time_limit=settings.GROUPING_LOCK_SECONDS)
+def run_grouping_optimizer(hubs: list[str] | None = None):
     """
-    Celery task: запускает оптимизатор группировки.
-    Вызывается по расписанию через Celery Beat.
+    Celery task: запускает оптимизатор группировки по хабам hubs (None — по всем).
+    Ставит services/grouping_scheduler.py: по интервалу, к дедлайну и при росте пула хаба.
     """
-    asyncio.run(_run_async())
+    asyncio.run(_run_async(hubs))
 
 
-async def _run_async():
+@celery_app.task(name="tasks_grouping.schedule_grouping_optimizer", time_limit=60)
+def schedule_grouping_optimizer():
+    """
+    Celery task: тик планировщика оптимизатора, вызывается Celery Beat.
+    Сам оптимизатор не запускает — ставит run_grouping_optimizer по нужным хабам.
+    """
+    asyncio.run(_schedule_async())
+
+
+async def _schedule_async():
     from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
     from sqlalchemy.orm import sessionmaker
 
-    from app.core.config import settings
-    from app.services.grouping_optimizer import GroupingOptimizer
-    from app.services.pochta import PochtaClient
+    from app.services import grouping_scheduler
 
     engine = create_async_engine(settings.DATABASE_URL, echo=False)
     async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-    pochta = PochtaClient(settings)
-    await pochta.start()
-
     try:
         async with async_session() as session:
-            optimizer = GroupingOptimizer(session, pochta)
-            decisions = await optimizer.run(sender_postal_code=settings.SENDER_POSTAL_CODE)
-
-            for decision in decisions:
-                group = await optimizer.apply_decision(decision)
-                logger.info(
-                    "Сформирована группа %s: %d заказов, хаб=%s, экономия=%d коп. (причина: %s)",
-                    group.number, group.orders_count, group.hub,
-                    group.savings_kopecks, decision.reason,
-                )
+            scheduled = await grouping_scheduler.tick(session)
+        if any(scheduled.values()):
+            logger.info("Grouping scheduler: %s", scheduled)
     finally:
-        await pochta.close()
         await engine.dispose()
+
+
+async def _run_async(hubs: list[str] | None = None):
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from sqlalchemy.orm import sessionmaker
+
+    from app.services import grouping_scheduler
+    from app.services.grouping_optimizer import GroupingOptimizer
+    from app.services.hub_router import HUB_REGISTRY
+    from app.services.pochta import PochtaClient
+
+    requested = sorted(hubs) if hubs is not None else sorted(HUB_REGISTRY)
+    async with grouping_scheduler.lock_hubs(requested) as locked:
+        busy = [hub for hub in requested if hub not in locked]
+        if busy and hubs is not None:
+            # Хаб проверяет другой прогон — новые заказы посмотрим в следующем окне
+            await grouping_scheduler.request_evaluation(busy)
+        if not locked:
+            return
+
+        engine = create_async_engine(settings.DATABASE_URL, echo=False)
+        async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        pochta = PochtaClient(settings)
+        await pochta.start()
+
+        try:
+            async with async_session() as session:
+                optimizer = GroupingOptimizer(session, pochta)
+                decisions = await optimizer.run(sender_postal_code=settings.SENDER_POSTAL_CODE, hubs=locked)
+
+                for decision in decisions:
+                    group = await optimizer.apply_decision(decision)
+                    logger.info(
+                        "Сформирована группа %s: %d заказов, хаб=%s, экономия=%d коп. (причина: %s)",
+                        group.number, group.orders_count, group.hub,
+                        group.savings_kopecks, decision.reason,
+                    )
+        finally:
+            await pochta.close()
+            await engine.dispose()
@@ -0,0 +1,47 @@
+import asyncio
+import logging
+
+from app.workers.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+
+@celery_app.task(name="tasks_tariff_matrix.build_tariff_matrix", time_limit=3600, soft_time_limit=3300)
+def build_tariff_matrix():
+    """
+    Celery task: пересчитывает матрицу тарифов SENDER_POSTAL_CODE → регионы.
+    Вызывается ночью по расписанию Celery Beat.
+    """
+    asyncio.run(_run_async())
+
+
+async def _run_async():
+    from app.core.config import settings
+    from app.services.pochta import PochtaClient
+    from app.services.tariff_matrix import MIN_COVERAGE, build_tariff_matrix as build, tariff_matrix_store
+
+    pochta = PochtaClient(settings)
+    await pochta.start()
+
+    try:
+        matrix = await build(
+            pochta,
+            sender_postal_code=settings.SENDER_POSTAL_CODE,
+            object_code=settings.POCHTA_OBJECT_CODE,
+            max_weight_grams=settings.MAX_PACKAGE_WEIGHT_GRAMS,
+            concurrency=settings.TARIFF_MATRIX_CONCURRENCY,
+        )
+        if matrix.coverage() < MIN_COVERAGE:
+            logger.error(
+                "Матрица тарифов не сохранена: заполнено %.0f%% ячеек, оставляем предыдущую",
+                matrix.coverage() * 100,
+            )
+            return
+        await tariff_matrix_store.save(matrix)
+        logger.info(
+            "Матрица тарифов пересчитана: %d регионов × %d ступеней веса, заполнено %.0f%%",
+            len(matrix.prefixes), len(matrix.weights), matrix.coverage() * 100,
+        )
+    finally:
+        await pochta.close()
+        await tariff_matrix_store.close()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import logging
 
@@ -9,7 +10,12 @@ from app.workers.celery_app import celery_app
 logger = logging.getLogger(__name__)
 
 
+# send_webhook больше никто не ставит: новые вебхуки отправляет relay_webhook_outbox
+# (services/webhook_outbox.py). Задача оставлена, чтобы дослать сообщения, поставленные
+# до outbox; name= — прежнее автоматическое имя (по пути модуля), под ним они лежат
+# в очереди. Удалить в следующем релизе: ретраи (до 960 с) к тому времени закончатся.
 @celery_app.task(
+    name="app.workers.tasks_webhook.send_webhook",
     bind=True,
     max_retries=5,
     time_limit=30,
@@ -42,3 +48,30 @@ def send_webhook(self, webhook_url: str, payload: dict, api_key: str):
     except Exception as exc:
         backoff = 60 * (2 ** self.request.retries)
         raise self.retry(exc=exc, countdown=backoff)
+
+
+# ignore_result: результат никто не читает, а подписка на него в result backend
+# при лежащем Redis держит apply_async ~20 с (kick_relay зовут из запроса API)
+@celery_app.task(
+    name="tasks_webhook.relay_webhook_outbox", time_limit=300, soft_time_limit=280, ignore_result=True,
+)
+def relay_webhook_outbox():
+    """Отправить вебхуки из outbox. Вызывается после commit смены статуса и по расписанию Beat."""
+    asyncio.run(_relay_async())
+
+
+async def _relay_async():
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.core.config import settings
+    from app.services.webhook_outbox import relay
+
+    engine = create_async_engine(settings.DATABASE_URL, echo=False)
+    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        stats = await relay(async_session)
+        if any(stats.values()):
+            logger.info("Webhook relay: %s", stats)
+    finally:
+        await engine.dispose()
@@ -1,7 +1,7 @@
 """Initialize SQLite database and create admin user for local testing."""
 import asyncio
 
-from sqlalchemy import text
+from sqlalchemy import inspect, text
 from sqlalchemy.ext.asyncio import create_async_engine
 
 from app.core.config import settings
@@ -9,6 +9,9 @@ from app.core.database import async_session
 from app.core.security import hash_password
 from app.models import Base
 from app.models.operator import Operator
+from app.models.order import order_search_ddl
+from app.services import hub_pool
+from app.services.order_items import backfill_order_items
 
 
 # Новые колонки, которые нужно добавить в существующие таблицы.
@@ -24,9 +27,31 @@ ALTER_STATEMENTS = [
     ("customs_declarations", "total_value_eur_cents", "ALTER TABLE customs_declarations ADD COLUMN total_value_eur_cents INTEGER NOT NULL DEFAULT 0"),
     # customs_declarations: связь с партией
     ("customs_declarations", "batch_id", "ALTER TABLE customs_declarations ADD COLUMN batch_id UUID REFERENCES batches(id)"),
+    # shops: вебхуки пачками (opt-in)
+    ("shops", "webhook_batching", "ALTER TABLE shops ADD COLUMN webhook_batching BOOLEAN NOT NULL DEFAULT false"),
+    # orders: индекс для keyset-пагинации (created_at, id)
+    ("orders", "ix_orders_created_at_id", "CREATE INDEX IF NOT EXISTS ix_orders_created_at_id ON orders (created_at, id)"),
+    # orders: индекс для POST /track/batch (shop_id, track_number)
+    ("orders", "ix_orders_shop_id_track_number", "CREATE INDEX IF NOT EXISTS ix_orders_shop_id_track_number ON orders (shop_id, track_number)"),
+    # orders: индекс ленты изменений GET /orders/changes (shop_id, updated_at, id)
+    ("orders", "ix_orders_shop_id_updated_at_id", "CREATE INDEX IF NOT EXISTS ix_orders_shop_id_updated_at_id ON orders (shop_id, updated_at, id)"),
+    # orders: хаб заказа и индекс пула оптимизатора группировки (агрегаты hub_pools)
+    ("orders", "hub", "ALTER TABLE orders ADD COLUMN hub VARCHAR(50)"),
+    ("orders", "ix_orders_pool_hub_created_at", "CREATE INDEX IF NOT EXISTS ix_orders_pool_hub_created_at ON orders (hub, created_at) WHERE status = 'customs_cleared' AND shipment_group_id IS NULL"),
 ]
 
 
+def _existing_columns_and_indexes(sync_conn) -> dict[str, set[str]]:
+    """Имена колонок и индексов таблиц из ALTER_STATEMENTS."""
+    inspector = inspect(sync_conn)
+    existing = {}
+    for table in {table for table, _, _ in ALTER_STATEMENTS}:
+        names = {col["name"] for col in inspector.get_columns(table)}
+        names |= {index["name"] for index in inspector.get_indexes(table)}
+        existing[table] = names
+    return existing
+
+
 async def main():
     engine = create_async_engine(settings.DATABASE_URL, echo=True)
 
@@ -35,14 +60,41 @@ async def main():
 
     print("Tables created.")
 
-    # Добавить новые колонки в существующие таблицы (безопасно — игнорируем ошибку если уже есть)
-    async with engine.begin() as conn:
-        for table, column, stmt in ALTER_STATEMENTS:
-            try:
+    # Добавить новые колонки в существующие таблицы (безопасно — существующие пропускаем).
+    # Транзакция на каждую: в PostgreSQL ошибка одного ALTER прерывает транзакцию целиком,
+    # и все следующие ALTER тоже не выполнились бы
+    async with engine.connect() as conn:
+        existing = await conn.run_sync(_existing_columns_and_indexes)
+    for table, column, stmt in ALTER_STATEMENTS:
+        if column in existing.get(table, set()):
+            print(f"  ~ {table}.{column} already exists")
+            continue
+        try:
+            async with engine.begin() as conn:
                 await conn.execute(text(stmt))
-                print(f"  + {table}.{column} added")
-            except Exception:
-                print(f"  ~ {table}.{column} already exists")
+            print(f"  + {table}.{column} added")
+        except Exception as e:
+            # Не «уже есть»: без колонки модель не совпадает со схемой — видно в выводе
+            print(f"  ! {table}.{column} FAILED ({e})")
+
+    # Поисковый индекс заказов для баз, созданных до его появления (create_all его не добавит)
+    for stmt in order_search_ddl(engine.dialect.name):
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(stmt))
+            print(f"  + search: {stmt.split('(')[0]}")
+        except Exception as e:
+            print(f"  ~ search: {stmt.split('(')[0]} skipped ({e})")
+
+    # Позиции заказов, созданных до таблицы order_items (create_all её создал пустой)
+    async with async_session() as db:
+        backfilled = await backfill_order_items(db)
+    print(f"  + order_items: backfilled {backfilled} orders")
+
+    # Хаб заказов, созданных до колонки orders.hub, и агрегаты пула группировки с нуля
+    async with async_session() as db:
+        pools = await hub_pool.rebuild(db)
+    print(f"  + hub_pools: {sum(pool.orders_count for pool in pools)} orders in {len(pools)} hubs")
 
     async with async_session() as db:
         admin = Operator(
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Свернуть старые события групп: по строке на каждый заказ → одна строка на группу.
+
+Раньше переходы группы (group_formed, group_dispatched, group_at_hub, cancelled)
+записывали TrackingEvent на каждый заказ группы. Теперь событие группы хранится
+один раз (order_id IS NULL, shipment_group_id) и подмешивается в таймлайн заказа
+при чтении. Скрипт переносит историю в новый вид; повторный запуск ничего не меняет.
+
+    python scripts/collapse_group_events.py --dry-run   # только посчитать
+    python scripts/collapse_group_events.py
+
+Одна транзакция на группу: таймлайн заказов не теряет и не дублирует события
+ни в какой момент.
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# Чтобы импортировать app.*, добавляем backend/ в PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.models.base import generate_uuid
+from app.models.tracking_event import TrackingEvent
+
+PER_ORDER_GROUP_EVENT = (TrackingEvent.order_id.is_not(None), TrackingEvent.shipment_group_id.is_not(None))
+EVENT_KEY = (TrackingEvent.event_type, TrackingEvent.description, TrackingEvent.location)
+
+
+async def collapse_group(db, group_id) -> tuple[int, int]:
+    """Свернуть события одной группы. Возвращает (создано, удалено)."""
+    result = await db.execute(
+        select(*EVENT_KEY, func.min(TrackingEvent.details), func.min(TrackingEvent.created_at))
+        .where(*PER_ORDER_GROUP_EVENT, TrackingEvent.shipment_group_id == group_id)
+        .group_by(*EVENT_KEY)
+    )
+    created = deleted = 0
+    for event_type, description, location, details, created_at in result.all():
+        # Через таблицу, не ORM: слушатели сессии не должны заново публиковать историю (SSE)
+        await db.execute(insert(TrackingEvent.__table__).values(
+            id=generate_uuid(),
+            shipment_group_id=group_id,
+            event_type=event_type,
+            description=description,
+            location=location,
+            details=details,
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+        removed = await db.execute(
+            delete(TrackingEvent).where(
+                *PER_ORDER_GROUP_EVENT,
+                TrackingEvent.shipment_group_id == group_id,
+                TrackingEvent.event_type == event_type,
+                TrackingEvent.description == description,
+                TrackingEvent.location.is_(None) if location is None else TrackingEvent.location == location,
+            )
+        )
+        created += 1
+        deleted += removed.rowcount
+    return created, deleted
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    engine = create_async_engine(settings.DATABASE_URL)
+    session = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        async with session() as db:
+            result = await db.execute(
+                select(TrackingEvent.shipment_group_id, func.count())
+                .where(*PER_ORDER_GROUP_EVENT)
+                .group_by(TrackingEvent.shipment_group_id)
+            )
+            groups = result.all()
+        print(f"Групп со старыми событиями: {len(groups)}, строк: {sum(count for _, count in groups)}")
+        if args.dry_run or not groups:
+            return
+
+        total_created = total_deleted = 0
+        for group_id, _ in groups:
+            async with session() as db:
+                created, deleted = await collapse_group(db, group_id)
+                await db.commit()
+            total_created += created
+            total_deleted += deleted
+        print(f"Создано событий групп: {total_created}, удалено строк: {total_deleted}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
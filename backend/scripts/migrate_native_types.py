@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Онлайн-миграция PostgreSQL: ключи String(36) → uuid, orders.items text → jsonb.
+
+Колонки берутся из моделей (UUIDType, JSONType); уже нативные пропускаются.
+Переписывать таблицы через ALTER COLUMN TYPE нельзя — это ACCESS EXCLUSIVE на всё
+время перезаписи. Поэтому в два шага:
+
+    # 1. Без блокировок, можно повторять: теневые колонки <col>__native, триггер
+    #    синхронизации, backfill порциями, NOT NULL через CHECK NOT VALID + VALIDATE,
+    #    индексы на теневых колонках — CREATE INDEX CONCURRENTLY
+    python scripts/migrate_native_types.py prepare
+
+    # 2. Одна короткая транзакция (lock_timeout): снять FK, удалить старые колонки,
+    #    переименовать теневые, PK/UNIQUE — USING INDEX, FK — NOT VALID.
+    #    После commit — VALIDATE CONSTRAINT без блокировки записи
+    python scripts/migrate_native_types.py cutover
+
+    python scripts/migrate_native_types.py status
+
+Порядок выката: приложение работает с DB_NATIVE_TYPES=false (старые типы), prepare,
+cutover, сразу перезапуск API и воркеров с DB_NATIVE_TYPES=true. Между cutover и
+перезапуском запросы старого процесса к uuid-колонкам падают — окно в секунды.
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+
+# Чтобы импортировать app.*, добавляем backend/ в PYTHONPATH
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.models import Base
+from app.models.base import UUIDType
+from app.models.order import JSONType
+
+SUFFIX = "__native"
+BATCH_SIZE = 5000
+
+
+def model_columns() -> dict[str, dict[str, str]]:
+    """Таблица → {колонка: целевой тип} по моделям."""
+    targets: dict[str, dict[str, str]] = {}
+    for table in Base.metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, UUIDType):
+                targets.setdefault(table.name, {})[column.name] = "uuid"
+            elif isinstance(column.type, JSONType):
+                targets.setdefault(table.name, {})[column.name] = "jsonb"
+    return targets
+
+
+async def pending_columns(conn) -> dict[str, dict[str, tuple[str, bool]]]:
+    """Таблица → {колонка: (целевой тип, NOT NULL)} для ещё не переведённых колонок."""
+    rows = (await conn.execute(text(
+        "SELECT table_name, column_name, udt_name, is_nullable FROM information_schema.columns "
+        "WHERE table_schema = current_schema()"
+    ))).all()
+    current = {(t, c): (udt, nullable == "NO") for t, c, udt, nullable in rows}
+
+    pending: dict[str, dict[str, tuple[str, bool]]] = {}
+    for table, columns in model_columns().items():
+        for column, target in columns.items():
+            udt, not_null = current.get((table, column), (None, False))
+            if udt is not None and udt != target:
+                pending.setdefault(table, {})[column] = (target, not_null)
+    return pending
+
+
+def _trigger_name(table: str) -> str:
+    return f"{table}{SUFFIX}_sync"
+
+
+def _check_name(table: str, column: str) -> str:
+    return f"{table}_{column}{SUFFIX}_nn"[:63]
+
+
+async def _indexes(conn, table: str, columns: set[str]) -> list[tuple[str, str]]:
+    """(имя, определение) индексов таблицы по переводимым колонкам."""
+    rows = (await conn.execute(text(
+        "SELECT i.relname, pg_get_indexdef(x.indexrelid) FROM pg_index x "
+        "JOIN pg_class i ON i.oid = x.indexrelid JOIN pg_class t ON t.oid = x.indrelid "
+        "WHERE t.relname = :table AND t.relnamespace = current_schema()::regnamespace"
+    ), {"table": table})).all()
+    result = []
+    for name, definition in rows:
+        if name.endswith(SUFFIX):
+            continue
+        body = definition.split(" USING ", 1)[1]
+        if any(re.search(rf"\b{re.escape(column)}\b", body) for column in columns):
+            result.append((name, definition))
+    return result
+
+
+def _shadow_index(name: str, definition: str, columns: set[str]) -> str:
+    """CREATE INDEX CONCURRENTLY того же индекса по теневым колонкам."""
+    head, body = definition.split(" USING ", 1)
+    for column in columns:
+        body = re.sub(rf"\b{re.escape(column)}\b", f"{column}{SUFFIX}", body)
+    head = head.replace(" INDEX ", " INDEX CONCURRENTLY IF NOT EXISTS ", 1)
+    head = head.replace(f" {name} ON ", f" {name}{SUFFIX} ON ", 1)
+    return f"{head} USING {body}"
+
+
+async def prepare(engine, batch_size: int) -> None:
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        pending = await pending_columns(conn)
+        if not pending:
+            print("Все колонки уже нативные.")
+            return
+
+        for table, columns in pending.items():
+            names = set(columns)
+            print(f"{table}: {', '.join(f'{c} → {t}' for c, (t, _) in columns.items())}")
+
+            for column, (target, _) in columns.items():
+                await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column}{SUFFIX} {target}"))
+
+            # Записи приложения во время миграции сразу попадают в теневые колонки
+            assignments = " ".join(
+                f"NEW.{column}{SUFFIX} := NEW.{column}::{target};" for column, (target, _) in columns.items()
+            )
+            await conn.execute(text(
+                f"CREATE OR REPLACE FUNCTION {_trigger_name(table)}() RETURNS trigger AS $$ "
+                f"BEGIN {assignments} RETURN NEW; END $$ LANGUAGE plpgsql"
+            ))
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {_trigger_name(table)} ON {table}"))
+            await conn.execute(text(
+                f"CREATE TRIGGER {_trigger_name(table)} BEFORE INSERT OR UPDATE ON {table} "
+                f"FOR EACH ROW EXECUTE FUNCTION {_trigger_name(table)}()"
+            ))
+
+            # Backfill порциями: короткие транзакции, без долгих блокировок строк
+            unfilled = " OR ".join(f"({c}{SUFFIX} IS NULL AND {c} IS NOT NULL)" for c in columns)
+            sets = ", ".join(f"{c}{SUFFIX} = {c}::{t}" for c, (t, _) in columns.items())
+            total = 0
+            while True:
+                result = await conn.execute(text(
+                    f"UPDATE {table} SET {sets} WHERE ctid = ANY(ARRAY("
+                    f"SELECT ctid FROM {table} WHERE {unfilled} LIMIT :n))"
+                ), {"n": batch_size})
+                if not result.rowcount:
+                    break
+                total += result.rowcount
+                print(f"  backfill: {total}")
+
+            # NOT NULL без полного скана под блокировкой: проверенный CHECK позволяет
+            # SET NOT NULL на cutover не сканировать таблицу
+            for column, (_, not_null) in columns.items():
+                if not not_null:
+                    continue
+                check = _check_name(table, column)
+                exists = (await conn.execute(text(
+                    "SELECT 1 FROM pg_constraint WHERE conname = :name"
+                ), {"name": check})).first()
+                if not exists:
+                    await conn.execute(text(
+                        f"ALTER TABLE {table} ADD CONSTRAINT {check} CHECK ({column}{SUFFIX} IS NOT NULL) NOT VALID"
+                    ))
+                await conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}"))
+
+            for name, definition in await _indexes(conn, table, names):
+                # Недостроенный (INVALID) индекс от прерванного запуска — пересоздать
+                await conn.execute(text(
+                    "DO $$ BEGIN IF EXISTS (SELECT 1 FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+                    f"WHERE i.relname = '{name}{SUFFIX}' AND NOT x.indisvalid) THEN "
+                    f"EXECUTE 'DROP INDEX {name}{SUFFIX}'; END IF; END $$"
+                ))
+                await conn.execute(text(_shadow_index(name, definition, names)))
+                print(f"  index: {name}{SUFFIX}")
+
+        print("prepare завершён — можно запускать cutover.")
+
+
+async def cutover(engine) -> None:
+    async with engine.connect() as conn:
+        pending = await pending_columns(conn)
+        if not pending:
+            print("Все колонки уже нативные.")
+            return
+        targets = {(t, c) for t, columns in pending.items() for c in columns}
+
+        await conn.execute(text("SET LOCAL lock_timeout = '10s'"))
+
+        # FK, где участвует переводимая колонка (с любой стороны)
+        foreign_keys = []
+        rows = (await conn.execute(text(
+            "SELECT c.conname, t.relname, pg_get_constraintdef(c.oid), "
+            "ARRAY(SELECT attname FROM pg_attribute WHERE attrelid = c.conrelid AND attnum = ANY(c.conkey)), "
+            "r.relname, ARRAY(SELECT attname FROM pg_attribute WHERE attrelid = c.confrelid AND attnum = ANY(c.confkey)) "
+            "FROM pg_constraint c JOIN pg_class t ON t.oid = c.conrelid JOIN pg_class r ON r.oid = c.confrelid "
+            "WHERE c.contype = 'f' AND t.relnamespace = current_schema()::regnamespace"
+        ))).all()
+        for name, table, definition, columns, ref_table, ref_columns in rows:
+            if any((table, c) in targets for c in columns) or any((ref_table, c) in targets for c in ref_columns):
+                foreign_keys.append((name, table, definition))
+
+        # Теневые индексы и ограничения (PK/UNIQUE), которые они заменят
+        shadow_indexes = []
+        for table, columns in pending.items():
+            for name, _definition in await _indexes(conn, table, set(columns)):
+                constraint = (await conn.execute(text(
+                    "SELECT c.conname, c.contype FROM pg_constraint c JOIN pg_class i ON i.oid = c.conindid "
+                    "WHERE i.relname = :name AND c.contype IN ('p', 'u')"
+                ), {"name": name})).first()
+                shadow_indexes.append((table, name, constraint))
+                valid = (await conn.execute(text(
+                    "SELECT x.indisvalid FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid WHERE i.relname = :name"
+                ), {"name": f"{name}{SUFFIX}"})).scalar()
+                if not valid:
+                    raise SystemExit(f"Нет готового индекса {name}{SUFFIX} — сначала prepare")
+
+        for name, table, _definition in foreign_keys:
+            await conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {name}"))
+
+        for table, columns in pending.items():
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {_trigger_name(table)} ON {table}"))
+            await conn.execute(text(f"DROP FUNCTION IF EXISTS {_trigger_name(table)}()"))
+            for column, (_target, not_null) in columns.items():
+                await conn.execute(text(f"ALTER TABLE {table} DROP COLUMN {column}"))
+                await conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN {column}{SUFFIX} TO {column}"))
+                if not_null:
+                    await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+                    await conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {_check_name(table, column)}"))
+
+        for table, name, constraint in shadow_indexes:
+            if constraint:
+                conname, contype = constraint
+                kind = "PRIMARY KEY" if contype == "p" else "UNIQUE"
+                # USING INDEX переименует индекс в имя ограничения
+                await conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {conname} {kind} USING INDEX {name}{SUFFIX}"))
+            else:
+                await conn.execute(text(f"ALTER INDEX {name}{SUFFIX} RENAME TO {name}"))
+
+        for name, table, definition in foreign_keys:
+            await conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID"))
+
+        await conn.commit()
+        print("cutover завершён — перезапустите API и воркеры с DB_NATIVE_TYPES=true.")
+
+        # Проверка FK — SHARE UPDATE EXCLUSIVE, запись не блокирует
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        for name, table, _definition in foreign_keys:
+            await conn.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"))
+        print(f"FK проверены: {len(foreign_keys)}")
+
+
+async def status(engine) -> None:
+    async with engine.connect() as conn:
+        pending = await pending_columns(conn)
+    if not pending:
+        print("Все колонки нативные.")
+    for table, columns in pending.items():
+        print(f"{table}: {', '.join(f'{c} → {t}' for c, (t, _) in columns.items())}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["prepare", "cutover", "status"])
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if not settings.DATABASE_URL.startswith("postgresql"):
+        print("Миграция нужна только для PostgreSQL.")
+        return
+
+    engine = create_async_engine(settings.DATABASE_URL)
+    try:
+        if args.command == "prepare":
+            await prepare(engine, args.batch_size)
+        elif args.command == "cutover":
+            await cutover(engine)
+        else:
+            await status(engine)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""Общие фикстуры тестов: база SQLite во временном каталоге, без Redis и брокера Celery."""
+import os
+
+# До импорта app: настройки читаются при импорте app.core.config
+os.environ.setdefault("JWT_SECRET_KEY", "test-jwt-secret-key-0123456789abcdef")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///./test.db")
+# Закрытый порт: Redis недоступен, кеши и триггеры работают без него
+os.environ.setdefault("REDIS_URL", "redis://127.0.0.1:1/0")
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.models import Base
+from app.models.order import Order
+from app.models.shop import Shop
+from app.services import hub_pool, webhook_outbox
+# Слушатели сессии, как в API (services/order.py)
+from app.services import order  # noqa: F401
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+@pytest.fixture
+async def db(session_factory):
+    async with session_factory() as session:
+        yield session
+
+
+@pytest.fixture(autouse=True)
+def no_broker(monkeypatch):
+    """Задачи Celery не ставятся: relay и оптимизатор тесты вызывают сами."""
+    kicked = []
+    monkeypatch.setattr(webhook_outbox, "kick_relay", lambda countdowns=(0,): kicked.extend(countdowns))
+    monkeypatch.setattr(settings, "GROUPING_EVENT_TRIGGERS", False)
+    return kicked
+
+
+@pytest.fixture
+async def shop(db):
+    shop = Shop(name="Тестовый магазин", domain="shop.test", api_key=uuid.uuid4().hex * 2,
+                webhook_url="https://shop.test/webhook")
+    db.add(shop)
+    await db.commit()
+    return shop
+
+
+@pytest.fixture
+async def pools(db):
+    """Строки hub_pools всех хабов, как после init_db."""
+    await hub_pool.rebuild(db)
+
+
+def make_order(shop_id: uuid.UUID, **overrides) -> Order:
+    values = {
+        "shop_id": shop_id,
+        "external_order_id": uuid.uuid4().hex[:12],
+        "status": "customs_cleared",
+        "recipient_name": "Иванов Иван Иванович",
+        "recipient_phone": "+79261234567",
+        "recipient_address": "Москва, ул. Ленина, д. 1",
+        "recipient_postal_code": "101000",
+        "items": [{"name": "Стол", "quantity": 1, "price_kopecks": 100000, "weight_grams": 1000}],
+        "total_amount_kopecks": 100000,
+        "total_weight_grams": 1000,
+        "delivery_cost_kopecks": 30000,
+        "customs_fee_kopecks": 15000,
+    }
+    values.update(overrides)
+    return Order(**values)
+
+
+def hours_ago(hours: float) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(hours=hours)
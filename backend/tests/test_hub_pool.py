@@ -0,0 +1,171 @@
+"""Агрегаты пула по хабам (services/hub_pool.py): дельты транзакций совпадают с пересчётом rebuild()."""
+from sqlalchemy import delete, event, select, text
+
+from app.models.hub_pool import HubPool
+from app.models.order import Order
+from app.services import hub_pool
+from app.services.grouping_optimizer import GroupDecision, GroupingOptimizer
+from app.services.order import change_order_status, transition_orders
+from tests.conftest import hours_ago, make_order
+
+MSK, SPB = "101000", "190000"
+
+
+async def snapshot(session_factory) -> dict:
+    async with session_factory() as db:
+        return {
+            pool.hub: (
+                pool.orders_count, pool.total_weight_grams, pool.public_tariff_kopecks,
+                pool.priced_count, hub_pool._aware(pool.oldest_created_at),
+            )
+            for pool in await hub_pool.load(db)
+        }
+
+
+async def assert_matches_rebuild(session_factory) -> dict:
+    incremental = await snapshot(session_factory)
+    async with session_factory() as db:
+        await hub_pool.rebuild(db)
+    rebuilt = await snapshot(session_factory)
+    assert incremental == rebuilt
+    return rebuilt
+
+
+async def test_orm_changes(db, session_factory, shop, pools):
+    orders = [
+        make_order(shop.id, created_at=hours_ago(5), public_tariff_kopecks=30000),
+        make_order(shop.id, created_at=hours_ago(3)),
+        make_order(shop.id, recipient_postal_code=SPB, total_weight_grams=2500),
+        make_order(shop.id, status="customs_presented"),
+    ]
+    db.add_all(orders)
+    await db.commit()
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["msk"][:4] == (2, 2000, 30000, 1)
+    assert aggregates["spb"][0] == 1
+
+    # Вес и тариф заказа в пуле; выход самого старого; вход заказа из другого статуса
+    orders[1].total_weight_grams = 4000
+    orders[1].public_tariff_kopecks = 25000
+    orders[0].status = "problem"
+    orders[3].status = "customs_cleared"
+    await db.commit()
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["msk"][:4] == (2, 5000, 25000, 1)
+
+    await db.delete(orders[2])
+    await db.commit()
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["spb"][0] == 0
+
+
+async def test_change_order_status(db, session_factory, shop, pools):
+    pooled = make_order(shop.id, created_at=hours_ago(2))
+    accepted = make_order(shop.id, status="accepted")
+    db.add_all([pooled, accepted])
+    await db.commit()
+
+    await change_order_status(db, pooled.id, "problem")
+    await assert_matches_rebuild(session_factory)
+    await change_order_status(db, pooled.id, "customs_cleared")
+    await assert_matches_rebuild(session_factory)
+
+    # Отмена заказа вне пула агрегаты не трогает
+    await change_order_status(db, accepted.id, "cancelled")
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["msk"][0] == 1
+
+
+async def test_transition_orders(db, session_factory, shop, pools):
+    presented = [
+        make_order(shop.id, status="customs_presented", created_at=hours_ago(hours), public_tariff_kopecks=10000)
+        for hours in (1, 6)
+    ]
+    pooled = [make_order(shop.id, created_at=hours_ago(hours)) for hours in (2, 8)]
+    db.add_all(presented + pooled)
+    await db.commit()
+
+    await transition_orders(db, [o.id for o in presented], "customs_cleared")
+    await db.commit()
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["msk"][:4] == (4, 4000, 20000, 2)
+
+    # Из пула уходит самый старый заказ — oldest_created_at пересчитывается
+    await transition_orders(db, [pooled[1].id, presented[0].id], "awaiting_carrier")
+    await db.commit()
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["msk"][0] == 2
+
+
+async def test_rollback_discards_deltas(db, session_factory, shop, pools):
+    shop_id = shop.id
+    db.add(make_order(shop_id))
+    await db.flush()
+    await db.rollback()
+
+    db.add(make_order(shop_id, recipient_postal_code=SPB))
+    await db.commit()
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert (aggregates["msk"][0], aggregates["spb"][0]) == (0, 1)
+
+
+async def test_group_assignment(db, session_factory, shop, pools):
+    orders = [make_order(shop.id, created_at=hours_ago(hours), public_tariff_kopecks=30000) for hours in (1, 2, 3, 4)]
+    db.add_all(orders)
+    await db.commit()
+
+    optimizer = GroupingOptimizer(db, pochta_client=None)
+    await optimizer.apply_decision(GroupDecision(
+        hub="msk", orders=orders[1:], savings_kopecks=10000, savings_percent=10.0,
+        public_cost_kopecks=90000, contract_cost_kopecks=80000, reason="score",
+    ))
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["msk"][:4] == (1, 1000, 30000, 1)
+    assert aggregates["msk"][4] == hub_pool._aware(orders[0].created_at)
+
+
+async def test_missing_row_is_computed_from_orders(db, session_factory, shop, pools):
+    db.add(make_order(shop.id, created_at=hours_ago(1)))
+    await db.commit()
+    await db.execute(delete(HubPool).where(HubPool.hub == "msk"))
+    await db.commit()
+
+    db.add(make_order(shop.id))
+    await db.commit()
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["msk"][0] == 2
+
+
+async def test_missing_row_inserted_concurrently(db, engine, session_factory, shop, pools):
+    db.add(make_order(shop.id, created_at=hours_ago(1)))
+    await db.commit()
+    committed = (await snapshot(session_factory))["msk"]
+    await db.execute(delete(HubPool).where(HubPool.hub == "msk"))
+    await db.commit()
+
+    inserted = []
+
+    # Параллельная транзакция вставляет строку хаба между нашим UPDATE (0 строк) и INSERT
+    def insert_row(conn, cursor, statement, parameters, context, executemany):
+        if inserted or not statement.startswith("UPDATE hub_pools"):
+            return
+        inserted.append(True)
+        count, weight, tariff, priced, oldest = committed
+        conn.execute(text(
+            "INSERT INTO hub_pools (hub, orders_count, total_weight_grams, public_tariff_kopecks, "
+            "priced_count, oldest_created_at, updated_at) "
+            "VALUES ('msk', :count, :weight, :tariff, :priced, :oldest, :oldest)"
+        ), {"count": count, "weight": weight, "tariff": tariff, "priced": priced, "oldest": oldest})
+
+    event.listen(engine.sync_engine, "after_cursor_execute", insert_row)
+    try:
+        db.add(make_order(shop.id))
+        await db.commit()
+    finally:
+        event.remove(engine.sync_engine, "after_cursor_execute", insert_row)
+
+    assert inserted
+    async with session_factory() as check:
+        assert (await check.execute(select(Order.id))).all()
+    aggregates = await assert_matches_rebuild(session_factory)
+    assert aggregates["msk"][0] == 2
@@ -0,0 +1,182 @@
+"""Пакетное создание заказов: create_orders_bulk и POST /orders/bulk."""
+import httpx
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.core.database import get_db
+from app.main import app
+from app.models.order import Order
+from app.models.shop import Shop
+from app.services import order as order_service
+from app.services.order import DUPLICATE_IN_REQUEST_ERROR, create_orders_bulk
+from app.services.pochta import RawHttpLog, TariffResult
+from tests.conftest import make_order
+
+
+def order_values(external_order_id: str, postal_code: str = "101000") -> dict:
+    return {
+        "external_order_id": external_order_id,
+        "recipient_name": "Иванов Иван Иванович",
+        "recipient_phone": "+79261234567",
+        "recipient_email": None,
+        "recipient_address": "Москва, ул. Ленина, д. 1",
+        "recipient_postal_code": postal_code,
+        "recipient_passport_series": None,
+        "recipient_passport_number": None,
+        "items": [{"name": "Стол", "quantity": 1, "price_kopecks": 100000, "weight_grams": 1000}],
+        "total_amount_kopecks": 100000,
+        "total_weight_grams": 1000,
+        "delivery_cost_kopecks": 30000,
+        "customs_fee_kopecks": 15000,
+    }
+
+
+async def orders_count(session_factory) -> int:
+    async with session_factory() as db:
+        return (await db.execute(select(func.count()).select_from(Order))).scalar_one()
+
+
+async def test_creates_orders(db, session_factory, shop):
+    result = await create_orders_bulk(db, shop.id, {0: order_values("A"), 1: order_values("B", "190000")})
+
+    assert sorted(result.created) == [0, 1]
+    assert result.errors == {} and result.existing == {}
+    async with session_factory() as check:
+        hubs = dict((await check.execute(select(Order.external_order_id, Order.hub))).all())
+    assert hubs == {"A": "msk", "B": "spb"}
+
+
+async def test_duplicates_in_request(db, session_factory, shop):
+    result = await create_orders_bulk(db, shop.id, {0: order_values("A"), 1: order_values("A"), 2: order_values("B")})
+
+    assert sorted(result.created) == [0, 2]
+    assert result.errors == {1: DUPLICATE_IN_REQUEST_ERROR}
+    assert await orders_count(session_factory) == 2
+
+
+async def test_existing_orders_are_returned(db, session_factory, shop):
+    earlier = make_order(shop.id, external_order_id="A", delivery_cost_kopecks=27000)
+    db.add(earlier)
+    await db.commit()
+
+    result = await create_orders_bulk(db, shop.id, {0: order_values("A"), 1: order_values("B")})
+
+    assert list(result.created) == [1]
+    assert result.existing[0].id == earlier.id
+    assert result.existing[0].delivery_cost_kopecks == 27000
+    assert await orders_count(session_factory) == 2
+
+
+async def test_other_shop_orders_do_not_conflict(db, session_factory, shop):
+    other = Shop(name="Другой", domain="other.test", api_key="o" * 64)
+    db.add(other)
+    await db.commit()
+    db.add(make_order(other.id, external_order_id="A"))
+    await db.commit()
+
+    result = await create_orders_bulk(db, shop.id, {0: order_values("A")})
+
+    assert list(result.created) == [0]
+
+
+async def test_concurrent_insert_is_retried(db, session_factory, shop, monkeypatch):
+    # Параллельный запрос создал "A" после нашей проверки: INSERT падает на uq_shop_external_order
+    earlier = make_order(shop.id, external_order_id="A")
+    db.add(earlier)
+    await db.commit()
+    earlier_id = earlier.id
+
+    lookups = []
+    real_lookup = order_service.find_existing_orders
+
+    async def stale_first_lookup(db, shop_id, external_order_ids):
+        lookups.append(external_order_ids)
+        if len(lookups) == 1:
+            return {}
+        return await real_lookup(db, shop_id, external_order_ids)
+
+    monkeypatch.setattr(order_service, "find_existing_orders", stale_first_lookup)
+
+    result = await create_orders_bulk(db, shop.id, {0: order_values("A"), 1: order_values("B")})
+
+    assert len(lookups) == 2
+    assert list(result.created) == [1]
+    assert result.existing[0].id == earlier_id
+    assert await orders_count(session_factory) == 2
+
+
+async def test_repeated_conflict_is_raised(db, shop, monkeypatch):
+    db.add(make_order(shop.id, external_order_id="A"))
+    await db.commit()
+
+    async def no_orders(db, shop_id, external_order_ids):
+        return {}
+
+    monkeypatch.setattr(order_service, "find_existing_orders", no_orders)
+
+    with pytest.raises(IntegrityError):
+        await create_orders_bulk(db, shop.id, {0: order_values("A")})
+
+
+# ── POST /orders/bulk ─────────────────────────────────────────────────────────
+
+class FakePochta:
+    def __init__(self):
+        self.calls = []
+
+    async def calculate_tariff_public(self, index_from, index_to, weight_grams, object_code=None, use_cache=True):
+        self.calls.append((index_to, weight_grams))
+        return TariffResult(30000, 0, 30000, 3, 5), RawHttpLog("GET", "", {}, None, 200, {}, 1)
+
+
+def order_payload(external_order_id: str, postal_code: str = "101000") -> dict:
+    return {
+        "external_order_id": external_order_id,
+        "recipient": {
+            "name": "Иванов Иван Иванович", "phone": "+79261234567", "email": "a@b.ru",
+            "address": "Москва, ул. Ленина, д. 1", "postal_code": postal_code,
+            "passport_series": "4515", "passport_number": "123456",
+        },
+        "items": [{"name": "Стол", "quantity": 1, "price_kopecks": 100000, "weight_grams": 1000}],
+    }
+
+
+@pytest.fixture
+async def api(session_factory, shop):
+    async def test_db():
+        async with session_factory() as session:
+            yield session
+
+    pochta = FakePochta()
+    app.dependency_overrides[get_db] = test_db
+    app.state.pochta_client = pochta
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", headers={"X-API-Key": shop.api_key}) as client:
+        yield client, pochta
+    app.dependency_overrides.pop(get_db, None)
+
+
+async def test_bulk_retry_returns_existing_without_pricing(api, session_factory):
+    client, pochta = api
+    first = await client.post("/api/v1/orders/bulk", json={"orders": [order_payload("A"), order_payload("B", "190000")]})
+    assert first.status_code == 200
+    created = {item["external_order_id"]: item["order_id"] for item in first.json()["results"]}
+    assert len(pochta.calls) == 2
+
+    pochta.calls.clear()
+    retry = await client.post("/api/v1/orders/bulk", json={"orders": [
+        order_payload("A"), order_payload("C", "630000"), order_payload("C", "630000"), order_payload("B", "190000"),
+    ]})
+
+    body = retry.json()
+    results = [(item["success"], item["existing"], item["error"]) for item in body["results"]]
+    assert results == [
+        (True, True, None), (True, False, None), (False, False, DUPLICATE_IN_REQUEST_ERROR), (True, True, None),
+    ]
+    assert body["results"][0]["order_id"] == created["A"]
+    assert body["results"][0]["delivery_cost_kopecks"] == 30000
+    assert (body["success_count"], body["error_count"]) == (3, 1)
+    # Тариф считается только для нового заказа
+    assert pochta.calls == [("630000", 1000)]
+    assert await orders_count(session_factory) == 3
@@ -0,0 +1,114 @@
+"""Keyset-пагинация списков (app/core/pagination.py)."""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core import pagination
+from app.core.pagination import decode_cursor, encode_cursor, pages_count, paginate
+from app.models.order import Order
+from tests.conftest import make_order
+
+
+@pytest.fixture(autouse=True)
+def empty_count_cache(monkeypatch):
+    monkeypatch.setattr(pagination, "_count_cache", {})
+
+
+@pytest.fixture
+async def orders(db, shop) -> list[uuid.UUID]:
+    """12 заказов, по три с одинаковым created_at. Id в порядке выдачи: created_at DESC, id DESC."""
+    base = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    rows = [
+        make_order(shop.id, status="accepted", created_at=base + timedelta(minutes=n // 3))
+        for n in range(12)
+    ]
+    db.add_all(rows)
+    await db.commit()
+    rows.sort(key=lambda o: (o.created_at, o.id), reverse=True)
+    return [o.id for o in rows]
+
+
+def ids(page) -> list[uuid.UUID]:
+    return [o.id for o in page.items]
+
+
+def test_cursor_roundtrip():
+    created_at = datetime(2026, 3, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+    row_id = uuid.uuid4()
+
+    cursor = encode_cursor(created_at, row_id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, row_id)
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "e30", encode_cursor(datetime(2026, 1, 1), uuid.uuid4())[:-4]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+async def test_cursor_walks_all_rows_across_ties(db, orders):
+    walked, cursor, pages = [], None, 0
+    while True:
+        page = await paginate(db, select(Order), Order, per_page=5, cursor=cursor, count="none")
+        walked.extend(ids(page))
+        pages += 1
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert walked == orders
+    assert pages == 3
+
+
+async def test_cursor_matches_offset_pages(db, orders):
+    first = await paginate(db, select(Order), Order, page=1, per_page=4)
+    second_by_offset = await paginate(db, select(Order), Order, page=2, per_page=4)
+    second_by_cursor = await paginate(db, select(Order), Order, per_page=4, cursor=first.next_cursor)
+
+    assert ids(first) == orders[:4]
+    assert ids(second_by_cursor) == ids(second_by_offset) == orders[4:8]
+    assert second_by_cursor.next_cursor == second_by_offset.next_cursor
+
+
+async def test_last_page_has_no_cursor(db, orders):
+    page = await paginate(db, select(Order), Order, page=2, per_page=6)
+
+    assert ids(page) == orders[6:]
+    assert page.next_cursor is None
+
+
+async def test_cursor_keeps_filters(db, orders):
+    query = select(Order).where(Order.id.in_(orders[::2]))
+
+    first = await paginate(db, query, Order, per_page=3)
+    second = await paginate(db, query, Order, per_page=3, cursor=first.next_cursor)
+
+    assert ids(first) + ids(second) == orders[::2]
+    assert first.total == 6
+
+
+async def test_count_modes(db, shop, orders):
+    query = select(Order)
+
+    assert (await paginate(db, query, Order, count="exact")).total == 12
+    assert (await paginate(db, query, Order, count="none")).total is None
+    assert (await paginate(db, query, Order, count="cached")).total == 12
+
+    db.add(make_order(shop.id))
+    await db.commit()
+
+    assert (await paginate(db, query, Order, count="exact")).total == 13
+    # Кеш живёт COUNT_CACHE_TTL_SECONDS; estimate на SQLite читает тот же кеш
+    assert (await paginate(db, query, Order, count="cached")).total == 12
+    assert (await paginate(db, query, Order, count="estimate")).total == 12
+
+
+@pytest.mark.parametrize("total,per_page,expected", [(None, 20, None), (0, 20, 1), (20, 20, 1), (21, 20, 2)])
+def test_pages_count(total, per_page, expected):
+    assert pages_count(total, per_page) == expected
@@ -0,0 +1,191 @@
+"""Outbox вебхуков (services/webhook_outbox.py): аренда строк, ретраи, dead letters, запись в транзакции."""
+import json
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from sqlalchemy import func, select, update
+
+from app.core.config import settings
+from app.models.webhook_outbox import WebhookOutbox
+from app.services import webhook_outbox
+from app.services.order import transition_orders
+from tests.conftest import make_order
+
+
+def mock_client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def add(db, shop, count: int = 1) -> None:
+    await webhook_outbox.add_webhooks(db, [
+        (shop.id, {"event": "order.status_changed", "n": n}) for n in range(count)
+    ])
+    await db.commit()
+
+
+async def outbox(session_factory) -> list[WebhookOutbox]:
+    async with session_factory() as db:
+        return list((await db.execute(select(WebhookOutbox).order_by(WebhookOutbox.created_at))).scalars().all())
+
+
+async def test_claim_leases_rows(db, session_factory, shop):
+    await add(db, shop, 3)
+
+    async with session_factory() as first:
+        claimed = await webhook_outbox._claim_batch(first, 10)
+    async with session_factory() as second:
+        again = await webhook_outbox._claim_batch(second, 10)
+
+    assert len(claimed) == 3
+    # Арендованные строки второй relay не берёт, пока не истечёт аренда
+    assert again == []
+    for row in await outbox(session_factory):
+        assert row.status == "pending"
+        assert row.next_attempt_at.replace(tzinfo=timezone.utc) > datetime.now(timezone.utc) + timedelta(
+            seconds=settings.WEBHOOK_RELAY_LEASE_SECONDS - 10,
+        )
+
+
+async def test_expired_lease_is_reclaimed(db, session_factory, shop):
+    await add(db, shop, 2)
+    async with session_factory() as first:
+        await webhook_outbox._claim_batch(first, 10)
+
+    # relay упал посреди пачки — после аренды строки забирает следующий
+    await db.execute(update(WebhookOutbox).values(next_attempt_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+    await db.commit()
+    async with session_factory() as second:
+        assert len(await webhook_outbox._claim_batch(second, 10)) == 2
+
+
+async def test_relay_delivers_and_deletes(db, session_factory, shop):
+    await add(db, shop, 2)
+    received = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        received.append(json.loads(request.content))
+        assert request.headers["X-Ostrov-Signature"]
+        return httpx.Response(200)
+
+    async with mock_client(handler) as client:
+        stats = await webhook_outbox.relay(session_factory, client)
+
+    assert stats == {"sent": 2, "retried": 0, "failed": 0}
+    assert sorted(payload["n"] for payload in received) == [0, 1]
+    assert await outbox(session_factory) == []
+
+
+async def test_client_error_is_not_retried(db, session_factory, shop):
+    await add(db, shop)
+
+    async with mock_client(lambda request: httpx.Response(410)) as client:
+        stats = await webhook_outbox.relay(session_factory, client)
+
+    assert stats["sent"] == 1
+    assert await outbox(session_factory) == []
+
+
+async def test_server_error_backs_off(db, session_factory, shop):
+    await add(db, shop)
+    started = datetime.now(timezone.utc)
+
+    async with mock_client(lambda request: httpx.Response(503)) as client:
+        stats = await webhook_outbox.relay(session_factory, client)
+
+    assert stats == {"sent": 0, "retried": 1, "failed": 0}
+    [row] = await outbox(session_factory)
+    assert (row.status, row.attempts, row.last_error) == ("pending", 1, "HTTP 503")
+    delay = row.next_attempt_at.replace(tzinfo=timezone.utc) - started
+    assert timedelta(seconds=55) < delay < timedelta(seconds=65)
+
+
+async def test_last_attempt_moves_to_dead_letters(db, session_factory, shop):
+    await add(db, shop)
+    await db.execute(update(WebhookOutbox).values(attempts=settings.WEBHOOK_MAX_ATTEMPTS - 1))
+    await db.commit()
+
+    async with mock_client(lambda request: httpx.Response(500)) as client:
+        stats = await webhook_outbox.relay(session_factory, client)
+
+    assert stats == {"sent": 0, "retried": 0, "failed": 1}
+    [row] = await webhook_outbox.dead_letters(db, shop.id)
+    assert (row.status, row.attempts) == ("failed", settings.WEBHOOK_MAX_ATTEMPTS)
+    # Dead letter relay больше не берёт
+    async with mock_client(lambda request: httpx.Response(200)) as client:
+        assert (await webhook_outbox.relay(session_factory, client))["sent"] == 0
+
+
+async def test_failing_shop_is_skipped_after_limit(db, session_factory, shop, monkeypatch):
+    monkeypatch.setattr(settings, "WEBHOOK_SHOP_CONCURRENCY", 1)
+    await add(db, shop, settings.WEBHOOK_SHOP_FAILURE_LIMIT + 3)
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        raise httpx.ConnectError("connection refused", request=request)
+
+    async with mock_client(handler) as client:
+        stats = await webhook_outbox.relay(session_factory, client)
+
+    # После WEBHOOK_SHOP_FAILURE_LIMIT ошибок подряд остаток пачки не отправляется
+    assert calls == settings.WEBHOOK_SHOP_FAILURE_LIMIT
+    assert stats["retried"] == settings.WEBHOOK_SHOP_FAILURE_LIMIT + 3
+    errors = [row.last_error for row in await outbox(session_factory)]
+    assert errors.count("Skipped: shop endpoint is failing") == 3
+    assert all(row.attempts == 1 for row in await outbox(session_factory))
+
+
+async def test_replay_dead_letters(db, session_factory, shop):
+    await add(db, shop, 3)
+    await db.execute(update(WebhookOutbox).values(status="failed", attempts=6, last_error="HTTP 500"))
+    await db.commit()
+    [first, *_] = await outbox(session_factory)
+
+    assert await webhook_outbox.replay_dead_letters(db, shop.id, [first.id]) == 1
+    await db.commit()
+    assert len(await webhook_outbox.dead_letters(db, shop.id)) == 2
+
+    assert await webhook_outbox.replay_dead_letters(db, shop.id) == 2
+    await db.commit()
+    rows = await outbox(session_factory)
+    assert {(row.status, row.attempts, row.last_error) for row in rows} == {("pending", 0, None)}
+
+    async with mock_client(lambda request: httpx.Response(200)) as client:
+        assert (await webhook_outbox.relay(session_factory, client))["sent"] == 3
+
+
+async def test_transition_orders_writes_outbox_in_transaction(db, session_factory, shop):
+    orders = [make_order(shop.id, status="customs_presented") for _ in range(3)]
+    db.add_all(orders)
+    await db.commit()
+    order_ids = [o.id for o in orders]
+
+    result = await transition_orders(db, order_ids, "customs_cleared")
+    assert len(result.changed) == 3
+    await db.rollback()
+    # Откат смены статуса откатывает и вебхуки
+    assert await outbox(session_factory) == []
+
+    result = await transition_orders(db, order_ids, "customs_cleared")
+    await db.commit()
+    rows = await outbox(session_factory)
+    assert sorted(row.order_id for row in rows) == sorted(order_ids)
+    assert {row.payload["new_status"] for row in rows} == {"customs_cleared"}
+    assert result.relay_countdowns == [0]
+
+
+async def test_shop_without_webhook_url_gets_no_rows(db, session_factory, shop):
+    shop.webhook_url = None
+    await db.commit()
+
+    await add(db, shop)
+
+    async with session_factory() as check:
+        assert (await check.execute(select(func.count()).select_from(WebhookOutbox))).scalar_one() == 0
+
+
+@pytest.mark.parametrize("attempts,seconds", [(1, 60), (2, 120), (5, 960)])
+def test_backoff(attempts, seconds):
+    assert webhook_outbox._backoff(attempts) == timedelta(seconds=seconds)